@@ -81,6 +81,9 @@ float complex* comm_ridope_receive_img(uint32_t *N, uint32_t *M){
     return img;
 }
 
+/* Encoding of the last frame sent, for the resends */
+static uint32_t tx_encoding = COMM_RIDOPE_ENC_RAW;
+
 /**
  * @brief Sends an Img throught the UART
  * 
@@ -101,9 +104,13 @@ void comm_ridope_send_img(uint8_t * img, CMD_TYPE_t img_type,uint32_t N, uint32_
     printf("Size sent!\n");
 
     msg.msg_data.cmd = START_TRANS;
+    msg.msg_data.data = COMM_RIDOPE_ENC_RAW + (N*M)*I;
 
     comm_ridope_send_cmd(&msg);
 
+    // A resend of this frame sends its raw pixels
+    tx_encoding = COMM_RIDOPE_ENC_RAW;
+
     printf("Start flag!\n");
 
     for(int i=0; i<N*M; i=i+1) {
@@ -114,6 +121,7 @@ void comm_ridope_send_img(uint8_t * img, CMD_TYPE_t img_type,uint32_t N, uint32_
     }
 
      msg.msg_data.cmd = STOP_TRANS;
+    msg.msg_data.data = N+ M*I;
 
     comm_ridope_send_cmd(&msg);
 
@@ -121,35 +129,359 @@ void comm_ridope_send_img(uint8_t * img, CMD_TYPE_t img_type,uint32_t N, uint32_
 }
 
 /**
- * @brief Receives the command to be executed
+ * @brief Sends one TRANS_FRAME chunk
  * 
- * @param msg The pointer to the COMM_RIDOPE_MSG_t struct to save the command received
+ * @param offset    The offset of the chunk in the encoded frame
+ * @param data      The pointer to the chunk data
+ * @param len       The length of the chunk, up to COMM_RIDOPE_CHUNK_SIZE
  */
-void comm_ridope_receive_cmd(COMM_RIDOPE_MSG_t *msg)
-{   
-    if(msg == NULL){
-        return;
+static void comm_ridope_send_chunk(uint32_t offset, const uint8_t *data, uint32_t len)
+{
+    COMM_RIDOPE_CHUNK_t chunk;
+    chunk.cmd = TRANS_FRAME;
+    chunk.offset = offset;
+
+    comm_ridope_packet_begin();
+    comm_ridope_packet_write((uint8_t *) &chunk, sizeof(chunk));
+    comm_ridope_packet_write(data, len);
+    comm_ridope_packet_end();
+}
+
+/**
+ * @brief Row-delta + RLE encodes an Img, sending it as TRANS_FRAME chunks
+ * 
+ * Each pixel is replaced by its difference (mod 256) with the previous pixel
+ * of its line, then runs of equal differences are sent as (count, value)
+ * byte pairs. Only the chunks starting in [from, to) are sent, none when
+ * from == to, the whole frame is encoded anyway.
+ * 
+ * @param img       The pointer to the img
+ * @param N         The number of lines
+ * @param M         The number of columns
+ * @param from      The offset of the first chunk to send
+ * @param to        The end of the chunks to send
+ * @return uint32_t Returns the encoded size
+ */
+static uint32_t comm_ridope_rle(uint8_t * img, uint32_t N, uint32_t M, uint32_t from, uint32_t to)
+{
+    uint8_t chunk[COMM_RIDOPE_CHUNK_SIZE];
+    uint32_t img_size = N*M;
+    uint32_t len = 0;
+    uint32_t offset = 0;
+    uint32_t col = 0;
+    uint8_t value = 0;
+    uint8_t count = 0;
+
+    // One extra iteration flushes the last run
+    for(uint32_t i = 0; i <= img_size; i++) {
+        uint8_t delta = 0;
+
+        if(i < img_size)
+        {
+            delta = img[i] - (col ? img[i-1] : 0);
+
+            if(++col == M)
+            {
+                col = 0;
+            }
+        }
+
+        if(count && (i == img_size || delta != value || count == 0xFF))
+        {
+            chunk[len] = count;
+            chunk[len+1] = value;
+            len += 2;
+            count = 0;
+
+            if(len == COMM_RIDOPE_CHUNK_SIZE)
+            {
+                if(offset >= from && offset < to)
+                {
+                    comm_ridope_send_chunk(offset, chunk, len);
+                }
+                offset += len;
+                len = 0;
+            }
+        }
+
+        value = delta;
+        count++;
     }
 
+    if(len && offset >= from && offset < to)
+    {
+        comm_ridope_send_chunk(offset, chunk, len);
+    }
+
+    return offset + len;
+}
+
+/**
+ * @brief Sends the raw chunks of an Img starting in [from, to)
+ * 
+ * @param img       The pointer to the img
+ * @param img_size  The number of pixels
+ * @param from      The offset of the first chunk to send
+ * @param to        The end of the chunks to send
+ */
+static void comm_ridope_raw(uint8_t * img, uint32_t img_size, uint32_t from, uint32_t to)
+{
+#ifdef CSR_STREAMER_BASE
+    /* The streamer sends the same chunks from memory, the bytes already written go first */
+    uart_sync();
+
+    streamer_base_write((uint32_t) img);
+    streamer_size_write(img_size);
+    streamer_offset_write(from);
+    streamer_length_write(to - from);
+    streamer_control_write((1 << CSR_STREAMER_CONTROL_START_OFFSET) | (1 << CSR_STREAMER_CONTROL_CRC_OFFSET));
+
+    while(streamer_status_read() & (1 << CSR_STREAMER_STATUS_BUSY_OFFSET));
+#else
+    for(uint32_t offset = 0; offset < img_size; offset += COMM_RIDOPE_CHUNK_SIZE) {
+        uint32_t len = img_size - offset;
+
+        if(offset < from || offset >= to)
+        {
+            continue;
+        }
+
+        if(len > COMM_RIDOPE_CHUNK_SIZE)
+        {
+            len = COMM_RIDOPE_CHUNK_SIZE;
+        }
+
+        comm_ridope_send_chunk(offset, &img[offset], len);
+    }
+#endif
+}
+
+/**
+ * @brief Sends an Img throught the UART as TRANS_FRAME chunks
+ * 
+ * START_TRANS carries the encoding and the encoded size, each chunk packet
+ * its offset in the encoded frame followed by up to COMM_RIDOPE_CHUNK_SIZE
+ * bytes. The frame is sent raw when the encoding would not make it smaller.
+ * img must stay unchanged until the next frame for comm_ridope_resend_frame.
+ * 
+ * @param img       The pointer to the img
+ * @param N         The number of lines
+ * @param M         The number of columns
+ * @param encoding  The requested encoding, COMM_RIDOPE_ENC_RAW or COMM_RIDOPE_ENC_RLE
+ */
+void comm_ridope_send_frame(uint8_t * img, uint32_t N, uint32_t M, uint32_t encoding)
+{
+    COMM_RIDOPE_MSG_t msg;
+    uint32_t img_size = N*M;
+    uint32_t size = img_size;
+
+    if(encoding == COMM_RIDOPE_ENC_RLE)
+    {
+        size = comm_ridope_rle(img, N, M, 0, 0);
+
+        if(size >= img_size)
+        {
+            encoding = COMM_RIDOPE_ENC_RAW;
+            size = img_size;
+        }
+    }
+    else
+    {
+        encoding = COMM_RIDOPE_ENC_RAW;
+    }
+
+    msg.msg_data.cmd = PHOTO_SIZE;
+    msg.msg_data.data = N+ M*I;
+
+    comm_ridope_send_cmd(&msg);
+
+    msg.msg_data.cmd = START_TRANS;
+    msg.msg_data.data = encoding + size*I;
+
+    comm_ridope_send_cmd(&msg);
+
+    tx_encoding = encoding;
+    comm_ridope_resend_frame(img, N, M, 0, size);
+}
+
+/**
+ * @brief Sends again the chunks of the last frame starting in [offset, offset+len), then STOP_TRANS
+ * 
+ * Answers the RESEND of the chunks the host missed or got corrupted.
+ * 
+ * @param img       The pointer to the img given to comm_ridope_send_frame
+ * @param N         The number of lines
+ * @param M         The number of columns
+ * @param offset    The offset of the first chunk in the encoded frame
+ * @param len       The length to send again
+ */
+void comm_ridope_resend_frame(uint8_t * img, uint32_t N, uint32_t M, uint32_t offset, uint32_t len)
+{
+    COMM_RIDOPE_MSG_t msg;
+
+    if(tx_encoding == COMM_RIDOPE_ENC_RLE)
+    {
+        comm_ridope_rle(img, N, M, offset, offset + len);
+    }
+    else
+    {
+        comm_ridope_raw(img, N*M, offset, offset + len);
+    }
+
+    msg.msg_data.cmd = STOP_TRANS;
+    msg.msg_data.data = N+ M*I;
+
+    comm_ridope_send_cmd(&msg);
+}
+
+#ifdef CSR_TIMER0_BASE
+/**
+ * @brief Starts a one-shot countdown of timer0
+ * 
+ * @param us The countdown in microseconds
+ */
+static void comm_ridope_timer_start(uint32_t us)
+{
+    timer0_en_write(0);
+    timer0_reload_write(0);
+    timer0_load_write(CONFIG_CLOCK_FREQUENCY/1000000*us);
+    timer0_en_write(1);
+}
+
+/**
+ * @brief Checks the countdown started by comm_ridope_timer_start
+ * 
+ * @return uint8_t Returns 1 once the countdown is over
+ */
+static uint8_t comm_ridope_timer_expired(void)
+{
+    timer0_update_value_write(1);
+
+    return timer0_value_read() == 0;
+}
+#endif
+
+/**
+ * @brief Receives a packet, NULL_CMD if it is empty or corrupted
+ * 
+ * @param msg       The pointer to the COMM_RIDOPE_MSG_t struct to save the command received
+ * @param timed     Gives up once the countdown of comm_ridope_timer_start is over
+ * @return uint8_t  Returns 0 if it gave up, NULL_CMD in msg
+ */
+static uint8_t comm_ridope_receive(COMM_RIDOPE_MSG_t *msg, uint8_t timed)
+{
+    uint8_t packet[COMM_RIDOPE_RX_MAX];
     uint8_t count = 0;
+    uint8_t overflow = 0;
     char byte = 0;
 
+    // Gets everything up to the next delimiter
     do{
+#ifdef CSR_TIMER0_BASE
+        if(timed && comm_ridope_timer_expired())
+        {
+            msg->msg_data.cmd = NULL_CMD;
+            return 0;
+        }
+#endif
         if(readchar_nonblock())
         {
             byte = getchar();
             
-            if(byte != '\n')
+            if(byte != COMM_RIDOPE_DELIMITER)
             {
-                msg->buffer[count++] = byte;
+                if(count < COMM_RIDOPE_RX_MAX)
+                {
+                    packet[count++] = byte;
+                }
+                else
+                {
+                    overflow = 1;
+                }
             }
         }
-    }while(byte != '\n');
-    
-    if (count == 0){
-        msg->msg_data.cmd = NULL_CMD;
+    }while(byte != COMM_RIDOPE_DELIMITER);
+
+    msg->msg_data.cmd = NULL_CMD;
+
+    if(count == 0 || overflow){
+        return 1;
+    }
+
+    // COBS decoding, in place
+    uint8_t len = 0;
+    uint8_t i = 0;
+
+    while(i < count)
+    {
+        uint8_t code = packet[i++];
+
+        if(i + code - 1 > count)
+        {
+            return 1;
+        }
+
+        for(uint8_t j = 1; j < code; j++)
+        {
+            packet[len++] = packet[i++];
+        }
+
+        if(code < 0xFF && i < count)
+        {
+            packet[len++] = 0;
+        }
+    }
+
+    if(len != sizeof(COMM_RIDOPE_MSG_t) + 2)
+    {
+        return 1;
+    }
+
+    uint16_t crc = packet[len-2] | (packet[len-1] << 8);
+
+    if(comm_ridope_crc16(COMM_RIDOPE_CRC_INIT, packet, sizeof(COMM_RIDOPE_MSG_t)) != crc)
+    {
+        return 1;
+    }
+
+    memcpy(msg->buffer, packet, sizeof(COMM_RIDOPE_MSG_t));
+
+    return 1;
+}
+
+/**
+ * @brief Receives the command to be executed, NULL_CMD if the packet is empty or corrupted
+ * 
+ * @param msg The pointer to the COMM_RIDOPE_MSG_t struct to save the command received
+ */
+void comm_ridope_receive_cmd(COMM_RIDOPE_MSG_t *msg)
+{   
+    if(msg == NULL){
+        return;
+    }
+
+    comm_ridope_receive(msg, 0);
+}
+
+#ifdef CSR_TIMER0_BASE
+/**
+ * @brief Receives the command to be executed within a timeout, NULL_CMD if none, empty or corrupted
+ * 
+ * @param msg       The pointer to the COMM_RIDOPE_MSG_t struct to save the command received
+ * @param ms        The timeout in milliseconds, for the whole packet
+ * @return uint8_t  Returns 1 if a packet was received in time
+ */
+uint8_t comm_ridope_receive_cmd_timeout(COMM_RIDOPE_MSG_t *msg, uint32_t ms)
+{
+    if(msg == NULL){
+        return 0;
     }
+
+    comm_ridope_timer_start(ms*1000);
+
+    return comm_ridope_receive(msg, 1);
 }
+#endif
 
 /**
  * @brief Sends a command to be executed
@@ -162,14 +494,205 @@ void comm_ridope_send_cmd(COMM_RIDOPE_MSG_t *msg)
         return;
     }
 
-    uint8_t buff_len = sizeof(COMM_RIDOPE_MSG_t);
+    comm_ridope_packet_begin();
+    comm_ridope_packet_write((uint8_t *) msg->buffer, sizeof(COMM_RIDOPE_MSG_t));
+    comm_ridope_packet_end();
+}
+
+#ifdef CSR_UART_PHY_TUNING_WORD_ADDR
+/**
+ * @brief Waits for a PING and answers it
+ * 
+ * @param ms        The timeout in milliseconds
+ * @return uint8_t  Returns 1 if a PING was received in time
+ */
+static uint8_t comm_ridope_wait_ping(uint32_t ms)
+{
+    COMM_RIDOPE_MSG_t msg;
 
-    for(int i = 0; i < buff_len; i++)
+    // One countdown for all the packets, a partial packet or a busy link does not hold the UART past it
+    comm_ridope_timer_start(ms*1000);
+
+    while(comm_ridope_receive(&msg, 1))
     {
-        uart_write(msg->buffer[i]);
+        if(msg.msg_data.cmd == PING)
+        {
+            comm_ridope_send_cmd(&msg);
+            return 1;
+        }
     }
 
-    uart_write('\n');
-    uart_write('\r');
+    return 0;
+}
+#endif
+
+/**
+ * @brief Switches the UART to a new baudrate
+ * 
+ * UART_BAUD is answered at the current baudrate with the one accepted, the
+ * current one if refused (no tuning word CSR in the UART PHY, or a baudrate
+ * above an eighth of the system clock). The host then has
+ * COMM_RIDOPE_PING_TIMEOUT ms to send a PING at the new baudrate, without it
+ * the UART goes back to the current one.
+ * 
+ * @param baudrate  The requested baudrate
+ * @return uint32_t Returns the baudrate in use
+ */
+uint32_t comm_ridope_set_baudrate(uint32_t baudrate)
+{
+    static uint32_t current = COMM_RIDOPE_BAUD_DEFAULT;
+    COMM_RIDOPE_MSG_t msg;
+
+#ifdef CSR_UART_PHY_TUNING_WORD_ADDR
+    if(baudrate == 0 || baudrate > CONFIG_CLOCK_FREQUENCY/8)
+    {
+        baudrate = current;
+    }
+#else
+    baudrate = current;
+#endif
+
+    msg.msg_data.cmd = UART_BAUD;
+    msg.msg_data.data = baudrate;
+
+    comm_ridope_send_cmd(&msg);
+
+    if(baudrate == current)
+    {
+        return current;
+    }
+
+#ifdef CSR_UART_PHY_TUNING_WORD_ADDR
+    uint32_t tuning_word = uart_phy_tuning_word_read();
+
+    // Lets the answer go out at the current baudrate, last character included
+    uart_sync();
+#ifdef CSR_UART_TXEMPTY_ADDR
+    while(!uart_txempty_read());
+#endif
+    comm_ridope_timer_start(10*1000000/current + 1);
+    while(!comm_ridope_timer_expired());
+
+    uart_phy_tuning_word_write(((uint64_t) baudrate << 32)/CONFIG_CLOCK_FREQUENCY);
+
+    if(comm_ridope_wait_ping(COMM_RIDOPE_PING_TIMEOUT))
+    {
+        current = baudrate;
+    }
+    else
+    {
+        uart_phy_tuning_word_write(tuning_word);
+    }
+#endif
+
+    return current;
+}
+
+/**
+ * @brief Updates a CRC-16/CCITT-FALSE
+ * 
+ * @param crc       The current CRC, COMM_RIDOPE_CRC_INIT for a new one
+ * @param data      The pointer to the data
+ * @param len       The length of the data
+ * @return uint16_t Returns the updated CRC
+ */
+uint16_t comm_ridope_crc16(uint16_t crc, const uint8_t *data, uint32_t len)
+{
+    for(uint32_t i = 0; i < len; i++)
+    {
+        crc ^= data[i] << 8;
+
+        for(int j = 0; j < 8; j++)
+        {
+            crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+        }
+    }
+
+    return crc;
+}
+
+/* COBS encoder state of the packet being sent */
+static uint8_t tx_block[254];
+static uint8_t tx_block_len;
+static uint16_t tx_crc;
+
+/**
+ * @brief Sends the pending COBS block
+ * 
+ */
+static void comm_ridope_block_flush(void)
+{
+    uart_write(tx_block_len + 1);
+
+    for(int i = 0; i < tx_block_len; i++)
+    {
+        uart_write(tx_block[i]);
+    }
+
+    tx_block_len = 0;
+}
+
+/**
+ * @brief COBS encodes one byte of the packet being sent
+ * 
+ * @param byte The byte to be encoded
+ */
+static void comm_ridope_cobs_put(uint8_t byte)
+{
+    if(byte == 0)
+    {
+        comm_ridope_block_flush();
+        return;
+    }
+
+    tx_block[tx_block_len++] = byte;
+
+    if(tx_block_len == sizeof(tx_block))
+    {
+        comm_ridope_block_flush();
+    }
+}
+
+/**
+ * @brief Starts a packet, the leading delimiter splits it from any console output
+ * 
+ */
+void comm_ridope_packet_begin(void)
+{
+    uart_write(COMM_RIDOPE_DELIMITER);
+
+    tx_block_len = 0;
+    tx_crc = COMM_RIDOPE_CRC_INIT;
+}
+
+/**
+ * @brief Appends data to the packet being sent
+ * 
+ * @param data The pointer to the data
+ * @param len  The length of the data
+ */
+void comm_ridope_packet_write(const uint8_t *data, uint32_t len)
+{
+    tx_crc = comm_ridope_crc16(tx_crc, data, len);
+
+    for(uint32_t i = 0; i < len; i++)
+    {
+        comm_ridope_cobs_put(data[i]);
+    }
+}
+
+/**
+ * @brief Appends the CRC and closes the packet being sent
+ * 
+ */
+void comm_ridope_packet_end(void)
+{
+    uint16_t crc = tx_crc;
+
+    comm_ridope_cobs_put(crc & 0xFF);
+    comm_ridope_cobs_put(crc >> 8);
+    comm_ridope_block_flush();
+
+    uart_write(COMM_RIDOPE_DELIMITER);
 }
 
@@ -10,9 +10,24 @@
 #include <libbase/uart.h>
 #include <libbase/console.h>
 #include <generated/csr.h>
+#include <generated/soc.h>
 
 #include "complex.h"
 
+/* Packets are COBS encoded and delimited by COMM_RIDOPE_DELIMITER on both sides */
+#define COMM_RIDOPE_DELIMITER   0x00
+#define COMM_RIDOPE_CRC_INIT    0xFFFF
+#define COMM_RIDOPE_CHUNK_SIZE  248
+#define COMM_RIDOPE_RX_MAX      32
+
+/* UART_BAUD falls back to the current baudrate without a PING within COMM_RIDOPE_PING_TIMEOUT ms */
+#define COMM_RIDOPE_BAUD_DEFAULT    115200
+#define COMM_RIDOPE_PING_TIMEOUT    1000
+
+/* Frame encodings, requested in the TRANS_FRAME command and announced in START_TRANS */
+#define COMM_RIDOPE_ENC_RAW     0
+#define COMM_RIDOPE_ENC_RLE     1
+
 /**
  * @brief Enum with the allowed commands in the RIDOPE project UART comunication 
  * 
@@ -36,6 +51,10 @@ typedef enum CMD_TYPE
     CAMERA_FOV,
     CAMERA_IMG,
     VGA_SIZE,
+    TRANS_FRAME,
+    UART_BAUD,
+    PING,
+    RESEND,
     NULL_CMD
 }CMD_TYPE_t;
 
@@ -60,10 +79,30 @@ typedef union
 
 } COMM_RIDOPE_MSG_t;
 
+/**
+ * @brief Header of a TRANS_FRAME packet, followed by up to COMM_RIDOPE_CHUNK_SIZE bytes of the encoded frame
+ * 
+ */
+typedef struct COMM_RIDOPE_CHUNK_TYPE
+{
+    CMD_TYPE_t cmd;
+    uint32_t offset;
+} COMM_RIDOPE_CHUNK_t;
+
 void comm_ridope_init(void);
 float complex* comm_ridope_receive_img(uint32_t *N, uint32_t *M);
 void comm_ridope_send_img(uint8_t * img, CMD_TYPE_t img_type, uint32_t N, uint32_t M);
+void comm_ridope_send_frame(uint8_t * img, uint32_t N, uint32_t M, uint32_t encoding);
+void comm_ridope_resend_frame(uint8_t * img, uint32_t N, uint32_t M, uint32_t offset, uint32_t len);
 void comm_ridope_receive_cmd(COMM_RIDOPE_MSG_t *msg);
+#ifdef CSR_TIMER0_BASE
+uint8_t comm_ridope_receive_cmd_timeout(COMM_RIDOPE_MSG_t *msg, uint32_t ms);
+#endif
 void comm_ridope_send_cmd(COMM_RIDOPE_MSG_t *msg);
+uint32_t comm_ridope_set_baudrate(uint32_t baudrate);
+uint16_t comm_ridope_crc16(uint16_t crc, const uint8_t *data, uint32_t len);
+void comm_ridope_packet_begin(void);
+void comm_ridope_packet_write(const uint8_t *data, uint32_t len);
+void comm_ridope_packet_end(void);
 
 #endif
\ No newline at end of file
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Host side of the RIDOPE UART communication (see comm_ridope.c)
+
+from binascii import crc_hqx
+from enum import Enum
+from struct import Struct
+from typing import NamedTuple, Any
+
+import numpy as np
+
+cmd = Enum('CMD_TYPE', 'REBOOT TRANS_PHOTO TRANS_FFT TRANS_IFFT PHOTO_SIZE START_TRANS STOP_TRANS OP_TIME HELP CAMERA_RST CAMERA_TRIG CAMERA_EXPO CAMERA_AVG CAMERA_SIZE CAMERA_FOV CAMERA_IMG VGA_SIZE TRANS_FRAME UART_BAUD PING RESEND NULL_CMD', start=48)
+
+# Packets are COBS encoded, carry a CRC-16/CCITT-FALSE and are delimited by 0x00
+DELIMITER = b"\x00"
+CRC_INIT = 0xFFFF
+CHUNK_SIZE = 248
+
+# Frame encodings, requested in TRANS_FRAME and announced in START_TRANS
+ENC_RAW = 0
+ENC_RLE = 1
+ENCODINGS = {"raw": ENC_RAW, "rle": ENC_RLE}
+
+# COMM_RIDOPE_CMD_TYPE_t
+MSG_FORMAT = "<Iff"
+# Command sent to the firmware
+CMD_FORMAT = "<iff"
+# COMM_RIDOPE_CHUNK_t, followed by the pixels
+CHUNK_FORMAT = "<II"
+
+msg_struct = Struct(MSG_FORMAT)
+cmd_struct = Struct(CMD_FORMAT)
+chunk_struct = Struct(CHUNK_FORMAT)
+MSG_SIZE = msg_struct.size
+
+class Message(NamedTuple):
+    cmd: int
+    real: float
+    imag: float
+    payload: Any = None
+
+# For TRANS_FRAME chunks real is the offset in the encoded frame, imag the
+# byte count and payload the bytes
+
+def cobs_encode(data):
+    out = bytearray(1)
+    code_idx = 0
+    code = 1
+
+    for byte in data:
+        if byte == 0:
+            out[code_idx] = code
+            code_idx = len(out)
+            out.append(0)
+            code = 1
+        else:
+            out.append(byte)
+            code += 1
+            if code == 0xFF:
+                out[code_idx] = code
+                code_idx = len(out)
+                out.append(0)
+                code = 1
+
+    out[code_idx] = code
+    return out
+
+def cobs_decode(data):
+    out = bytearray()
+    size = len(data)
+    i = 0
+
+    while i < size:
+        code = data[i]
+        end = i + code
+
+        if code == 0 or end > size:
+            raise ValueError("Invalid COBS block")
+
+        out += data[i+1:end]
+        i = end
+
+        if code < 0xFF and i < size:
+            out.append(0)
+
+    return out
+
+def rle_encode(image):
+    """Row-delta + RLE encodes a frame the way comm_ridope_rle() does"""
+    image = np.asarray(image, dtype=np.uint8)
+    deltas = (np.diff(image.astype(np.int16), axis=1, prepend=0) & 0xFF).astype(np.uint8).ravel()
+
+    if deltas.size == 0:
+        return b""
+
+    starts = np.flatnonzero(np.r_[True, deltas[1:] != deltas[:-1]])
+    lengths = np.diff(np.r_[starts, deltas.size])
+
+    # Runs longer than 255 are split
+    splits = (lengths + 254) // 255
+    counts = np.full(splits.sum(), 255, dtype=np.uint8)
+    counts[np.cumsum(splits) - 1] = lengths - 255*(splits - 1)
+
+    out = np.empty(2*counts.size, dtype=np.uint8)
+    out[0::2] = counts
+    out[1::2] = np.repeat(deltas[starts], splits)
+    return out.tobytes()
+
+def rle_decode(data, N, M, out=None):
+    """Decodes a row-delta + RLE frame into an N x M array, raises ValueError if corrupted"""
+    pairs = np.frombuffer(data, dtype=np.uint8)
+
+    if pairs.size % 2:
+        raise ValueError("Odd RLE length")
+
+    counts = pairs[0::2]
+    if counts.sum(dtype=np.int64) != N*M or not counts.all():
+        raise ValueError("Bad RLE pixel count")
+
+    deltas = np.repeat(pairs[1::2], counts).reshape(N, M)
+    return np.cumsum(deltas, axis=1, dtype=np.uint8, out=out)
+
+def pack_packet(*parts):
+    """Frames a packet the way comm_ridope_packet_begin/write/end() put it on the wire"""
+    body = b"".join(parts)
+    crc = crc_hqx(body, CRC_INIT)
+    return DELIMITER + cobs_encode(body + crc.to_bytes(2, "little")) + DELIMITER
+
+def pack_cmd(command, real=0, imag=0):
+    return pack_packet(cmd_struct.pack(command.value, real, imag))
+
+def pack_msg(command, real=0, imag=0):
+    """Packs a message the way comm_ridope_send_cmd() puts it on the wire"""
+    return pack_packet(msg_struct.pack(command.value, real, imag))
+
+def pack_chunk(offset, pixels):
+    return pack_packet(chunk_struct.pack(cmd.TRANS_FRAME.value, offset), pixels)
+
+def check_packet(packet):
+    """COBS decodes a packet and checks its CRC, returns the body with the CRC"""
+    body = cobs_decode(packet)
+
+    if len(body) < 6:
+        raise ValueError("Packet too short")
+
+    if crc_hqx(memoryview(body)[:-2], CRC_INIT) != int.from_bytes(body[-2:], "little"):
+        raise ValueError("Bad CRC")
+
+    return body
+
+def unpack_packet(packet):
+    """Decodes the bytes between two delimiters, raises ValueError if corrupted"""
+    body = check_packet(packet)
+    command = int.from_bytes(body[:4], "little")
+
+    if command == cmd.TRANS_FRAME.value:
+        _, offset = chunk_struct.unpack_from(body)
+        payload = memoryview(body)[chunk_struct.size:-2]
+        return Message(command, offset, len(payload), payload)
+
+    if len(body) != MSG_SIZE + 2:
+        raise ValueError("Bad message length")
+
+    return Message(*msg_struct.unpack_from(body))
+
+def unpack_request(packet):
+    """Decodes a command sent to the firmware, every request is a COMM_RIDOPE_CMD_TYPE_t"""
+    body = check_packet(packet)
+
+    if len(body) != cmd_struct.size + 2:
+        raise ValueError("Bad request length")
+
+    return Message(*cmd_struct.unpack_from(body))
@@ -1,176 +1,175 @@
 #!/usr/bin/python3
+import argparse
 import serial
-import os, fnmatch
 import sys
 import traceback
-import subprocess
-import numpy as np
-from scipy.io import savemat
 from PIL import Image
 import threading, queue
-import time
-from struct import *
-from enum import Enum
 import matplotlib.pyplot as plt
-import schedule
 
-cmd = Enum('CMD_TYPE', 'REBOOT TRANS_PHOTO TRANS_FFT TRANS_IFFT PHOTO_SIZE START_TRANS STOP_TRANS OP_TIME HELP CAMERA_RST CAMERA_TRIG CAMERA_EXPO CAMERA_AVG CAMERA_SIZE CAMERA_FOV CAMERA_IMG VGA_SIZE NULL_CMD', start=48)
+from comm_ridope import cmd, DELIMITER, ENC_RAW, ENC_RLE, pack_cmd
+from ridope_ae import AutoExposure
+from ridope_frames import FramePool, FrameAssembler
+from ridope_link import DEFAULT_BAUDRATE, negotiate
+from ridope_parser import StreamParser
+from ridope_record import RecordingPort, ReplayPort
+from ridope_ring import RingWriter
+from ridope_sched import TriggerScheduler
+from ridope_sink import FrameSink, PngWriter
 
 tx_buffer = queue.Queue()
-rx_buffer = queue.Queue()
-uart = serial.Serial("/dev/ttyUSB0", 115200)
-
-next_img = True
-image_name = ""
-
-tx_buffer.put("\n".encode())
+frame_pool = FramePool(count=4, size=28*28, policy="drop")
+sinks = [FrameSink(PngWriter(".", "result.png"))]
+parser = argparse.ArgumentParser(description="RIDOPE camera viewer")
+parser.add_argument("--port",     default="/dev/ttyUSB0",               help="Serial port")
+parser.add_argument("--baudrate", default=DEFAULT_BAUDRATE, type=int,   help="Baudrate to negotiate with the firmware")
+parser.add_argument("--record",   default=None,                         help="Log every byte received to this file")
+parser.add_argument("--replay",   default=None,                         help="Replay this log instead of opening the port")
+parser.add_argument("--pace",     default="recorded",                   help="Replay pace: recorded or fast")
+args = parser.parse_args()
+
+if args.replay is not None:
+    uart = ReplayPort(args.replay, args.pace)
+else:
+    uart = serial.Serial(args.port, DEFAULT_BAUDRATE, timeout=0.5)
+    print("Baudrate: ", negotiate(uart, args.baudrate))
+
+    if args.record is not None:
+        uart = RecordingPort(uart, args.record)
+
+trig_cmd = cmd.TRANS_FRAME
+encoding = ENC_RLE
+auto_expo = None
+
+tx_buffer.put(DELIMITER)
 
 def tx():
     while True:
         item = tx_buffer.get()
         uart.write(item)
-        uart.write('\n'.encode())
         tx_buffer.task_done()
 
 def rx():
-    while True:
-        if uart.in_waiting != 0:
-            item = uart.read_until()
-            if(len(item) > 2):
-                if(item[1] >= cmd.REBOOT.value and item[1] <= cmd.NULL_CMD.value):
-                    format = "<cIffc"
-                        
-                    while(len(item) < calcsize(format)):
-                        item += uart.read_until()
-
-                    try:
-                        item_temp = unpack(format, item)
-                    except error as err:
-                        print(err)
-                        print("Got item len: ", len(item))
-
-
-                    rx_buffer.put(item_temp)
-
-                else:
-                    item = item.decode()
-                    #print(item, end="")
-            
-def get_img():
-    global image_name, next_img
-    N = 0
-    M = 0
-    time = 0
-    cont = 0
-    img_array = []
+    parser = StreamParser()
+    assembler = FrameAssembler(frame_pool, nack=send_resend_cmd)
 
-    while True:
-        item = rx_buffer.get()
-        rx_buffer.task_done() 
+    for item in parser.read(uart):
+        frame = assembler.feed(item)
 
-        if(item[1] == cmd.CAMERA_EXPO.value):
-            print("Cam expo: ", int(item[2]))
-        
-        if(item[1] == cmd.CAMERA_AVG.value):
-            print("Cam avg: ", int(item[2])) 
-
-        if(item[1] == cmd.PHOTO_SIZE.value):
-            N = int(item[2])
-            M = int(item[3])
-            #print('\033[1;35;48m'+ "pyGot size!" + '\033[1;37;0m')
-            img_array = np.zeros(N*M, dtype=np.uint8)
-        
-        elif(item[1] == cmd.OP_TIME.value):
-            time = item[2]
-            #print("FFT time: ", time)
- 
-        elif(item[1] == cmd.START_TRANS.value):
-            #print("pyGot start flag!")
-            flag = item[1]
-
-            while flag != cmd.STOP_TRANS.value:
-                item = rx_buffer.get()
-                rx_buffer.task_done() 
-
-                flag = item[1]
-
-                if(flag == cmd.TRANS_PHOTO.value):
-                    pixel = item[2]
-
-                    img_array[cont] = pixel
-                    cont += 1
-
-                    if(cont+1 == N*M):
-                        #print("pyGot in the end!")
-                        break
-
-            #print("pyGot stop flag!")
-            im_array_reshaped = np.reshape(img_array, (N,M))
-
-            im_array_normalized = im_array_reshaped / im_array_reshaped.max() # normalize the data to 0 - 1
-            im_array_normalized = 255 * im_array_normalized # Now scale by 255
-            im_array_normalized = im_array_normalized.astype(np.uint8)
-
-            im = Image.fromarray(im_array_reshaped, mode="L")
-            im.convert("L"). save("result.png")
-            plt.figure(1); plt.clf()
-            plt.imshow(im, cmap='gray',vmin=0, vmax=255)
-            #plt.show()
-            plt.pause(1)
-
-            N=0
-            M=0
-            cont = 0
-            img_array = []
-            next_img = True
-
-def run_timer_func():
+        if item.cmd == cmd.STOP_TRANS.value and not assembler.repairing:
+            scheduler.on_frame(frame)
+
+def get_img():
     while True:
-        schedule.run_pending()
-        time.sleep(1)
+        frame = frame_pool.get()
 
-# turn-on the tx thread
-threading.Thread(target=tx, daemon=True).start()
-threading.Thread(target=rx, daemon=True).start()
-threading.Thread(target=get_img, daemon=True).start()
-threading.Thread(target=run_timer_func, daemon=True).start()
+        print("Cam expo: ", frame.expo)
+        print("Cam avg: ", frame.avg)
+
+        if auto_expo is not None:
+            expo = auto_expo.update(frame)
+            if expo is not None:
+                tx_buffer.put(pack_cmd(cmd.CAMERA_EXPO, expo))
+
+        for sink in sinks:
+            sink.submit(frame)
+
+        # The pooled buffer is reused once released, the figure keeps a copy
+        im = Image.fromarray(frame.image.copy(), mode="L")
+        frame.release()
+
+        plt.figure(1); plt.clf()
+        plt.imshow(im, cmap='gray',vmin=0, vmax=255)
+        #plt.show()
+        plt.pause(0.01)
+
+def send_resend_cmd(offset, length):
+    tx_buffer.put(pack_cmd(cmd.RESEND, offset, length))
 
 def send_get_cmd():
-    data_send = pack("<iff", cmd.CAMERA_TRIG.value, 0,0)
+    data_send = pack_cmd(trig_cmd, encoding)
     tx_buffer.put(data_send)
 
+scheduler = TriggerScheduler(send_get_cmd, mode="max-rate", max_inflight=1)
 
-schedule.every(1).seconds.do(send_get_cmd)
+# turn-on the tx thread
+threading.Thread(target=tx, daemon=True).start()
+threading.Thread(target=rx, daemon=True).start()
+threading.Thread(target=get_img, daemon=True).start()
+scheduler.start()
 
 try:
     print("Available commands: ")
     print("get             - Gets image from FPGA")
     print("reboot           - Reboots the RISCV")
+    print("bulk             - Transfers the image as one raw payload (default)")
+    print("pixel            - Transfers the image one message per pixel")
+    print("raw              - Sends the bulk frames uncompressed")
+    print("rle              - Sends the bulk frames row-delta + RLE encoded (default)")
+    print("stats            - Shows the trigger and frame sinks stats")
+    print("rate             - Triggers at a fixed rate instead of after each frame")
+    print("record           - Records every frame in a memory-mapped ring file")
+    print("auto             - Toggles the auto-exposure")
     while True:        
         value = input()
 
         if(value=="expo"):
             expo_value = input("Exposition value: ")
 
-            data_send = pack("<iff", cmd.CAMERA_EXPO.value, int(expo_value),0)
+            data_send = pack_cmd(cmd.CAMERA_EXPO, int(expo_value))
             tx_buffer.put(data_send)
         
         if(value=="reboot"):
-            data_send = pack("<iff", cmd.REBOOT.value, 0,0)
+            data_send = pack_cmd(cmd.REBOOT)
             tx_buffer.put(data_send)
 
+        if(value=="bulk"):
+            trig_cmd = cmd.TRANS_FRAME
+
+        if(value=="pixel"):
+            trig_cmd = cmd.CAMERA_TRIG
+
+        if(value=="raw"):
+            encoding = ENC_RAW
+
+        if(value=="rle"):
+            encoding = ENC_RLE
+
+        if(value=="record"):
+            ring_path = input("Ring file: ")
+            ring_capacity = input("Ring capacity (frames): ")
+
+            sinks.append(FrameSink(RingWriter(ring_path, int(ring_capacity), 28, 28), maxsize=64, policy="block"))
+
+        if(value=="rate"):
+            period = input("Trigger period (s): ")
+
+            scheduler.stop()
+            scheduler = TriggerScheduler(send_get_cmd, mode="fixed-rate", period=float(period), max_inflight=1)
+            scheduler.start()
+
+        if(value=="auto"):
+            if auto_expo is None:
+                target = input("Target grey level: ")
+                auto_expo = AutoExposure(target=float(target))
+            else:
+                auto_expo = None
+
+        if(value=="stats"):
+            print(scheduler.stats())
+            for sink in sinks:
+                print(sink.stats())
+
 
 except KeyboardInterrupt:
         traceback.print_exc(file=sys.stdout)
         tx_buffer.join()    
-        rx_buffer.join()      
         uart.close()        
         print("\nGoodbye!\n")
         sys.exit()
 except:
     traceback.print_exc(file=sys.stdout)
     tx_buffer.join()    
-    rx_buffer.join()     
     uart.close()     
     sys.exit()
 
@@ -7,6 +7,7 @@
 #include <libbase/uart.h>
 
 void isr(void);
+void frame_dma_isr(void);
 
 #ifdef CONFIG_CPU_HAS_INTERRUPT
 
@@ -20,6 +21,11 @@ void isr(void)
 	if(irqs & (1 << UART_INTERRUPT))
 		uart_isr();
 #endif
+
+#ifdef FRAMEDMA_INTERRUPT
+	if(irqs & (1 << FRAMEDMA_INTERRUPT))
+		frame_dma_isr();
+#endif
 }
 
 #else
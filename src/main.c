@@ -164,8 +164,77 @@ void get_next_expo(uint32_t *expo, uint32_t avg)
 
 }
 
-static void get_img(uint32_t *expo){
+#ifdef CSR_FRAMEDMA_BASE
+/*-----------------------------------------------------------------------*/
+/* Frame DMA                                                             */
+/*-----------------------------------------------------------------------*/
+
+/* Frame buffers the DMA rotates over, the held one is never written */
+static uint8_t dma_buffers[FRAME_BUFFERS][IMG_WIDTH*IMG_HEIGTH] __attribute__((aligned(4)));
+static uint32_t dma_seq = 0;
+
+/* Last frame sent, held until the next one so it can be resent */
+static uint8_t *frame = dma_buffers[0];
+
+void frame_dma_isr(void)
+{
+	/* The frames are tracked with the sequence CSR, the event only wakes the CPU */
+	framedma_ev_pending_write(framedma_ev_pending_read());
+}
+
+static void frame_dma_init(void)
+{
+	framedma_control_write(0);
+	framedma_base_write((uint32_t) dma_buffers);
+	framedma_spacing_write(sizeof(dma_buffers[0]));
+	framedma_length_write(sizeof(dma_buffers[0]));
+	framedma_line_write(IMG_WIDTH);
+	framedma_stride_write(IMG_WIDTH);
+	framedma_hold_write(0);
+
+	framedma_ev_pending_write(framedma_ev_pending_read());
+	framedma_ev_enable_write(1);
+#ifdef FRAMEDMA_INTERRUPT
+	irq_setmask(irq_getmask() | (1 << FRAMEDMA_INTERRUPT));
+#endif
+	framedma_control_write(
+		(1 << CSR_FRAMEDMA_CONTROL_ENABLE_OFFSET) |
+		(FRAME_BUFFERS << CSR_FRAMEDMA_CONTROL_BUFFERS_OFFSET));
+}
+
+/* Holds the latest complete buffer once a frame newer than the last one sent is written */
+static void frame_dma_get(void)
+{
+	uint32_t timeout = FRAME_DMA_TIMEOUT;
+	uint32_t buffers, index;
+
+	while(framedma_frames_read() == dma_seq && timeout--);
+
+	/* The writer may start on the latest before the hold is seen, take the new latest then */
+	do {
+		dma_seq = framedma_frames_read();
+		buffers = framedma_buffers_read();
+		index = (buffers >> CSR_FRAMEDMA_BUFFERS_LATEST_OFFSET) & ((1 << CSR_FRAMEDMA_BUFFERS_LATEST_SIZE) - 1);
+		framedma_hold_write((1 << CSR_FRAMEDMA_HOLD_VALID_OFFSET) | (index << CSR_FRAMEDMA_HOLD_INDEX_OFFSET));
+		buffers = framedma_buffers_read();
+	} while(((buffers >> CSR_FRAMEDMA_BUFFERS_WRITING_OFFSET) & ((1 << CSR_FRAMEDMA_BUFFERS_WRITING_SIZE) - 1)) == index);
+
+	frame = dma_buffers[index];
+	flush_cpu_dcache();
+}
+#else
+/* Copy of the last frame sent, the camera keeps writing at LOGIC_MEMORY_BASE */
+static uint8_t frame[IMG_WIDTH*IMG_HEIGTH];
+#endif
+
+static void get_img(uint32_t *expo, CMD_TYPE_t img_type, uint32_t encoding){
 	printf("Got it!\n");
+
+#ifdef CSR_FRAMEDMA_BASE
+	frame_dma_get();
+#else
+	memcpy(frame, data, sizeof(frame));
+#endif
 	
 	//uint32_t avg = get_avg(data, IMG_WIDTH, IMG_HEIGTH);
 
@@ -185,7 +254,13 @@ static void get_img(uint32_t *expo){
 	
 	printf("Sending img!\n");
 
-	comm_ridope_send_img(data,TRANS_PHOTO, IMG_WIDTH, IMG_HEIGTH);
+	if(img_type == TRANS_FRAME)
+	{
+		comm_ridope_send_frame(frame, IMG_WIDTH, IMG_HEIGTH, encoding);
+	}else
+	{
+		comm_ridope_send_img(frame, img_type, IMG_WIDTH, IMG_HEIGTH);
+	}
 	printf("Done sending!\n");
 
 	
@@ -231,6 +306,9 @@ int main(void)
 		irq_setie(1);
 	#endif
 	uart_init();
+#ifdef CSR_FRAMEDMA_BASE
+	frame_dma_init();
+#endif
 
 	help();
 	prompt();
@@ -244,10 +322,28 @@ int main(void)
 
 		if(rx_msg.msg_data.cmd == CAMERA_TRIG)
 		{	
-			get_img(&expo);
+			get_img(&expo, TRANS_PHOTO, COMM_RIDOPE_ENC_RAW);
+		}else if(rx_msg.msg_data.cmd == TRANS_FRAME)
+		{
+			// The requested encoding is in the real part of the command
+			get_img(&expo, TRANS_FRAME, crealf(rx_msg.msg_data.data));
 		}else if(rx_msg.msg_data.cmd == CAMERA_EXPO)
 		{
-			set_exposure(crealf(rx_msg.msg_data.data));
+			expo = crealf(rx_msg.msg_data.data);
+			set_exposure(expo);
+
+			// Confirms the new exposure to the host
+			rx_msg.msg_data.data = expo;
+			comm_ridope_send_cmd(&rx_msg);
+		}else if(rx_msg.msg_data.cmd == UART_BAUD)
+		{
+			comm_ridope_set_baudrate(crealf(rx_msg.msg_data.data));
+		}else if(rx_msg.msg_data.cmd == RESEND)
+		{
+			comm_ridope_resend_frame(frame, IMG_WIDTH, IMG_HEIGTH, crealf(rx_msg.msg_data.data), cimagf(rx_msg.msg_data.data));
+		}else if(rx_msg.msg_data.cmd == PING)
+		{
+			comm_ridope_send_cmd(&rx_msg);
 		}else if(rx_msg.msg_data.cmd == REBOOT)
 		{
 			reboot_cmd();
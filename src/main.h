@@ -7,6 +7,7 @@
 #include <string.h>
 
 #include <irq.h>
+#include <system.h>
 #include <libbase/uart.h>
 #include <libbase/console.h>
 #include "/home/lucas/camera-application/target/build/terasic_de10lite/software/include/generated/csr.h"
@@ -23,6 +24,8 @@ typedef struct  {
 #define IMG_WIDTH           28
 #define IMG_HEIGTH          28
 #define LOGIC_MEMORY_BASE   (MMAP_M_1_BASE+0xC40)
+#define FRAME_BUFFERS       3
+#define FRAME_DMA_TIMEOUT   10000000    // Polls of the frame counter before sending the latest buffer again
 
 uint8_t *data = (uint8_t *)  LOGIC_MEMORY_BASE;
 
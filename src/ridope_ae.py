@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Host side auto-exposure
+
+import numpy as np
+
+EXPO_MIN = 1
+EXPO_MAX = (1 << 24) - 1    # Exposure field of the camera input CSR
+
+def frame_level(image, percentile=None):
+    """Mean grey level of the frame, or the grey level below which `percentile` % of the pixels are"""
+    if percentile is None:
+        return float(image.mean())
+
+    hist = np.bincount(image.ravel(), minlength=256)
+    cdf = np.cumsum(hist)
+    return float(np.searchsorted(cdf, cdf[-1]*percentile/100.0))
+
+class AutoExposure:
+    """
+    Controller of the sensor exposure, driving CAMERA_EXPO.
+
+    The sensor response is close to linear in the exposure, so the controller
+    works on log(target/level): with kp=1 a single frame brings the level to
+    the target, instead of the fixed steps of get_next_expo() in main.c. The
+    correction is applied to the exposure the frame was taken with, so the
+    controller already integrates the error and has no integral term.
+    Frames still taken with a previous exposure are skipped (up to
+    `max_skip` of them), so the pipeline latency does not make it overshoot.
+    """
+
+    def __init__(self, target=61, percentile=None, kp=0.8, tolerance=2, max_skip=3, expo_min=EXPO_MIN, expo_max=EXPO_MAX):
+        self.target = target
+        self.percentile = percentile
+        self.kp = kp
+        self.tolerance = tolerance
+        self.max_skip = max_skip
+        self.expo_min = expo_min
+        self.expo_max = expo_max
+
+        self.pending = None
+        self.skipped = 0
+        self.level = None
+        self.updates = 0
+
+    def update(self, frame):
+        """Returns the exposure to send after this frame, None to keep the current one"""
+        if self.pending is not None and frame.expo != self.pending and self.skipped < self.max_skip:
+            self.skipped += 1
+            return None
+
+        self.pending = None
+        self.skipped = 0
+        self.level = frame_level(frame.image, self.percentile)
+
+        if abs(self.target - self.level) <= self.tolerance:
+            return None
+
+        error = np.log(self.target / max(self.level, 1.0))
+        expo = frame.expo * np.exp(self.kp*error)
+        expo = int(np.clip(round(expo), self.expo_min, self.expo_max))
+
+        if expo == frame.expo:
+            return None
+
+        self.pending = expo
+        self.updates += 1
+        return expo
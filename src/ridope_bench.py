@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Benchmarks of the host receive path (parse, decode, assemble)
+
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from comm_ridope import cmd, DELIMITER, ENC_RAW, ENC_RLE, pack_cmd
+from ridope_frames import FramePool, FrameAssembler
+from ridope_parser import StreamParser, synthetic_stream
+
+def percentiles(values):
+    if not values:
+        return None
+
+    values = 1e3*np.array(values)
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+def bench_stream(name, stream, chunk_size=4096):
+    """Feeds a recorded byte stream through the parser and the frame assembler"""
+    parser = StreamParser()
+    pool = FramePool(count=2, size=0, policy="drop")
+    assembler = FrameAssembler(pool)
+
+    pixels = 0
+    frame_start = 0.0
+    latencies = []
+
+    cpu = time.process_time()
+    start = time.perf_counter()
+
+    for pos in range(0, len(stream), chunk_size):
+        for item in parser.feed(stream[pos:pos+chunk_size]):
+            if item.cmd == cmd.PHOTO_SIZE.value:
+                frame_start = time.perf_counter()
+
+            frame = assembler.feed(item)
+
+            if frame is not None:
+                latencies.append(time.perf_counter() - frame_start)
+                pixels += frame.N*frame.M
+                pool.get(0).release()
+
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    frames = assembler.completed
+
+    return {
+        "name": name,
+        "bytes": len(stream),
+        "frames": frames,
+        "incomplete": assembler.incomplete,
+        "messages": parser.messages,
+        "desyncs": parser.desyncs,
+        "frames_per_s": frames/elapsed,
+        "messages_per_s": parser.messages/elapsed,
+        "bytes_per_pixel": len(stream)/pixels if pixels else None,
+        "compression_ratio": assembler.pixels/assembler.payload if assembler.payload else None,
+        "cpu_ms_per_frame": 1e3*cpu/frames if frames else None,
+        "assembly_latency_ms": percentiles(latencies),
+    }
+
+def bench_live(name, count=20, N=28, M=28, bulk=True, baudrate=115200, corrupt=0.0, timeout=5.0, encoding=ENC_RAW, noise=4.0):
+    """Captures frames from the emulator, latencies are from the trigger to the assembled frame"""
+    import serial
+    from ridope_emu import DeviceEmulator
+    from ridope_sched import TriggerScheduler
+
+    emu = DeviceEmulator(N, M, baudrate, corrupt, seed=0, noise=noise).start()
+    uart = serial.Serial(emu.port, 115200, timeout=0.1)
+    pool = FramePool(count=4, size=N*M, policy="drop")
+    stop = threading.Event()
+    tx_lock = threading.Lock()
+
+    def send(data):
+        with tx_lock:
+            uart.write(data)
+
+    trigger = pack_cmd(cmd.TRANS_FRAME, encoding) if bulk else pack_cmd(cmd.CAMERA_TRIG)
+    scheduler = TriggerScheduler(lambda: send(trigger), timeout=timeout)
+    parser = StreamParser()
+    assembler = FrameAssembler(pool, nack=lambda offset, length: send(pack_cmd(cmd.RESEND, offset, length)))
+
+    def rx():
+        for item in parser.read(uart, stop):
+            frame = assembler.feed(item)
+
+            if item.cmd == cmd.STOP_TRANS.value and not assembler.repairing:
+                scheduler.on_frame(frame)
+
+    rx_thread = threading.Thread(target=rx, daemon=True)
+    rx_thread.start()
+    send(DELIMITER)
+
+    cpu = time.process_time()
+    start = time.perf_counter()
+    scheduler.start()
+
+    frames = 0
+    while frames < count:
+        frame = pool.get(timeout=timeout)
+        if frame is None:
+            # The scheduler retries the trigger of a lost STOP_TRANS
+            if scheduler.lost:
+                break
+            continue
+        frame.release()
+        frames += 1
+
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+
+    scheduler.stop()
+    stop.set()
+    rx_thread.join()
+    uart.close()
+    emu.stop()
+
+    stats = scheduler.stats()
+    latencies = list(scheduler.latencies)
+
+    return {
+        "name": name,
+        "bytes": parser.bytes_in,
+        "frames": frames,
+        "incomplete": stats["incomplete"],
+        "lost": stats["lost"],
+        "repaired": assembler.repaired,
+        "resent_chunks": assembler.resent,
+        "resent_bytes": assembler.resent_bytes,
+        "messages": parser.messages,
+        "desyncs": parser.desyncs,
+        "frames_per_s": frames/elapsed,
+        "messages_per_s": parser.messages/elapsed,
+        "bytes_per_pixel": parser.bytes_in/(frames*N*M) if frames else None,
+        "compression_ratio": assembler.pixels/assembler.payload if assembler.payload else None,
+        "cpu_ms_per_frame": 1e3*cpu/frames if frames else None,
+        "trigger_latency_ms": percentiles(latencies),
+    }
+
+def sp_frames(frames, N, M, seed=0):
+    """Emulator-like frames, every other one plain noise"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:N, 0:M]
+
+    for i in range(frames):
+        if i % 2:
+            yield rng.integers(0, 256, (N, M), dtype=np.uint8)
+        else:
+            image = 64 + 4*((x + y + i) % 32) + rng.normal(0, 4.0, (N, M))
+            yield np.clip(image, 0, 255).astype(np.uint8)
+
+def bench_sp(frames=50, N=28, M=28, high=100, low=50, op_time=None):
+    """Checks the ridope_sp port against ridope_sp.c built for the host and times ridope_canny() on both"""
+    import ridope_sp
+    from ridope_sp.host import build_library, Host
+
+    images = list(sp_frames(frames, N, M))
+    ridope_sp.canny(images[0], high, low)
+
+    start = time.perf_counter()
+    for image in images:
+        ridope_sp.canny(image, high, low)
+    numpy_s = (time.perf_counter() - start)/frames
+
+    result = {
+        "name": "sp-canny",
+        "frames": frames,
+        "numpy_ms_per_frame": 1e3*numpy_s,
+        "host_c_ms_per_frame": None,
+        "firmware_ms_per_frame": op_time,
+        "speedup_vs_firmware": op_time/(1e3*numpy_s) if op_time else None,
+        "mismatches": None,
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        library = build_library(directory)
+        if library is None:
+            return result
+
+        host = Host(library)
+
+        start = time.perf_counter()
+        for image in images:
+            host.canny(image, high, low)
+        result["host_c_ms_per_frame"] = 1e3*(time.perf_counter() - start)/frames
+
+        # Every stage is checked on the inputs the C gives it
+        mismatches = dict.fromkeys(["otsu", "gaussian", "sobel", "mag_ang", "nms", "tracking", "canny"], 0)
+        for image in images:
+            out, threshold = host.otsu(image)
+            mismatches["otsu"] += not np.array_equal(out, ridope_sp.otsu(image)[0]) or threshold != ridope_sp.otsu(image)[1]
+
+            smooth = host.gaussian_filter(image)
+            mismatches["gaussian"] += not np.array_equal(smooth, ridope_sp.gaussian_filter(image))
+
+            gx, gy = host.sobel_filter(smooth)
+            mismatches["sobel"] += not all(map(np.array_equal, (gx, gy), ridope_sp.sobel_filter(smooth)))
+
+            mag, ang = host.get_mag_ang(gx, gy)
+            mismatches["mag_ang"] += not all(map(np.array_equal, (mag, ang), ridope_sp.get_mag_ang(gx, gy)))
+
+            nms = host.non_max_supression(mag, ang)
+            mismatches["nms"] += not np.array_equal(nms, ridope_sp.non_max_supression(mag, ang))
+
+            mismatches["tracking"] += not np.array_equal(host.edge_tracking(nms, high, low), ridope_sp.edge_tracking(nms, high, low))
+            mismatches["canny"] += not np.array_equal(host.canny(image, high, low), ridope_sp.canny(image, high, low))
+
+        result["mismatches"] = mismatches
+
+    return result
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the RIDOPE host receive path")
+    parser.add_argument("--stream",   default=None,               help="Recorded byte stream to benchmark instead of the synthetic ones")
+    parser.add_argument("--frames",   default=50, type=int,       help="Frames of the synthetic streams")
+    parser.add_argument("--height",   default=28, type=int,       help="Frame height")
+    parser.add_argument("--width",    default=28, type=int,       help="Frame width")
+    parser.add_argument("--live",     action="store_true",        help="Also capture from the emulator at --baudrate")
+    parser.add_argument("--baudrate", default=115200, type=int,   help="Emulated baudrate (0: unthrottled)")
+    parser.add_argument("--corrupt",  default=0.0, type=float,    help="Emulated per-byte corruption probability")
+    parser.add_argument("--noise",    default=4.0, type=float,    help="Emulated pixel noise, lower compresses better")
+    parser.add_argument("--sp",       action="store_true",        help="Also check and time the NumPy port of ridope_sp.c")
+    parser.add_argument("--op-time",  default=None, type=float,   help="Firmware OP_TIME of ridope_canny() on one frame, in ms")
+    parser.add_argument("--output",   default=None,               help="Append the results as one JSON line to this file")
+    args = parser.parse_args()
+
+    results = []
+
+    if args.stream is not None:
+        with open(args.stream, "rb") as f:
+            results.append(bench_stream(args.stream, f.read()))
+    else:
+        N, M = args.height, args.width
+        results.append(bench_stream("pixel", synthetic_stream(args.frames, N, M, bulk=False)))
+        results.append(bench_stream("bulk", synthetic_stream(args.frames, N, M, bulk=True)))
+        results.append(bench_stream("bulk-rle", synthetic_stream(args.frames, N, M, bulk=True, encoding=ENC_RLE)))
+
+    if args.live:
+        count = min(args.frames, 20)
+        results.append(bench_live("live-bulk", count, args.height, args.width, True, args.baudrate or None, args.corrupt, noise=args.noise))
+        results.append(bench_live("live-bulk-rle", count, args.height, args.width, True, args.baudrate or None, args.corrupt, encoding=ENC_RLE, noise=args.noise))
+
+    if args.sp:
+        results.append(bench_sp(args.frames, args.height, args.width, op_time=args.op_time))
+
+    report = {
+        "timestamp": time.time(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+    line = json.dumps(report)
+    print(line)
+
+    if args.output is not None:
+        with open(args.output, "a") as f:
+            f.write(line + "\n")
+
+if __name__ == "__main__":
+    main()
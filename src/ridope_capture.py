@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Headless capture of the RIDOPE camera
+
+import time
+START = time.perf_counter()
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+
+from comm_ridope import cmd, DELIMITER, ENCODINGS, pack_cmd
+from ridope_ae import AutoExposure
+from ridope_frames import FramePool, FrameAssembler
+from ridope_link import negotiate
+from ridope_parser import StreamParser
+from ridope_sched import TriggerScheduler
+from ridope_sink import FrameSink, NpyWriter, PngWriter, MatWriter
+
+# Modules get-img.py loads before opening the port
+GUI_MODULES = "import numpy, serial, scipy.io, PIL.Image, matplotlib.pyplot, schedule"
+
+def make_writer(args):
+    if args.format == "npy":
+        return NpyWriter(args.output)
+    if args.format == "png":
+        return PngWriter(args.output)
+    if args.format == "mat":
+        return MatWriter(args.output, batch=args.batch)
+    if args.format == "ring":
+        from ridope_ring import RingWriter
+        return RingWriter(os.path.join(args.output, "frames.ring"), args.ring_capacity, args.height, args.width)
+    return None
+
+def startup_benchmark(runs=5):
+    """Wall time of a fresh interpreter importing the headless tool vs the get-img.py modules"""
+    def measure(code):
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    baseline = measure("pass")
+    headless = measure("import ridope_capture")
+    try:
+        gui = measure(GUI_MODULES)
+    except subprocess.CalledProcessError:
+        gui = None
+
+    return {
+        "interpreter_s": baseline,
+        "headless_import_s": headless - baseline,
+        "get_img_import_s": gui - baseline if gui is not None else None,
+    }
+
+def capture(args):
+    import serial
+
+    # Workers are forked before any thread starts
+    pipeline = None
+    if args.process is not None:
+        from ridope_pipeline import JOBS, ProcessingPipeline
+
+        job, job_args = JOBS[args.process]
+        pipeline = ProcessingPipeline(job, job_args, args.workers or None, size=args.height*args.width)
+        processed = 0
+
+    uart = serial.Serial(args.port, args.baudrate, timeout=0.5)
+    if args.link_baudrate:
+        negotiate(uart, args.link_baudrate)
+    if args.record is not None:
+        from ridope_record import RecordingPort
+        uart = RecordingPort(uart, args.record)
+    pool = FramePool(count=4, size=args.height*args.width, policy="block")
+    writer = make_writer(args)
+    sink = FrameSink(writer, maxsize=64, policy="block") if writer is not None else None
+    stop = threading.Event()
+    auto_expo = AutoExposure(args.ae_target, args.ae_percentile) if args.ae_target is not None else None
+    tx_lock = threading.Lock()
+
+    def send(data):
+        with tx_lock:
+            uart.write(data)
+
+    trigger = pack_cmd(cmd.TRANS_FRAME, ENCODINGS[args.encoding]) if args.bulk else pack_cmd(cmd.CAMERA_TRIG)
+    scheduler = TriggerScheduler(lambda: send(trigger), mode=args.mode, period=args.period,
+        max_inflight=args.inflight, timeout=args.timeout, retries=args.retries)
+
+    # Resends are only answered in order with a single trigger in flight
+    nack = (lambda offset, length: send(pack_cmd(cmd.RESEND, offset, length))) if args.inflight == 1 else None
+    assembler = FrameAssembler(pool, nack)
+    parser = StreamParser()
+
+    op_time = None
+    server = None
+    logger = None
+    if args.metrics_port or args.metrics_log:
+        from ridope_metrics import Metrics, MetricsServer, MetricsLogger, capture_metrics
+
+        metrics = Metrics()
+        latency, op_time = capture_metrics(metrics, parser, assembler, pool, scheduler, [sink] if sink is not None else [])
+        scheduler.on_latency = latency.observe
+        if pipeline is not None:
+            metrics.gauge("ridope_pipeline_depth", "Frames submitted to the processing pipeline and not done", lambda: pipeline.seq - pipeline.next_seq)
+        if args.metrics_port:
+            server = MetricsServer(metrics, args.metrics_port).start()
+        if args.metrics_log:
+            logger = MetricsLogger(metrics, args.metrics_log).start()
+
+    def rx():
+        for item in parser.read(uart, stop):
+            frame = assembler.feed(item)
+
+            if item.cmd == cmd.STOP_TRANS.value and not assembler.repairing:
+                scheduler.on_frame(frame)
+
+    rx_thread = threading.Thread(target=rx, daemon=True)
+    rx_thread.start()
+
+    send(DELIMITER)
+    first = time.perf_counter() - START
+    scheduler.start()
+
+    received = 0
+    start = time.perf_counter()
+
+    while args.count == 0 or received < args.count:
+        frame = pool.get(timeout=args.timeout)
+        if frame is None:
+            continue
+
+        if op_time is not None and frame.op_time:
+            op_time.observe(frame.op_time)
+
+        if auto_expo is not None:
+            expo = auto_expo.update(frame)
+            if expo is not None:
+                send(pack_cmd(cmd.CAMERA_EXPO, expo))
+
+        if sink is not None:
+            sink.submit(frame)
+        if pipeline is not None:
+            pipeline.submit(frame)
+            processed += sum(1 for _ in pipeline.results(timeout=0))
+        frame.release()
+        received += 1
+
+    elapsed = time.perf_counter() - start
+
+    scheduler.stop()
+    stop.set()
+    rx_thread.join()
+    uart.close()
+
+    if sink is not None:
+        sink.close()
+
+    if pipeline is not None:
+        for _ in pipeline.results(timeout=args.timeout):
+            processed += 1
+            if processed == pipeline.submitted:
+                break
+        pipeline.close()
+
+    if server is not None:
+        server.stop()
+    if logger is not None:
+        logger.stop()
+
+    stats = {
+        "first_trigger_s": first,
+        "baudrate": uart.baudrate,
+        "frames": received,
+        "frames/s": received/elapsed,
+        "repaired": assembler.repaired,
+        "resent_chunks": assembler.resent,
+        "resent_bytes": assembler.resent_bytes,
+        "scheduler": scheduler.stats(),
+    }
+    if sink is not None:
+        stats["sink"] = sink.stats()
+    if pipeline is not None:
+        stats["pipeline"] = pipeline.stats()
+    if auto_expo is not None:
+        stats["auto_expo"] = {"updates": auto_expo.updates, "level": auto_expo.level}
+
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless capture of the RIDOPE camera")
+    parser.add_argument("--port",          default="/dev/ttyUSB0",      help="Serial port")
+    parser.add_argument("--baudrate",      default=115200, type=int,    help="Serial baudrate")
+    parser.add_argument("--link-baudrate", default=0, type=int,         help="Baudrate to negotiate with the firmware (0: keep --baudrate)")
+    parser.add_argument("--output",        default="frames",            help="Output directory")
+    parser.add_argument("--format",        default="npy",               help="Output format: npy, png, mat, ring or none")
+    parser.add_argument("--count",         default=0, type=int,         help="Number of frames to capture (0: forever)")
+    parser.add_argument("--timeout",       default=5.0, type=float,     help="Frame timeout in seconds")
+    parser.add_argument("--height",        default=28, type=int,        help="Frame height")
+    parser.add_argument("--width",         default=28, type=int,        help="Frame width")
+    parser.add_argument("--batch",         default=100, type=int,       help="Frames per .mat file")
+    parser.add_argument("--ring-capacity", default=10000, type=int,     help="Frames kept by the ring file")
+    parser.add_argument("--mode",          default="max-rate",          help="Trigger mode: max-rate or fixed-rate")
+    parser.add_argument("--period",        default=1.0, type=float,     help="Trigger period in fixed-rate mode (s)")
+    parser.add_argument("--inflight",      default=1, type=int,         help="Max triggers waiting for their frame")
+    parser.add_argument("--retries",       default=2, type=int,         help="Trigger retries of a lost frame")
+    parser.add_argument("--pixel",         action="store_true",         help="Transfer one message per pixel instead of raw frames")
+    parser.add_argument("--encoding",      default="rle",               help="Frame encoding: raw or rle (sent raw when it does not compress)")
+    parser.add_argument("--ae-target",     default=None, type=float,    help="Auto-exposure target grey level (default: off)")
+    parser.add_argument("--ae-percentile", default=None, type=float,    help="Regulate this percentile of the histogram instead of the mean")
+    parser.add_argument("--process",       default=None,                help="Processing job run on every frame: canny or otsu (default: none)")
+    parser.add_argument("--workers",       default=0, type=int,         help="Processing worker processes (0: one per core)")
+    parser.add_argument("--record",        default=None,                help="Log every byte received to this file, see ridope_record.py")
+    parser.add_argument("--metrics-port",  default=0, type=int,         help="Serve Prometheus metrics on localhost at this port (0: off)")
+    parser.add_argument("--metrics-log",   default=0.0, type=float,     help="Log the metrics as a JSON line to stderr every this many seconds (0: off)")
+    parser.add_argument("--startup-bench", action="store_true",         help="Measure the import time of the headless tool and exit")
+    args = parser.parse_args()
+    args.bulk = not args.pixel
+
+    if args.startup_bench:
+        print(json.dumps(startup_benchmark()))
+        return
+
+    try:
+        print(json.dumps(capture(args)))
+    except KeyboardInterrupt:
+        print("\nGoodbye!\n")
+
+if __name__ == "__main__":
+    main()
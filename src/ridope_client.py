@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# asyncio client of the RIDOPE firmware
+
+import argparse
+import asyncio
+import time
+from collections import deque
+from typing import NamedTuple, Any
+
+import serial
+
+from comm_ridope import cmd, DELIMITER, ENC_RLE, pack_cmd
+from ridope_frames import Frame, FrameAssembler
+from ridope_parser import StreamParser
+
+class Request(NamedTuple):
+    done: int
+    future: Any
+
+class RidopeCamera:
+    """
+    asyncio client of the RIDOPE firmware over a serial port.
+
+    The firmware runs one command at a time, so responses come back in request
+    order and every response belongs to the oldest pending request. This lets
+    up to max_inflight requests be sent without waiting for the previous ones.
+    Every completed frame also goes to the frames() stream.
+
+    A request without response after `timeout` seconds fails with
+    TimeoutError. Its response may only be late, so the request stays
+    pending to take it for another `timeout` seconds, and no new request is
+    sent meanwhile. A late response is dropped instead of completing the
+    next request.
+    """
+
+    def __init__(self, port, baudrate=115200, max_inflight=4, queue_size=8, on_text=None, timeout=5.0):
+        self.port = port
+        self.baudrate = baudrate
+        self.parser = StreamParser(on_text=on_text)
+        self.assembler = FrameAssembler()
+        self.pending = deque()
+        self.inflight = asyncio.Semaphore(max_inflight)
+        self.stale = []
+        self.drained = asyncio.Event()
+        self.drained.set()
+        self.queue = asyncio.Queue(queue_size)
+        self.timeout = timeout
+        self.uart = None
+        self.loop = None
+        self.dropped = 0
+        self.timeouts = 0
+
+    async def open(self):
+        self.loop = asyncio.get_running_loop()
+        self.uart = serial.Serial(self.port, self.baudrate, timeout=0)
+        self.loop.add_reader(self.uart.fileno(), self.on_readable)
+        self.uart.write(DELIMITER)
+        return self
+
+    async def close(self):
+        self.loop.remove_reader(self.uart.fileno())
+        self.uart.close()
+
+        while self.pending:
+            request = self.pending.popleft()
+            if not request.future.done():
+                request.future.set_exception(ConnectionError("Camera closed"))
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def request(self, data, done):
+        await self.drained.wait()
+        await self.inflight.acquire()
+
+        request = Request(done, self.loop.create_future())
+        self.pending.append(request)
+        self.uart.write(data)
+
+        try:
+            return await asyncio.wait_for(request.future, self.timeout)
+        except asyncio.TimeoutError:
+            # Stays pending until its response or expire()
+            self.stale.append(request)
+            self.drained.clear()
+            self.loop.call_later(self.timeout, self.expire, request)
+            self.timeouts += 1
+            raise
+
+    def expire(self, request):
+        """The response of a timed out request is lost, frees its slot"""
+        if request in self.pending:
+            self.pending.remove(request)
+            self.inflight.release()
+        self.drain(request)
+
+    def drain(self, request):
+        if request in self.stale:
+            self.stale.remove(request)
+        if not self.stale:
+            self.drained.set()
+
+    async def trigger(self, bulk=True, encoding=ENC_RLE):
+        """Takes a picture and returns its Frame, bulk frames are sent with `encoding` if it makes them smaller"""
+        data = pack_cmd(cmd.TRANS_FRAME, encoding) if bulk else pack_cmd(cmd.CAMERA_TRIG)
+        return await self.request(data, cmd.STOP_TRANS.value)
+
+    async def set_exposure(self, expo):
+        """Sets the sensor exposure and returns the one confirmed by the firmware"""
+        return await self.request(pack_cmd(cmd.CAMERA_EXPO, int(expo)), cmd.CAMERA_EXPO.value)
+
+    async def reboot(self):
+        self.uart.write(pack_cmd(cmd.REBOOT))
+
+    async def frames(self):
+        """Yields every frame received, the oldest ones are dropped if not consumed"""
+        while True:
+            yield await self.queue.get()
+
+    def on_readable(self):
+        data = self.uart.read(self.uart.in_waiting or 1)
+
+        for item in self.parser.feed(data):
+            self.dispatch(item)
+
+    def complete(self, result):
+        request = self.pending.popleft()
+        self.inflight.release()
+        self.drain(request)
+
+        if request.future.done():
+            return
+
+        if isinstance(result, Exception):
+            request.future.set_exception(result)
+        else:
+            request.future.set_result(result)
+
+    def dispatch(self, item):
+        done = self.pending[0].done if self.pending else None
+        frame = self.assembler.feed(item)
+
+        if item.cmd == cmd.CAMERA_EXPO.value and done == item.cmd:
+            self.complete(self.assembler.expo)
+
+        elif item.cmd == cmd.STOP_TRANS.value:
+            if frame is not None:
+                if self.queue.full():
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                self.queue.put_nowait(frame)
+
+            if done == item.cmd:
+                self.complete(frame if frame is not None else IOError("Incomplete frame"))
+
+async def run(args):
+    async with RidopeCamera(args.port, args.baudrate, timeout=args.timeout) as cam:
+        if args.expo is not None:
+            print("Cam expo: ", await cam.set_exposure(args.expo))
+
+        start = time.perf_counter()
+        frames = await asyncio.gather(*[cam.trigger() for _ in range(args.count)], return_exceptions=True)
+        elapsed = time.perf_counter() - start
+
+        ok = [frame for frame in frames if isinstance(frame, Frame)]
+        print("Frames: ", len(ok), "/", args.count)
+        print("Frames/s: ", round(len(ok)/elapsed, 2))
+
+def main():
+    parser = argparse.ArgumentParser(description="RIDOPE camera asyncio client")
+    parser.add_argument("--port",     default="/dev/ttyUSB0", help="Serial port")
+    parser.add_argument("--baudrate", default=115200, type=int, help="Serial baudrate")
+    parser.add_argument("--count",    default=10, type=int,   help="Number of frames to capture")
+    parser.add_argument("--expo",     default=None, type=int, help="Sensor exposure")
+    parser.add_argument("--timeout",  default=5.0, type=float, help="Seconds to wait for a response")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Emulator of the RIDOPE firmware (main.c) over a pseudo-terminal
+
+import argparse
+import os
+import select
+import threading
+import time
+import tty
+
+import numpy as np
+
+from comm_ridope import cmd, CHUNK_SIZE, ENC_RAW, ENC_RLE, pack_chunk, pack_msg, rle_encode, unpack_request
+from ridope_parser import StreamParser
+
+EXPO_RESET = 11264
+WRITE_CHUNK = 64
+
+class DeviceEmulator:
+    """
+    Answers CAMERA_TRIG, TRANS_FRAME, CAMERA_EXPO, UART_BAUD, PING, RESEND and
+    REBOOT like main.c does.
+
+    Frames are synthetic (a moving gradient plus `noise`, brighter with the
+    exposure) and sent with the same packets and console output as
+    comm_ridope_send_img()/comm_ridope_send_frame(). The output is paced to
+    `baudrate` (8N1, None for no throttling) and each byte is corrupted with
+    probability `corrupt`. Open `port` with pyserial as you would the board.
+    """
+
+    def __init__(self, N=28, M=28, baudrate=115200, corrupt=0.0, seed=None, noise=4.0):
+        self.N = N
+        self.M = M
+        self.baudrate = baudrate
+        self.corrupt = corrupt
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+
+        self.parser = StreamParser(unpack=unpack_request)
+        self.expo = EXPO_RESET
+        self.frame = 0
+        self.sent_frame = b""
+        self.next_write = 0.0
+        self.running = False
+        self.thread = None
+
+        self.received = 0
+        self.sent_bytes = 0
+        self.corrupted = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def run(self):
+        self.write(b"\nLiteX minimal demo app (emulated)\n")
+
+        while self.running:
+            readable, _, _ = select.select([self.master], [], [], 0.1)
+            if not readable:
+                continue
+
+            for item in self.parser.feed(os.read(self.master, 4096)):
+                self.received += 1
+                self.handle(item)
+
+    def handle(self, item):
+        if item.cmd == cmd.CAMERA_TRIG.value:
+            self.get_img(cmd.TRANS_PHOTO)
+        elif item.cmd == cmd.TRANS_FRAME.value:
+            self.get_img(cmd.TRANS_FRAME, int(item.real))
+        elif item.cmd == cmd.CAMERA_EXPO.value:
+            self.expo = int(item.real)
+            self.write(pack_msg(cmd.CAMERA_EXPO, self.expo))
+        elif item.cmd == cmd.UART_BAUD.value:
+            # Always accepted, the pseudo-terminal has no baudrate
+            self.write(pack_msg(cmd.UART_BAUD, item.real))
+            if self.baudrate:
+                self.baudrate = int(item.real)
+        elif item.cmd == cmd.RESEND.value:
+            self.resend(int(item.real), int(item.imag))
+        elif item.cmd == cmd.PING.value:
+            self.write(pack_msg(cmd.PING))
+        elif item.cmd == cmd.REBOOT.value:
+            self.expo = EXPO_RESET
+            self.write(b"\nLiteX minimal demo app (emulated)\n")
+
+    def image(self):
+        y, x = np.mgrid[0:self.N, 0:self.M]
+        gain = self.expo / EXPO_RESET
+        image = gain * (64 + 4*((x + y + self.frame) % 32))
+        if self.noise:
+            image = image + self.rng.normal(0, self.noise, (self.N, self.M))
+        self.frame += 1
+        return np.clip(image, 0, 255).astype(np.uint8)
+
+    def get_img(self, img_type, encoding=ENC_RAW):
+        img = self.image()
+
+        self.write(b"Got it!\n")
+        self.write(pack_msg(cmd.CAMERA_EXPO, self.expo))
+        self.write(pack_msg(cmd.CAMERA_AVG, int(img.mean())))
+        self.write(b"Sending img!\n")
+
+        if img_type == cmd.TRANS_FRAME:
+            self.send_frame(img, encoding)
+        else:
+            self.send_img(img, img_type)
+
+        self.write(b"Done sending!\n")
+
+    def send_img(self, img, img_type):
+        # A resend of this frame sends its raw pixels
+        self.sent_frame = img.tobytes()
+        self.write(pack_msg(cmd.PHOTO_SIZE, self.N, self.M))
+        self.write(b"Size sent!\n")
+        self.write(pack_msg(cmd.START_TRANS, ENC_RAW, self.N*self.M))
+        self.write(b"Start flag!\n")
+        self.write(b"".join(pack_msg(img_type, int(pixel)) for pixel in img.flat))
+        self.write(pack_msg(cmd.STOP_TRANS, self.N, self.M))
+        self.write(b"Stop flag!\n")
+
+    def send_frame(self, img, encoding=ENC_RAW):
+        pixels = img.tobytes()
+
+        if encoding == ENC_RLE:
+            encoded = rle_encode(img)
+            if len(encoded) < len(pixels):
+                pixels = encoded
+            else:
+                encoding = ENC_RAW
+        else:
+            encoding = ENC_RAW
+
+        self.write(pack_msg(cmd.PHOTO_SIZE, self.N, self.M))
+        self.write(pack_msg(cmd.START_TRANS, encoding, len(pixels)))
+        self.sent_frame = pixels
+        self.resend(0, len(pixels))
+
+    def resend(self, offset, length):
+        pixels = self.sent_frame
+        start = -(-offset // CHUNK_SIZE) * CHUNK_SIZE
+
+        self.write(b"".join(pack_chunk(pos, pixels[pos:pos+CHUNK_SIZE]) for pos in range(start, min(offset + length, len(pixels)), CHUNK_SIZE)))
+        self.write(pack_msg(cmd.STOP_TRANS, self.N, self.M))
+
+    def write(self, data):
+        if self.corrupt > 0:
+            data = np.frombuffer(data, dtype=np.uint8).copy()
+            hits = np.nonzero(self.rng.random(data.size) < self.corrupt)[0]
+            data[hits] ^= self.rng.integers(1, 256, hits.size, dtype=np.uint8)
+            self.corrupted += hits.size
+            data = data.tobytes()
+
+        view = memoryview(data)
+
+        for pos in range(0, len(view), WRITE_CHUNK):
+            chunk = view[pos:pos+WRITE_CHUNK]
+
+            if self.baudrate:
+                now = time.monotonic()
+                self.next_write = max(self.next_write, now) + len(chunk)*10/self.baudrate
+                if self.next_write - now > 0.001:
+                    time.sleep(self.next_write - now)
+
+            while chunk:
+                chunk = chunk[os.write(self.master, chunk):]
+
+        self.sent_bytes += len(data)
+
+def main():
+    parser = argparse.ArgumentParser(description="RIDOPE firmware emulator over a pseudo-terminal")
+    parser.add_argument("--height",   default=28, type=int,       help="Frame height")
+    parser.add_argument("--width",    default=28, type=int,       help="Frame width")
+    parser.add_argument("--baudrate", default=115200, type=int,   help="Simulated baudrate (0: unthrottled)")
+    parser.add_argument("--corrupt",  default=0.0, type=float,    help="Probability of corrupting each byte sent")
+    parser.add_argument("--seed",     default=None, type=int,     help="Random seed")
+    parser.add_argument("--noise",    default=4.0, type=float,    help="Standard deviation of the pixel noise")
+    args = parser.parse_args()
+
+    emu = DeviceEmulator(args.height, args.width, args.baudrate or None, args.corrupt, args.seed, args.noise).start()
+    print("Emulated device on", emu.port)
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        emu.stop()
+        print("\nGoodbye!\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Frame assembly into reusable buffers
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from comm_ridope import cmd, CHUNK_SIZE, ENC_RAW, ENC_RLE, rle_decode
+
+class Frame:
+    """Frame buffer with the metadata received along with it"""
+
+    def __init__(self, pool=None, size=0):
+        self.pool = pool
+        self.buffer = np.zeros(size, dtype=np.uint8)
+        self.reset(0, 0)
+
+    def reset(self, N, M):
+        if self.buffer.size < N*M:
+            self.buffer = np.zeros(N*M, dtype=np.uint8)
+
+        self.seq = -1
+        self.N = N
+        self.M = M
+        self.count = 0
+        self.expo = 0
+        self.avg = 0
+        self.op_time = 0.0
+        self.t_start = time.time()
+        self.t_done = 0.0
+
+    @property
+    def image(self):
+        return self.buffer[:self.N*self.M].reshape(self.N, self.M)
+
+    @property
+    def complete(self):
+        return self.N*self.M > 0 and self.count >= self.N*self.M
+
+    def release(self):
+        if self.pool is not None:
+            self.pool.release(self)
+
+class FramePool:
+    """
+    Fixed set of reusable frame buffers.
+
+    The receive side acquire()s a free frame, fills it and put()s it once
+    complete, consumers get() complete frames and release() them when done.
+    When every buffer is in use acquire() either waits for a release
+    (policy="block") or takes back the oldest complete frame no consumer got
+    yet (policy="drop").
+    """
+
+    def __init__(self, count=4, size=28*28, policy="block"):
+        if policy not in ("block", "drop"):
+            raise ValueError("Unknown pool policy: " + policy)
+
+        self.policy = policy
+        self.lock = threading.Condition()
+        self.free = [Frame(self, size) for _ in range(count)]
+        self.ready = deque()
+        self.dropped = 0
+
+    def acquire(self, timeout=None):
+        with self.lock:
+            while not self.free:
+                if self.policy == "drop" and self.ready:
+                    self.dropped += 1
+                    return self.ready.popleft()
+
+                if not self.lock.wait(timeout):
+                    return None
+
+            return self.free.pop()
+
+    def put(self, frame):
+        with self.lock:
+            self.ready.append(frame)
+            self.lock.notify_all()
+
+    def get(self, timeout=None):
+        with self.lock:
+            while not self.ready:
+                if not self.lock.wait(timeout):
+                    return None
+
+            return self.ready.popleft()
+
+    def release(self, frame):
+        with self.lock:
+            self.free.append(frame)
+            self.lock.notify_all()
+
+class FrameAssembler:
+    """
+    Writes the pixels of the received messages straight into a frame buffer.
+
+    The metadata sent before a frame (CAMERA_EXPO, CAMERA_AVG, OP_TIME) is
+    attached to it. Encoded TRANS_FRAME chunks are gathered and decoded at
+    STOP_TRANS, the encoding comes with START_TRANS. Complete frames are
+    put() in the pool and returned by feed(), incomplete ones are counted and
+    recycled. Without a pool every frame gets a new buffer.
+
+    With a `nack` callable, chunks missing at STOP_TRANS are asked again with
+    one nack(offset, length) per run of missing chunks, up to `repairs` times
+    per frame. The frame stays open meanwhile (`repairing`), the firmware
+    ends the chunks of each request with another STOP_TRANS. Pixel mode
+    frames have no chunks to ask again, their pixels carry no offset.
+
+    `payload` counts the encoded size of the completed frames, the chunks
+    received again for a repair are counted in `resent_bytes` instead.
+    """
+
+    def __init__(self, pool=None, nack=None, repairs=2):
+        self.pool = pool
+        self.nack = nack
+        self.repairs = repairs
+        self.frame = None
+        self.seq = 0
+        self.expo = 0
+        self.avg = 0
+        self.op_time = 0.0
+        self.encoding = ENC_RAW
+        self.size = 0
+        self.chunks = np.zeros(0, dtype=bool)
+        self.encoded = np.zeros(0, dtype=np.uint8)
+        self.attempt = 0
+        self.repairing = False
+        self.requested = 0
+
+        self.completed = 0
+        self.incomplete = 0
+        self.dropped = 0
+        self.pixels = 0
+        self.payload = 0
+        self.repaired = 0
+        self.resent = 0
+        self.resent_bytes = 0
+
+    def feed(self, item):
+        if item.cmd == cmd.CAMERA_EXPO.value:
+            self.expo = int(item.real)
+
+        elif item.cmd == cmd.CAMERA_AVG.value:
+            self.avg = int(item.real)
+
+        elif item.cmd == cmd.OP_TIME.value:
+            self.op_time = item.real
+
+        elif item.cmd == cmd.PHOTO_SIZE.value:
+            if self.frame is None:
+                self.frame = self.pool.acquire() if self.pool is not None else Frame()
+
+                if self.frame is None:
+                    self.dropped += 1
+                    return None
+
+            self.frame.reset(int(item.real), int(item.imag))
+            self.encoding = ENC_RAW
+            self.size = 0
+            self.chunks = np.zeros(0, dtype=bool)
+            self.attempt = 0
+            self.repairing = False
+            self.requested = 0
+
+        elif self.frame is None:
+            return None
+
+        elif item.cmd == cmd.TRANS_PHOTO.value:
+            frame = self.frame
+            # START_TRANS announces pixel frames like raw chunked ones, only chunks are asked again
+            self.chunks = self.chunks[:0]
+            if frame.count < frame.N*frame.M:
+                frame.buffer[frame.count] = item.real
+                frame.count += 1
+
+        elif item.cmd == cmd.START_TRANS.value:
+            self.encoding = int(item.real)
+            self.size = int(item.imag)
+            self.chunks = np.zeros(-(-self.size // CHUNK_SIZE), dtype=bool)
+
+            if self.encoded.size < self.size:
+                self.encoded = np.zeros(self.size, dtype=np.uint8)
+
+        elif item.cmd == cmd.TRANS_FRAME.value:
+            frame = self.frame
+            offset = int(item.real)
+            index = offset // CHUNK_SIZE
+
+            if self.attempt:
+                self.resent_bytes += item.imag
+
+            if offset % CHUNK_SIZE or index >= self.chunks.size or item.imag != min(CHUNK_SIZE, self.size - offset):
+                return None
+
+            if self.encoding == ENC_RLE:
+                self.encoded[offset:offset+item.imag] = np.frombuffer(item.payload, dtype=np.uint8)
+            elif self.size == frame.N*frame.M:
+                frame.buffer[offset:offset+item.imag] = np.frombuffer(item.payload, dtype=np.uint8)
+            else:
+                return None
+
+            self.chunks[index] = True
+
+        elif item.cmd == cmd.STOP_TRANS.value:
+            frame = self.frame
+
+            if self.requested > 1:
+                # The answers to the other requests of this repair are still coming
+                self.requested -= 1
+                return None
+
+            if self.chunks.size:
+                missing = np.flatnonzero(~self.chunks)
+
+                if missing.size and self.nack is not None and self.attempt < self.repairs:
+                    runs = np.split(missing, np.flatnonzero(np.diff(missing) > 1) + 1)
+                    self.attempt += 1
+                    self.resent += missing.size
+                    self.repairing = True
+                    self.requested = len(runs)
+                    for run in runs:
+                        start = int(run[0])*CHUNK_SIZE
+                        end = min(int(run[-1] + 1)*CHUNK_SIZE, self.size)
+                        self.nack(start, end - start)
+                    return None
+
+                if not missing.size and self.encoding == ENC_RLE:
+                    try:
+                        rle_decode(self.encoded[:self.size], frame.N, frame.M, frame.image)
+                        frame.count = frame.N*frame.M
+                    except ValueError:
+                        pass
+                elif not missing.size:
+                    frame.count = frame.N*frame.M
+
+            self.frame = None
+            self.repairing = False
+            self.requested = 0
+
+            if not frame.complete:
+                self.incomplete += 1
+                frame.release()
+                return None
+
+            frame.seq = self.seq
+            frame.expo = self.expo
+            frame.avg = self.avg
+            frame.op_time = self.op_time
+            frame.t_done = time.time()
+            # OP_TIME times one operation, unlike the exposure it is not carried over
+            self.op_time = 0.0
+            self.seq += 1
+            self.completed += 1
+            self.pixels += frame.N*frame.M
+            self.payload += self.size
+            if self.attempt:
+                self.repaired += 1
+
+            if self.pool is not None:
+                self.pool.put(frame)
+
+            return frame
+
+        return None
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# UART baudrate negotiation (see comm_ridope_set_baudrate())
+
+import time
+
+from comm_ridope import cmd, pack_cmd
+from ridope_parser import StreamParser
+
+DEFAULT_BAUDRATE = 115200
+PING_TIMEOUT = 1.0      # COMM_RIDOPE_PING_TIMEOUT of comm_ridope.h, in seconds
+# The firmware starts its countdown before the host receives the UART_BAUD
+# answer, so a PING it takes is answered within PING_TIMEOUT of the host
+# switching, the margin covers the answer itself
+PING_MARGIN = 0.1
+
+def wait_for(uart, parser, command, timeout):
+    """Returns the first `command` message received within `timeout` seconds, None without one"""
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        for item in parser.feed(uart.read(uart.in_waiting or 1)):
+            if item.cmd == command.value:
+                return item
+
+    return None
+
+def negotiate(uart, baudrate, timeout=1.0, pings=5):
+    """
+    Switches the firmware and `uart` to `baudrate`, returns the baudrate in use.
+
+    The firmware answers UART_BAUD at the current baudrate, then waits for a
+    PING at the new one and goes back to the current one without it. The host
+    falls back the same way when no PING is answered, or keeps the current
+    baudrate if the firmware refuses the new one. Call it before starting
+    anything else that reads `uart`.
+    """
+    current = uart.baudrate
+    if baudrate == current:
+        return current
+
+    read_timeout = uart.timeout
+    uart.timeout = 0.05
+    parser = StreamParser()
+
+    try:
+        uart.reset_input_buffer()
+        uart.write(pack_cmd(cmd.UART_BAUD, baudrate))
+
+        ack = wait_for(uart, parser, cmd.UART_BAUD, timeout)
+        if ack is None or int(ack.real) != baudrate:
+            return current
+
+        uart.flush()
+        uart.baudrate = baudrate
+
+        for i in range(pings):
+            uart.write(pack_cmd(cmd.PING))
+
+            window = PING_TIMEOUT/pings + (PING_MARGIN if i == pings - 1 else 0)
+            if wait_for(uart, parser, cmd.PING, window) is not None:
+                return baudrate
+
+        uart.baudrate = current
+        return current
+    finally:
+        uart.timeout = read_timeout
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Metrics of the capture service, as Prometheus text and JSON log lines
+
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+OP_TIME_BUCKETS = tuple(float(1 << i) for i in range(0, 24, 2))
+
+class Counter:
+    """Monotonic count, either incremented or read from `fn` when collected"""
+
+    type = "counter"
+
+    def __init__(self, name, doc, fn=None):
+        self.name = name
+        self.doc = doc
+        self.fn = fn
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self.lock:
+            self.value += n
+
+    def get(self):
+        return self.fn() if self.fn is not None else self.value
+
+    def samples(self):
+        yield self.name, self.get()
+
+class Gauge(Counter):
+    """Value that goes up and down, set() or read from `fn`"""
+
+    type = "gauge"
+
+    def set(self, value):
+        self.value = value
+
+class Histogram:
+    """Counts of the observed values per bucket, with their sum"""
+
+    type = "histogram"
+
+    def __init__(self, name, doc, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0]*(len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def get(self):
+        with self.lock:
+            return {"count": self.count, "sum": self.sum, "mean": self.sum/self.count if self.count else None}
+
+    def samples(self):
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            yield '%s_bucket{le="%g"}' % (self.name, bound), cumulative
+        yield '%s_bucket{le="+Inf"}' % self.name, count
+        yield self.name + "_sum", total
+        yield self.name + "_count", count
+
+class Metrics:
+    """Registry of the metrics of the process"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def add(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError("Duplicate metric: " + metric.name)
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, doc, fn=None):
+        return self.add(Counter(name, doc, fn))
+
+    def gauge(self, name, doc, fn=None):
+        return self.add(Gauge(name, doc, fn))
+
+    def histogram(self, name, doc, buckets=LATENCY_BUCKETS):
+        return self.add(Histogram(name, doc, buckets))
+
+    def render(self):
+        """Prometheus text exposition format"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append("# HELP %s %s" % (metric.name, metric.doc))
+            lines.append("# TYPE %s %s" % (metric.name, metric.type))
+            lines.extend("%s %s" % sample for sample in metric.samples())
+
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        return {metric.name: metric.get() for metric in metrics}
+
+class MetricsServer:
+    """Serves GET /metrics on `host`:`port` from a daemon thread, localhost only by default"""
+
+    def __init__(self, metrics, port=9108, host="127.0.0.1"):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+class MetricsLogger:
+    """Writes a snapshot of the metrics as one JSON line every `period` seconds"""
+
+    def __init__(self, metrics, period=10.0, stream=None):
+        self.metrics = metrics
+        self.period = period
+        self.stream = stream if stream is not None else sys.stderr
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def log(self):
+        line = {"timestamp": time.time()}
+        line.update(self.metrics.snapshot())
+        self.stream.write(json.dumps(line) + "\n")
+        self.stream.flush()
+
+    def run(self):
+        while not self.stop_event.wait(self.period):
+            self.log()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.log()
+
+def capture_metrics(metrics, parser, assembler, pool=None, scheduler=None, sinks=()):
+    """
+    Registers the metrics of a capture: the counters are read from the
+    parser, assembler and pool when collected, so the receive path is
+    untouched. Returns the histograms the caller feeds: the trigger latency
+    (TriggerScheduler on_latency) and the OP_TIME of the frames.
+    """
+    metrics.counter("ridope_bytes_received_total", "Bytes received from the UART", lambda: parser.bytes_in)
+    metrics.counter("ridope_messages_total", "Messages parsed", lambda: parser.messages)
+    metrics.counter("ridope_desyncs_total", "Packets dropped by the parser (bad CRC or framing)", lambda: parser.desyncs)
+    metrics.counter("ridope_frames_completed_total", "Frames assembled", lambda: assembler.completed)
+    metrics.counter("ridope_frames_incomplete_total", "Frames ended with missing pixels", lambda: assembler.incomplete)
+    metrics.counter("ridope_frames_repaired_total", "Frames completed by resent chunks", lambda: assembler.repaired)
+    metrics.counter("ridope_frames_dropped_total", "Frames dropped for want of a free buffer",
+        lambda: assembler.dropped + (pool.dropped if pool is not None else 0))
+
+    if scheduler is not None:
+        metrics.counter("ridope_triggers_total", "Triggers sent, retries included", lambda: scheduler.sent)
+        metrics.counter("ridope_triggers_lost_total", "Triggers never answered", lambda: scheduler.lost)
+        metrics.gauge("ridope_triggers_inflight", "Triggers waiting for their frame", lambda: len(scheduler.inflight))
+
+    for i, sink in enumerate(sinks):
+        metrics.gauge("ridope_sink%d_queue_depth" % i, "Frames waiting in the queue of the %s sink" % type(sink.writer).__name__,
+            lambda sink=sink: sink.queue.qsize())
+        metrics.counter("ridope_sink%d_dropped_total" % i, "Frames dropped by the %s sink" % type(sink.writer).__name__,
+            lambda sink=sink: sink.dropped)
+
+    latency = metrics.histogram("ridope_trigger_latency_seconds", "Time from a trigger to its assembled frame")
+    op_time = metrics.histogram("ridope_op_time", "OP_TIME reported by the firmware with the frames", OP_TIME_BUCKETS)
+    return latency, op_time
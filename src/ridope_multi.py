@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Capture from several RIDOPE cameras on a single thread
+
+import argparse
+import json
+import selectors
+import time
+from typing import NamedTuple, Any
+
+import numpy as np
+
+from comm_ridope import cmd, DELIMITER, ENCODINGS, pack_cmd
+from ridope_frames import FrameAssembler
+from ridope_link import negotiate
+from ridope_parser import StreamParser
+
+class FrameSet(NamedTuple):
+    seq: int
+    t_trigger: float
+    frames: Any     # One Frame per camera, None for the ones that missed the set
+
+    @property
+    def complete(self):
+        return all(frame is not None for frame in self.frames)
+
+    @property
+    def skew(self):
+        """Spread of the reception times of the frames, in seconds"""
+        done = [frame.t_done for frame in self.frames if frame is not None]
+        return max(done) - min(done) if done else 0.0
+
+class Device:
+    """Serial port of one camera with its own parser, assembler and stats"""
+
+    def __init__(self, index, port, baudrate=115200):
+        import serial
+
+        self.index = index
+        self.port = port
+        self.uart = serial.Serial(port, baudrate, timeout=0.5)
+        self.parser = StreamParser()
+        self.assembler = FrameAssembler(nack=self.nack)
+        self.waiting = False
+        self.t_trigger = 0.0
+        self.frame = None
+
+        self.frames = 0
+        self.missed = 0
+
+    def nack(self, offset, length):
+        self.uart.write(pack_cmd(cmd.RESEND, offset, length))
+
+    def on_readable(self):
+        for item in self.parser.feed(self.uart.read(self.uart.in_waiting or 1)):
+            current = self.assembler.frame
+            frame = self.assembler.feed(item)
+
+            if item.cmd != cmd.STOP_TRANS.value or self.assembler.repairing or not self.waiting:
+                continue
+
+            # Late frame of a previous set, started before this trigger
+            if current is not None and current.t_start < self.t_trigger:
+                continue
+
+            self.waiting = False
+            self.frame = frame
+
+    def stats(self):
+        return {
+            "port": self.port,
+            "baudrate": self.uart.baudrate,
+            "frames": self.frames,
+            "missed": self.missed,
+            "incomplete": self.assembler.incomplete,
+            "repaired": self.assembler.repaired,
+            "desyncs": self.parser.desyncs,
+            "bytes": self.parser.bytes_in,
+        }
+
+class MultiCamera:
+    """
+    Triggers several cameras together and gathers their frames into FrameSets.
+
+    Every port is serviced by one selector loop on the calling thread, so
+    adding a camera adds a file descriptor instead of threads. Each set
+    starts with a trigger sent to every camera at once and ends when they
+    all answered or after `timeout` seconds, the frames of a set are thus
+    aligned to within the trigger skew. A camera whose frame is incomplete
+    or late has None in the set.
+    """
+
+    def __init__(self, ports, baudrate=115200, link_baudrate=0, trigger=None, timeout=5.0):
+        self.devices = [Device(index, port, baudrate) for index, port in enumerate(ports)]
+        self.trigger = trigger if trigger is not None else pack_cmd(cmd.TRANS_FRAME)
+        self.timeout = timeout
+        self.selector = selectors.DefaultSelector()
+        self.seq = 0
+
+        self.complete = 0
+        self.skews = []
+
+        for device in self.devices:
+            if link_baudrate:
+                negotiate(device.uart, link_baudrate)
+
+            device.uart.timeout = 0
+            device.uart.write(DELIMITER)
+            self.selector.register(device.uart, selectors.EVENT_READ, device)
+
+    def close(self):
+        for device in self.devices:
+            self.selector.unregister(device.uart)
+            device.uart.close()
+        self.selector.close()
+
+    def capture(self):
+        """Triggers every camera and returns their FrameSet"""
+        t_trigger = time.time()
+
+        for device in self.devices:
+            device.waiting = True
+            device.t_trigger = t_trigger
+            device.frame = None
+            device.uart.write(self.trigger)
+
+        deadline = time.monotonic() + self.timeout
+
+        while any(device.waiting for device in self.devices):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            for key, _ in self.selector.select(remaining):
+                key.data.on_readable()
+
+        frames = []
+        for device in self.devices:
+            device.waiting = False
+
+            if device.frame is None:
+                device.missed += 1
+            else:
+                device.frames += 1
+            frames.append(device.frame)
+
+        frame_set = FrameSet(self.seq, t_trigger, frames)
+        self.seq += 1
+
+        if frame_set.complete:
+            self.complete += 1
+            self.skews.append(frame_set.skew)
+
+        return frame_set
+
+    def sets(self, count=0):
+        """Yields `count` FrameSets, forever for 0"""
+        while count == 0 or self.seq < count:
+            yield self.capture()
+
+    def stats(self):
+        stats = {
+            "sets": self.seq,
+            "complete": self.complete,
+            "devices": [device.stats() for device in self.devices],
+        }
+
+        if self.skews:
+            skews = 1e3*np.array(self.skews)
+            stats.update({
+                "skew_p50_ms": float(np.percentile(skews, 50)),
+                "skew_p99_ms": float(np.percentile(skews, 99)),
+            })
+
+        return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture from several RIDOPE cameras")
+    parser.add_argument("--ports",         nargs="+", required=True,    help="Serial ports, one per camera")
+    parser.add_argument("--baudrate",      default=115200, type=int,    help="Serial baudrate")
+    parser.add_argument("--link-baudrate", default=0, type=int,         help="Baudrate to negotiate with the firmwares (0: keep --baudrate)")
+    parser.add_argument("--count",         default=0, type=int,         help="Number of frame sets to capture (0: forever)")
+    parser.add_argument("--timeout",       default=5.0, type=float,     help="Frame set timeout in seconds")
+    parser.add_argument("--pixel",         action="store_true",         help="Transfer one message per pixel instead of raw frames")
+    parser.add_argument("--encoding",      default="rle",               help="Frame encoding: raw or rle (sent raw when it does not compress)")
+    args = parser.parse_args()
+
+    trigger = pack_cmd(cmd.CAMERA_TRIG) if args.pixel else pack_cmd(cmd.TRANS_FRAME, ENCODINGS[args.encoding])
+    cameras = MultiCamera(args.ports, args.baudrate, args.link_baudrate, trigger, args.timeout)
+
+    cpu = time.process_time()
+    start = time.perf_counter()
+
+    try:
+        for frame_set in cameras.sets(args.count):
+            pass
+    except KeyboardInterrupt:
+        print("\nGoodbye!\n")
+
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    cameras.close()
+
+    stats = cameras.stats()
+    stats.update({
+        "sets/s": stats["sets"]/elapsed,
+        "cpu_ms_per_frame": 1e3*cpu/max(sum(device["frames"] for device in stats["devices"]), 1),
+    })
+    print(json.dumps(stats))
+
+if __name__ == "__main__":
+    main()
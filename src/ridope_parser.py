@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Incremental parser for the RIDOPE UART stream
+
+import sys
+import time
+
+import numpy as np
+
+from comm_ridope import cmd, CHUNK_SIZE, ENC_RAW, ENC_RLE, pack_chunk, pack_msg, rle_encode, unpack_packet
+
+DELIMITER = 0x00
+
+class StreamParser:
+    """
+    Splits the UART byte stream into Message tuples.
+
+    Bytes are read into a reusable buffer and split on the packet delimiter,
+    consumed bytes are only moved when the free space at the end of the buffer
+    runs out. A corrupted packet only costs itself, the parser is back in sync
+    at the next delimiter. Console text printed by the firmware between
+    packets is handed to on_text, if given. Packets are decoded with `unpack`,
+    unpack_request() parses the commands sent to the firmware instead.
+    """
+
+    def __init__(self, size=1 << 16, on_text=None, max_packet=4096, unpack=unpack_packet):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.on_text = on_text
+        self.max_packet = max_packet
+        self.unpack = unpack
+
+        self.bytes_in = 0
+        self.messages = 0
+        self.desyncs = 0
+
+    def reserve(self, n):
+        """Makes room for n more bytes after the pending ones"""
+        if self.end + n <= len(self.buffer):
+            return
+
+        pending = self.end - self.start
+
+        if pending + n > len(self.buffer):
+            buffer = bytearray(max(2*len(self.buffer), pending + n))
+            buffer[:pending] = self.view[self.start:self.end]
+            self.view.release()
+            self.buffer = buffer
+            self.view = memoryview(buffer)
+        else:
+            self.buffer[:pending] = bytes(self.view[self.start:self.end])
+
+        self.start = 0
+        self.end = pending
+
+    def fill(self, port):
+        """Blocking read of whatever the port has, at least one byte or the port timeout"""
+        n = port.in_waiting or 1
+        self.reserve(n)
+        n = port.readinto(self.view[self.end:self.end+n]) or 0
+        self.end += n
+        self.bytes_in += n
+        return n
+
+    def feed(self, data):
+        """Parses a chunk of an already received stream"""
+        n = len(data)
+        self.reserve(n)
+        self.buffer[self.end:self.end+n] = data
+        self.end += n
+        self.bytes_in += n
+        yield from self.parse()
+
+    def read(self, port, stop=None):
+        """Yields the messages received from the port, until the stop event is set"""
+        while stop is None or not stop.is_set():
+            if self.fill(port):
+                yield from self.parse()
+
+    def parse(self):
+        buffer = self.buffer
+
+        while True:
+            idx = buffer.find(DELIMITER, self.start, self.end)
+
+            if idx < 0:
+                if self.end - self.start > self.max_packet:
+                    # Nothing that long is a packet, drop it and wait for the next delimiter
+                    self.text(self.view[self.start:self.end])
+                    self.start = self.end
+                break
+
+            packet = self.view[self.start:idx]
+            self.start = idx + 1
+
+            if not packet:
+                continue
+
+            try:
+                item = self.unpack(packet)
+            except ValueError:
+                self.text(packet)
+                continue
+            finally:
+                packet.release()
+
+            self.messages += 1
+            yield item
+
+        if self.start == self.end:
+            self.start = 0
+            self.end = 0
+
+    def text(self, data):
+        """Console output goes to on_text, anything else is a corrupted packet"""
+        data = bytes(data)
+
+        if data.isascii() and data.endswith(b"\n"):
+            if self.on_text is not None:
+                self.on_text(data)
+        else:
+            self.desyncs += 1
+
+def synthetic_stream(frames=10, N=28, M=28, bulk=False, encoding=ENC_RAW):
+    """
+    Byte stream of frames as sent by comm_ridope_send_img()/comm_ridope_send_frame()
+
+    Raw frames are random pixels, RLE ones a gradient of uniform bands.
+    """
+    stream = bytearray()
+
+    if encoding == ENC_RLE:
+        pixels = (16*(np.add.outer(np.arange(N), np.arange(M)) // 8) % 256).astype(np.uint8).ravel()
+        data = rle_encode(pixels.reshape(N, M))
+    else:
+        pixels = np.random.randint(0, 256, N*M, dtype=np.uint8)
+        data = pixels.tobytes()
+
+    if bulk:
+        chunks = b"".join(pack_chunk(offset, data[offset:offset+CHUNK_SIZE]) for offset in range(0, len(data), CHUNK_SIZE))
+        start = pack_msg(cmd.START_TRANS, encoding, len(data))
+    else:
+        chunks = b"".join(pack_msg(cmd.TRANS_PHOTO, pixel) for pixel in pixels)
+        start = pack_msg(cmd.START_TRANS, ENC_RAW, N*M)
+
+    for _ in range(frames):
+        stream += pack_msg(cmd.PHOTO_SIZE, N, M)
+        stream += start
+        stream += chunks
+        stream += pack_msg(cmd.STOP_TRANS, N, M)
+
+    return bytes(stream)
+
+def benchmark(stream, chunk_size=4096):
+    parser = StreamParser()
+    count = 0
+
+    start = time.perf_counter()
+    for pos in range(0, len(stream), chunk_size):
+        for _ in parser.feed(stream[pos:pos+chunk_size]):
+            count += 1
+    elapsed = time.perf_counter() - start
+
+    return count, parser.desyncs, elapsed
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            stream = f.read()
+    else:
+        stream = synthetic_stream()
+
+    count, desyncs, elapsed = benchmark(stream)
+    print("Bytes: ", len(stream))
+    print("Messages: ", count)
+    print("Desyncs: ", desyncs)
+    print("Messages/s: ", int(count/elapsed))
+    print("MB/s: ", round(len(stream)/elapsed/1e6, 2))
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Frame processing on a pool of processes, through shared memory
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+from typing import NamedTuple, Any
+
+import numpy as np
+
+import ridope_sp
+
+class Result(NamedTuple):
+    seq: int
+    value: Any
+    expo: int
+    avg: int
+    timestamp: float
+
+# Jobs by name, for the command lines
+JOBS = {
+    "canny": (ridope_sp.canny, (100, 50)),
+    "otsu": (ridope_sp.otsu, ()),
+}
+
+# Shared memory of the worker process, attached by _attach()
+_shm = None
+
+def _attach(name):
+    global _shm
+
+    # The workers share the resource tracker of the parent, which unlinks the segment
+    _shm = shared_memory.SharedMemory(name)
+
+def _run(job, args, seq, slot, slot_size, shape):
+    """Runs the job on the frame in `slot`, array results are written back to the slot"""
+    t_start = time.monotonic()
+    image = np.ndarray(shape, dtype=np.uint8, buffer=_shm.buf, offset=slot*slot_size)
+
+    try:
+        value = job(image, *args)
+    except Exception as e:
+        return seq, None, e, t_start, time.monotonic()
+
+    if isinstance(value, tuple) and value and isinstance(value[0], np.ndarray):
+        array, rest = value[0], value[1:]
+    elif isinstance(value, np.ndarray):
+        array, rest = value, None
+    else:
+        return seq, None, value, t_start, time.monotonic()
+
+    if array.nbytes > slot_size:
+        return seq, None, value, t_start, time.monotonic()
+
+    out = np.ndarray(array.shape, dtype=array.dtype, buffer=_shm.buf, offset=slot*slot_size)
+    out[...] = array
+    return seq, (array.shape, array.dtype.str), rest, t_start, time.monotonic()
+
+class ProcessingPipeline:
+    """
+    Runs `job(image, *args)` on every submitted frame on a pool of processes.
+
+    submit() copies the image into a free slot of a shared memory segment and
+    the workers get the slot index only, so frames are never pickled. An
+    array result (or a tuple starting with one) is written back into the
+    slot and copied out by the parent. Results come out of results() in
+    submission order. With every slot in use submit() either waits
+    (policy="block") or drops the frame (policy="drop").
+    """
+
+    def __init__(self, job, args=(), workers=None, slots=None, size=28*28, policy="block"):
+        if policy not in ("block", "drop"):
+            raise ValueError("Unknown pipeline policy: " + policy)
+
+        self.job = job
+        self.args = tuple(args)
+        self.workers = workers or os.cpu_count()
+        self.slot_size = size
+        self.policy = policy
+        self.lock = threading.Condition()
+
+        count = slots or 2*self.workers
+        self.shm = shared_memory.SharedMemory(create=True, size=count*size)
+        self.free = list(range(count))
+        self.pool = multiprocessing.Pool(self.workers, initializer=_attach, initargs=(self.shm.name,))
+        self.output = queue.Queue()
+
+        self.seq = 0
+        self.next_seq = 0
+        self.pending = {}
+        self.meta = {}
+
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.latencies = {stage: deque(maxlen=1000) for stage in ("queue", "process", "reorder", "total")}
+        self.start = time.perf_counter()
+
+    def submit(self, frame, timeout=None):
+        """Queues the frame for processing, it can be released as soon as this returns"""
+        image = frame.image
+        if image.nbytes > self.slot_size:
+            raise ValueError("Frame of %d bytes larger than the %d bytes slots" % (image.nbytes, self.slot_size))
+
+        with self.lock:
+            while not self.free:
+                if self.policy == "drop" or not self.lock.wait(timeout):
+                    self.dropped += 1
+                    return False
+
+            slot = self.free.pop()
+            seq = self.seq
+            self.seq += 1
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self.seq - self.next_seq)
+
+        np.ndarray(image.shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot*self.slot_size)[...] = image
+        self.meta[seq] = (slot, frame.expo, frame.avg, frame.t_done, time.monotonic())
+
+        self.pool.apply_async(_run, (self.job, self.args, seq, slot, self.slot_size, image.shape), callback=self.on_done,
+            error_callback=lambda error: self.on_error(seq, error))
+        return True
+
+    def on_error(self, seq, error):
+        # The job or its result could not be pickled, the frame gets an error result and its slot back
+        now = time.monotonic()
+        self.on_done((seq, None, error, now, now))
+
+    def on_done(self, done):
+        # On the result thread of the pool, results are handed out in order
+        with self.lock:
+            self.pending[done[0]] = done
+
+            while self.next_seq in self.pending:
+                seq, array, value, t_start, t_end = self.pending.pop(self.next_seq)
+                slot, expo, avg, timestamp, t_submit = self.meta.pop(seq)
+
+                if isinstance(value, Exception):
+                    self.errors += 1
+                elif array is not None:
+                    shape, dtype = array
+                    image = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=slot*self.slot_size).copy()
+                    value = image if value is None else (image,) + value
+
+                now = time.monotonic()
+                self.latencies["queue"].append(t_start - t_submit)
+                self.latencies["process"].append(t_end - t_start)
+                self.latencies["reorder"].append(now - t_end)
+                self.latencies["total"].append(now - t_submit)
+
+                self.free.append(slot)
+                self.next_seq += 1
+                self.completed += 1
+                self.lock.notify_all()
+                self.output.put(Result(seq, value, expo, avg, timestamp))
+
+    def results(self, timeout=None):
+        """Yields the results in frame order, until none came for `timeout` seconds"""
+        while True:
+            try:
+                yield self.output.get(timeout=timeout)
+            except queue.Empty:
+                return
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.start
+
+        def percentiles(values):
+            if not values:
+                return None
+            values = 1e3*np.array(values)
+            return {"p50": float(np.percentile(values, 50)), "p99": float(np.percentile(values, 99))}
+
+        with self.lock:
+            return {
+                "job": getattr(self.job, "__name__", str(self.job)),
+                "workers": self.workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "depth": self.seq - self.next_seq,
+                "max_depth": self.max_depth,
+                "frames/s": self.completed/elapsed,
+                "latency_ms": {stage: percentiles(values) for stage, values in self.latencies.items()},
+            }
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.shm.close()
+        self.shm.unlink()
+
+def benchmark(job="canny", workers=1, frames=200, N=28, M=28):
+    """Throughput of the pipeline on random frames"""
+    from ridope_frames import Frame
+
+    rng = np.random.default_rng(0)
+    frame = Frame(size=N*M)
+    frame.reset(N, M)
+
+    function, args = JOBS[job]
+    pipeline = ProcessingPipeline(function, args, workers, size=N*M)
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        frame.image[...] = rng.integers(0, 256, (N, M), dtype=np.uint8)
+        pipeline.submit(frame)
+
+    for result in pipeline.results(timeout=5.0):
+        if result.seq == frames - 1:
+            break
+
+    elapsed = time.perf_counter() - start
+    stats = pipeline.stats()
+    pipeline.close()
+
+    stats["frames/s"] = frames/elapsed
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of the RIDOPE processing pipeline")
+    parser.add_argument("--job",     default="canny",                 help="Processing job: " + ", ".join(JOBS))
+    parser.add_argument("--workers", default=[1], type=int, nargs="+", help="Worker process counts to benchmark")
+    parser.add_argument("--frames",  default=200, type=int,           help="Frames per run")
+    parser.add_argument("--height",  default=28, type=int,            help="Frame height")
+    parser.add_argument("--width",   default=28, type=int,            help="Frame width")
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        print(json.dumps(benchmark(args.job, workers, args.frames, args.height, args.width)))
+
+if __name__ == "__main__":
+    main()
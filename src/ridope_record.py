@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Recording of the raw UART byte stream and its replay through the parser
+
+import argparse
+import json
+import struct
+import threading
+import time
+
+from comm_ridope import cmd
+
+MAGIC = b"RIDOPREC"
+header_struct = struct.Struct("<8sd")   # Magic, time of the first read
+record_struct = struct.Struct("<dI")    # Time of the read, byte count
+
+class RecordingPort:
+    """
+    Serial port wrapper writing every byte read to a log file.
+
+    Each read is stored with its time.time(), so the stream can be replayed
+    at its recorded pace. Writes and attributes go to the wrapped port, so
+    it can be handed to StreamParser.read() in place of the port.
+    """
+
+    def __init__(self, port, path):
+        self.port = port
+        self.file = open(path, "wb")
+        self.file.write(header_struct.pack(MAGIC, time.time()))
+        self.lock = threading.Lock()
+        self.bytes = 0
+
+    def __getattr__(self, name):
+        return getattr(self.port, name)
+
+    def record(self, data):
+        if not data:
+            return
+        with self.lock:
+            self.file.write(record_struct.pack(time.time(), len(data)))
+            self.file.write(data)
+            self.bytes += len(data)
+
+    def readinto(self, b):
+        n = self.port.readinto(b) or 0
+        self.record(b[:n])
+        return n
+
+    def read(self, size=1):
+        data = self.port.read(size)
+        self.record(data)
+        return data
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+        self.port.close()
+
+def records(path):
+    """Yields the (time, data) reads of a log file"""
+    with open(path, "rb") as f:
+        magic, _ = header_struct.unpack(f.read(header_struct.size))
+        if magic != MAGIC:
+            raise ValueError("Not a RIDOPE recording: " + path)
+
+        while True:
+            header = f.read(record_struct.size)
+            if len(header) < record_struct.size:
+                return
+
+            t, n = record_struct.unpack(header)
+            data = f.read(n)
+            if len(data) < n:
+                return
+
+            yield t, data
+
+class ReplayPort:
+    """
+    Serial port replaying a log file.
+
+    With pace="recorded" the bytes come out at the times they were recorded
+    (divided by `speed`), with pace="fast" as fast as they are read. Writes
+    are discarded. At the end of the log reads time out like an idle port and
+    the `eof` event is set, use it as the stop event of StreamParser.read().
+    """
+
+    def __init__(self, path, pace="recorded", speed=1.0, timeout=0.1):
+        if pace not in ("recorded", "fast"):
+            raise ValueError("Unknown replay pace: " + pace)
+
+        self.records = records(path)
+        self.pace = pace
+        self.speed = speed
+        self.timeout = timeout
+        self.baudrate = None
+        self.eof = threading.Event()
+
+        self.t0 = None
+        self.start = None
+        self.due = 0.0
+        self.data = memoryview(b"")
+        self.idle = False
+
+        self.bytes = 0
+        self.written = 0
+
+    def next(self):
+        """Loads the next read of the log, False at its end"""
+        for t, data in self.records:
+            if self.t0 is None:
+                self.t0 = t
+                self.start = time.monotonic()
+
+            self.due = self.start + (t - self.t0)/self.speed
+            self.data = memoryview(data)
+            return True
+
+        self.eof.set()
+        return False
+
+    @property
+    def in_waiting(self):
+        if not self.data and not self.next():
+            return 0
+        if self.pace == "recorded" and time.monotonic() < self.due:
+            return 0
+        return len(self.data)
+
+    def readinto(self, b):
+        if not self.data and not self.next():
+            # Returns at once the first time, so a reader stopping on `eof` does not wait
+            if self.idle:
+                time.sleep(self.timeout)
+            self.idle = True
+            return 0
+
+        if self.pace == "recorded":
+            wait = self.due - time.monotonic()
+            if wait > self.timeout:
+                time.sleep(self.timeout)
+                return 0
+            if wait > 0:
+                time.sleep(wait)
+
+        n = min(len(b), len(self.data))
+        b[:n] = self.data[:n]
+        self.data = self.data[n:]
+        self.bytes += n
+        return n
+
+    def read(self, size=1):
+        b = bytearray(size)
+        return bytes(b[:self.readinto(b)])
+
+    def write(self, data):
+        self.written += len(data)
+        return len(data)
+
+    def close(self):
+        self.records.close()
+
+def replay(path, pace="fast", speed=1.0):
+    """Feeds a log file through the parser and the frame assembler, returns their stats"""
+    from ridope_frames import FrameAssembler
+    from ridope_parser import StreamParser
+
+    port = ReplayPort(path, pace, speed)
+    parser = StreamParser()
+    # The resends asked during the recording are in the log, the assembler
+    # waits for them like it did
+    assembler = FrameAssembler(nack=lambda offset, length: None)
+    texts = []
+    parser.on_text = texts.append
+
+    cpu = time.process_time()
+    start = time.perf_counter()
+
+    for item in parser.read(port, port.eof):
+        assembler.feed(item)
+
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    port.close()
+
+    return {
+        "path": path,
+        "pace": pace,
+        "bytes": parser.bytes_in,
+        "messages": parser.messages,
+        "desyncs": parser.desyncs,
+        "text_lines": len(texts),
+        "frames": assembler.completed,
+        "incomplete": assembler.incomplete,
+        "elapsed_s": elapsed,
+        "MB/s": parser.bytes_in/elapsed/1e6,
+        "cpu_ms_per_frame": 1e3*cpu/assembler.completed if assembler.completed else None,
+    }
+
+def record(port, path, baudrate=115200, duration=0.0, trigger=False):
+    """Records the stream of a port for `duration` seconds (0: until interrupted)"""
+    import serial
+    from comm_ridope import DELIMITER, pack_cmd
+
+    uart = RecordingPort(serial.Serial(port, baudrate, timeout=0.5), path)
+    if trigger:
+        uart.write(DELIMITER + pack_cmd(cmd.TRANS_FRAME))
+
+    end = time.monotonic() + duration
+    try:
+        while duration == 0 or time.monotonic() < end:
+            uart.read(uart.in_waiting or 1)
+    except KeyboardInterrupt:
+        pass
+
+    uart.close()
+    return {"path": path, "bytes": uart.bytes}
+
+def main():
+    parser = argparse.ArgumentParser(description="Records or replays the RIDOPE UART byte stream")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rec = subparsers.add_parser("record", help="Record the byte stream of a port")
+    rec.add_argument("path",                                          help="Log file")
+    rec.add_argument("--port",     default="/dev/ttyUSB0",            help="Serial port")
+    rec.add_argument("--baudrate", default=115200, type=int,          help="Serial baudrate")
+    rec.add_argument("--duration", default=0.0, type=float,           help="Recording duration in seconds (0: until Ctrl-C)")
+    rec.add_argument("--trigger",  action="store_true",               help="Send one TRANS_FRAME trigger when starting")
+
+    rep = subparsers.add_parser("replay", help="Replay a log file through the parser")
+    rep.add_argument("path",                                          help="Log file")
+    rep.add_argument("--pace",     default="fast",                    help="recorded or fast")
+    rep.add_argument("--speed",    default=1.0, type=float,           help="Speed-up of the recorded pace")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        print(json.dumps(record(args.port, args.path, args.baudrate, args.duration, args.trigger)))
+    else:
+        print(json.dumps(replay(args.path, args.pace, args.speed)))
+
+if __name__ == "__main__":
+    main()
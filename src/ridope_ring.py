@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Memory-mapped on-disk ring of frames for long recordings
+
+import sys
+
+import numpy as np
+
+MAGIC = b"RIDOPERG"
+VERSION = 1
+PAGE = 4096
+
+HEADER_DTYPE = np.dtype([
+    ("magic",    "S8"),
+    ("version",  "<u4"),
+    ("capacity", "<u4"),
+    ("height",   "<u4"),
+    ("width",    "<u4"),
+    ("written",  "<u8"),
+])
+
+INDEX_DTYPE = np.dtype([
+    ("seq",       "<i8"),
+    ("timestamp", "<f8"),
+    ("expo",      "<u4"),
+    ("avg",       "<u4"),
+    ("height",    "<u2"),
+    ("width",     "<u2"),
+    ("size",      "<u4"),
+])
+
+def align(offset):
+    return (offset + PAGE - 1) // PAGE * PAGE
+
+class FrameRing:
+    """
+    Preallocated file holding the last `capacity` frames of a recording.
+
+    The file starts with a header page, followed by the index (one entry per
+    slot: frame number, timestamp, exposure, average and size) and the frame
+    slots, each big enough for a height x width frame. Appending a frame is
+    one copy into the mapped file, readers only touch the frames they ask
+    for. Frame i is the i-th oldest frame still in the ring.
+    """
+
+    def __init__(self, path, capacity=None, height=None, width=None, mode="r"):
+        if mode == "w+":
+            header = np.zeros(1, dtype=HEADER_DTYPE)
+            header[0] = (MAGIC, VERSION, capacity, height, width, 0)
+        else:
+            header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+            if header.size != 1 or header[0]["magic"] != MAGIC or header[0]["version"] != VERSION:
+                raise ValueError("Not a frame ring: " + path)
+
+        capacity = int(header[0]["capacity"])
+        height = int(header[0]["height"])
+        width = int(header[0]["width"])
+
+        index_offset = PAGE
+        data_offset = align(index_offset + capacity*INDEX_DTYPE.itemsize)
+
+        self.path = path
+        self.capacity = capacity
+        self.height = height
+        self.width = width
+
+        self.data = np.memmap(path, dtype=np.uint8, mode=mode, offset=data_offset, shape=(capacity, height, width))
+        self.header = np.memmap(path, dtype=HEADER_DTYPE, mode="r+" if mode == "w+" else mode, shape=(1,))
+        self.index = np.memmap(path, dtype=INDEX_DTYPE, mode="r+" if mode == "w+" else mode, offset=index_offset, shape=(capacity,))
+
+        if mode == "w+":
+            self.header[:] = header
+
+    @classmethod
+    def create(cls, path, capacity, height, width):
+        return cls(path, capacity, height, width, mode="w+")
+
+    @property
+    def written(self):
+        return int(self.header[0]["written"])
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    def append(self, image, seq, timestamp=0.0, expo=0, avg=0):
+        written = self.written
+        slot = written % self.capacity
+        height, width = image.shape
+
+        self.data[slot, :height, :width] = image
+        self.index[slot] = (seq, timestamp, expo, avg, height, width, image.nbytes)
+        self.header[0]["written"] = written + 1
+
+    def slots(self, key):
+        """Slots of the frames selected by an index or a slice"""
+        count = len(self)
+        first = self.written - count
+
+        if isinstance(key, slice):
+            return (first + np.arange(*key.indices(count))) % self.capacity
+
+        if key < 0:
+            key += count
+        if not 0 <= key < count:
+            raise IndexError("Frame index out of range")
+
+        return (first + key) % self.capacity
+
+    def __getitem__(self, key):
+        """A frame, or a stack of frames for a slice (cropped to the first frame size)"""
+        slots = self.slots(key)
+
+        if isinstance(key, slice):
+            if slots.size == 0:
+                return np.empty((0, 0, 0), dtype=np.uint8)
+            height = self.index[slots[0]]["height"]
+            width = self.index[slots[0]]["width"]
+            return self.data[slots, :height, :width]
+
+        entry = self.index[slots]
+        return self.data[slots, :entry["height"], :entry["width"]]
+
+    def meta(self, key):
+        """Index entries of a frame or of a slice of frames"""
+        return self.index[self.slots(key)]
+
+    def find(self, seq):
+        """Position of a frame number in the ring, or None"""
+        positions = np.nonzero(self.meta(slice(None))["seq"] == seq)[0]
+        return int(positions[0]) if positions.size else None
+
+    def flush(self):
+        self.data.flush()
+        self.index.flush()
+        self.header.flush()
+
+    def close(self):
+        if self.data.mode != "r":
+            self.flush()
+        del self.data, self.index, self.header
+
+class RingWriter:
+    """FrameSink writer recording into a FrameRing"""
+
+    def __init__(self, path, capacity, height, width):
+        self.ring = FrameRing.create(path, capacity, height, width)
+
+    def write(self, record):
+        self.ring.append(record.image, record.seq, record.timestamp, record.expo, record.avg)
+
+    def close(self):
+        self.ring.close()
+
+if __name__ == "__main__":
+    ring = FrameRing(sys.argv[1])
+    meta = ring.meta(slice(None))
+    print("Frames: ", len(ring), "/", ring.written, "written")
+    if len(ring):
+        print("Seq: ", meta["seq"][0], "-", meta["seq"][-1])
+        print("Time: ", meta["timestamp"][-1] - meta["timestamp"][0], "s")
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Trigger scheduling with back-pressure from the received frames
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+MODES = ("max-rate", "fixed-rate")
+
+class Trigger:
+    __slots__ = ("sent", "first", "attempt")
+
+    def __init__(self, now):
+        self.sent = now
+        self.first = now
+        self.attempt = 0
+
+class TriggerScheduler:
+    """
+    Sends the capture triggers on its own thread.
+
+    In "max-rate" mode a trigger is sent as soon as there is room for it, in
+    "fixed-rate" mode one every `period` seconds, a tick is skipped when there
+    is no room. At most `max_inflight` triggers wait for their frame at once,
+    the firmware handles a single frame at a time so 1 keeps it from being
+    overrun. Frames (or STOP_TRANS of incomplete frames) are matched to the
+    oldest pending trigger through on_frame(). A trigger without an answer
+    after `timeout` seconds is sent again, up to `retries` times, then counted
+    as lost. `on_latency`, when given, is called with the trigger to frame
+    latency of every frame.
+
+    The answers carry no trigger number, a late answer to the first send of a
+    resent trigger cannot be told from the answer to the resend. So no new
+    trigger is sent while a resent one is pending, and once it is answered
+    the link is drained: for `timeout` seconds the answers left to its earlier
+    sends are dropped as duplicates, instead of ending the next triggers. The
+    sends of a lost trigger are drained the same way.
+    """
+
+    def __init__(self, send, mode="max-rate", period=1.0, max_inflight=1, timeout=5.0, retries=2, on_latency=None):
+        if mode not in MODES:
+            raise ValueError("Unknown scheduler mode: " + mode)
+
+        self.send = send
+        self.mode = mode
+        self.period = period
+        self.max_inflight = max_inflight
+        self.timeout = timeout
+        self.retries = retries
+        self.on_latency = on_latency
+
+        self.lock = threading.Condition()
+        self.inflight = deque()
+        self.latencies = deque(maxlen=1000)
+        self.running = False
+        self.thread = None
+        self.drain = 0              # Answers of earlier sends that may still come
+        self.drain_until = None
+
+        self.sent = 0
+        self.frames = 0
+        self.incomplete = 0
+        self.timeouts = 0
+        self.retried = 0
+        self.lost = 0
+        self.skipped = 0
+        self.duplicates = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            self.lock.notify_all()
+        self.thread.join()
+
+    def on_frame(self, frame):
+        """Ends the oldest pending trigger, frame is None for an incomplete one"""
+        now = time.monotonic()
+        latency = None
+
+        with self.lock:
+            if not self.inflight:
+                if self.drain:
+                    self.drain -= 1
+                    self.duplicates += 1
+                    self.lock.notify_all()
+                return
+
+            trigger = self.inflight.popleft()
+
+            if trigger.attempt:
+                self.drain += trigger.attempt
+                self.drain_until = now + self.timeout
+
+            if frame is None:
+                self.incomplete += 1
+            else:
+                self.frames += 1
+                latency = now - trigger.first
+                self.latencies.append(latency)
+
+            self.lock.notify_all()
+
+        if latency is not None and self.on_latency is not None:
+            self.on_latency(latency)
+
+    def expire(self, now):
+        while self.inflight and now - self.inflight[0].sent >= self.timeout:
+            trigger = self.inflight.popleft()
+            self.timeouts += 1
+
+            if trigger.attempt < self.retries:
+                trigger.attempt += 1
+                trigger.sent = now
+                self.retried += 1
+                self.sent += 1
+                self.send()
+                self.inflight.append(trigger)
+            else:
+                self.lost += 1
+                self.drain += trigger.attempt + 1
+                self.drain_until = now + self.timeout
+
+        if self.drain and now >= self.drain_until:
+            self.drain = 0
+
+    def holding(self):
+        """No new trigger until the resent ones are answered and drained"""
+        return self.drain > 0 or any(trigger.attempt for trigger in self.inflight)
+
+    def run(self):
+        next_tick = time.monotonic()
+
+        with self.lock:
+            while self.running:
+                now = time.monotonic()
+                self.expire(now)
+
+                room = len(self.inflight) < self.max_inflight and not self.holding()
+
+                if self.mode == "max-rate":
+                    if room:
+                        self.inflight.append(Trigger(now))
+                        self.sent += 1
+                        self.send()
+                        continue
+                    wake = None
+                elif now >= next_tick:
+                    if room:
+                        self.inflight.append(Trigger(now))
+                        self.sent += 1
+                        self.send()
+                    else:
+                        self.skipped += 1
+                    next_tick = max(next_tick + self.period, now)
+                    continue
+                else:
+                    wake = next_tick
+
+                if self.inflight:
+                    deadline = self.inflight[0].sent + self.timeout
+                    wake = deadline if wake is None else min(wake, deadline)
+                if self.drain:
+                    wake = self.drain_until if wake is None else min(wake, self.drain_until)
+
+                self.lock.wait(None if wake is None else max(wake - now, 0))
+
+    def stats(self):
+        with self.lock:
+            latencies = np.array(self.latencies)
+
+        stats = {
+            "mode": self.mode,
+            "sent": self.sent,
+            "frames": self.frames,
+            "incomplete": self.incomplete,
+            "timeouts": self.timeouts,
+            "retries": self.retried,
+            "lost": self.lost,
+            "skipped": self.skipped,
+            "duplicates": self.duplicates,
+        }
+
+        if latencies.size:
+            stats.update({
+                "latency_p50_ms": float(1e3*np.percentile(latencies, 50)),
+                "latency_p99_ms": float(1e3*np.percentile(latencies, 99)),
+            })
+
+        return stats
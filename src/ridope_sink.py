@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Frame sinks, writing frames off the capture thread
+
+import os
+import queue
+import threading
+import time
+from typing import NamedTuple, Any
+
+import numpy as np
+
+class Record(NamedTuple):
+    seq: int
+    image: Any
+    expo: int
+    avg: int
+    timestamp: float
+
+class NpyWriter:
+    """One raw .npy file per frame"""
+
+    def __init__(self, directory=".", pattern="frame_{seq:06d}.npy"):
+        self.directory = directory
+        self.pattern = pattern
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, record):
+        np.save(os.path.join(self.directory, self.pattern.format(seq=record.seq)), record.image)
+
+    def close(self):
+        pass
+
+class PngWriter:
+    """One uncompressed PNG per frame, a pattern without {seq} keeps overwriting the same file"""
+
+    def __init__(self, directory=".", pattern="frame_{seq:06d}.png"):
+        self.directory = directory
+        self.pattern = pattern
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, record):
+        from PIL import Image
+
+        im = Image.fromarray(record.image, mode="L")
+        im.save(os.path.join(self.directory, self.pattern.format(seq=record.seq)), compress_level=0)
+
+    def close(self):
+        pass
+
+class MatWriter:
+    """Batches of frames stacked in .mat files, with their seq, exposure, average and timestamp"""
+
+    def __init__(self, directory=".", pattern="frames_{seq:06d}.mat", batch=100):
+        self.directory = directory
+        self.pattern = pattern
+        self.batch = batch
+        self.records = []
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, record):
+        with self.lock:
+            self.records.append(record)
+            if len(self.records) < self.batch:
+                return
+            records = self.records
+            self.records = []
+
+        self.flush(records)
+
+    def flush(self, records):
+        from scipy.io import savemat
+
+        savemat(os.path.join(self.directory, self.pattern.format(seq=records[0].seq)), {
+            "frames": np.stack([record.image for record in records]),
+            "seq": np.array([record.seq for record in records]),
+            "expo": np.array([record.expo for record in records]),
+            "avg": np.array([record.avg for record in records]),
+            "timestamp": np.array([record.timestamp for record in records]),
+        })
+
+    def close(self):
+        with self.lock:
+            records = self.records
+            self.records = []
+
+        if records:
+            self.flush(records)
+
+class FrameSink:
+    """
+    Hands frames to a writer running on its own worker threads.
+
+    submit() copies the image, so the frame can go back to its pool right
+    away. When the bounded queue is full the frame is either dropped
+    (policy="drop") or submit() waits for room (policy="block").
+    """
+
+    def __init__(self, writer, maxsize=16, policy="drop", workers=1):
+        if policy not in ("block", "drop"):
+            raise ValueError("Unknown sink policy: " + policy)
+
+        self.writer = writer
+        self.policy = policy
+        self.queue = queue.Queue(maxsize)
+        self.lock = threading.Lock()
+
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.bytes = 0
+        self.busy = 0.0
+        self.start = time.perf_counter()
+
+        self.workers = [threading.Thread(target=self.run, daemon=True) for _ in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, frame):
+        record = Record(frame.seq, frame.image.copy(), frame.expo, frame.avg, frame.t_done)
+        self.submitted += 1
+
+        try:
+            self.queue.put(record, block=(self.policy == "block"))
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+        return True
+
+    def run(self):
+        while True:
+            record = self.queue.get()
+
+            if record is None:
+                self.queue.task_done()
+                return
+
+            start = time.perf_counter()
+            self.writer.write(record)
+            busy = time.perf_counter() - start
+
+            with self.lock:
+                self.written += 1
+                self.bytes += record.image.nbytes
+                self.busy += busy
+
+            self.queue.task_done()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.start
+
+        return {
+            "writer": type(self.writer).__name__,
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "queue": self.queue.qsize(),
+            "frames/s": self.written/elapsed,
+            "MB/s": self.bytes/elapsed/1e6,
+            "ms/frame": 1e3*self.busy/self.written if self.written else 0.0,
+        }
+
+    def close(self):
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+
+        self.writer.close()
@@ -75,7 +75,8 @@ uint8_t ridope_otsu(const uint8_t *img_in, uint8_t *img_out, uint8_t *threshold,
 
 	*threshold = 0;
 	uint8_t max_intensity = 255;
-	double var_class, var_max, sum, sumB, q1, q2, u1, u2 = 0;
+	double var_class, q2, u1, u2;
+	double var_max = 0, sum = 0, sumB = 0, q1 = 0;
 	float histogram[max_intensity+1];
 
 	/* Image histogram */
@@ -288,38 +289,27 @@ uint8_t ridope_conv(const uint8_t *img_in, uint8_t *img_out, size_t height, size
 					int x_n = x + a - offset;
 					int y_n = y + b - offset;
 
-					if (x_n < 0 || y_n < 0 || x_n == width || y_n == height)
+					/* Pixels out of the image take the value of the nearest border pixel */
+					if(x_n < 0)
 					{
-						int x_near = x_n;
-						int y_near = y_n;
-
-						if(y_n < 0)
-						{
-							y_near = abs(y_n) + y_n;
-						}
-
-						if(x_n < 0)
-						{
-							x_near = abs(x_n) + x_n;
-						}
-
-						if(x_n == width)
-						{
-							x_near = width - 1;
-						}
-
-						if(y_n == height)
-						{
-							y_near = height - 1;
-						}
-						pixel_mask = kernel_in[kernel_size * a + b];
-						pixel = img_in[width * x_near + y_near]*pixel_mask;
+						x_n = 0;
 					}
-					else
+					else if(x_n >= (int) height)
 					{
-						pixel_mask = kernel_in[kernel_size * a + b];
-						pixel = img_in[width * x_n + y_n]*pixel_mask;
+						x_n = height - 1;
 					}
+
+					if(y_n < 0)
+					{
+						y_n = 0;
+					}
+					else if(y_n >= (int) width)
+					{
+						y_n = width - 1;
+					}
+
+					pixel_mask = kernel_in[kernel_size * a + b];
+					pixel = img_in[width * x_n + y_n]*pixel_mask;
 					pixel_result += pixel;
 				}
 			}
@@ -608,8 +598,9 @@ uint8_t ridope_non_max_supression(uint8_t *mag_in, uint8_t *ang_in, uint8_t *img
 	{
 		for(int y = 0; y < width; y++)
 		{
-			int neighbor_x_1, neighbor_y_1;
-			int neighbor_x_2, neighbor_y_2;
+			/* Other angles compare the pixel with itself, it is kept */
+			int neighbor_x_1 = x, neighbor_y_1 = y;
+			int neighbor_x_2 = x, neighbor_y_2 = y;
 
 			if(ang_in[width * x + y] == 0)
 			{
@@ -731,8 +722,8 @@ uint8_t ridope_edge_tracking(uint8_t *img_in_out, uint8_t high_threshold, uint8_
 		{
 			for(int y = -1; y < 1; y++)
 			{
-				int img_x = get_updated_index(weak_edge_x-x, 0, width);
-				int img_y = get_updated_index(weak_edge_y-y, 0, height);
+				int img_x = get_updated_index(weak_edge_x-x, 0, height-1);
+				int img_y = get_updated_index(weak_edge_y-y, 0, width-1);
 
 				if(img_in_out[width * img_x + img_y] == 255)
 				{
@@ -761,6 +752,8 @@ uint8_t ridope_edge_tracking(uint8_t *img_in_out, uint8_t high_threshold, uint8_
 		}
 	}
 
+	free(weak_edges_indexes);
+
 	return 0;
 }
 
@@ -826,5 +819,8 @@ uint8_t ridope_canny(uint8_t *img_in, uint8_t *img_out, uint8_t high_threshold,
 
 	memcpy(img_out,img_temp,height*width);
 
+	free(img_temp);
+	free(ang);
+
 	return 0;
 }
@@ -0,0 +1,20 @@
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# NumPy port of ridope_sp.c, bit-compatible with the firmware
+
+# Images are 2-D uint8 arrays of shape (height, width). Every function returns
+# what its C counterpart writes, including the C quirks: the edge tracking only
+# looks at the neighbours below and on the right and only tracks the first half
+# of the weak edges. exp(), atan2() and sqrt() go through the math module so
+# they round like libm. ridope_sp.host runs ridope_sp.c itself on the host.
+
+from .threshold import MAX_INTENSITY, histogram, otsu
+from .filters import gaussian_kernel, sobel_kernel, conv, gaussian_filter, sobel_filter
+from .edges import get_mag_ang, scaling, get_updated_index, non_max_supression, edge_tracking, canny
+
+__all__ = [
+    "MAX_INTENSITY", "histogram", "otsu",
+    "gaussian_kernel", "sobel_kernel", "conv", "gaussian_filter", "sobel_filter",
+    "get_mag_ang", "scaling", "get_updated_index", "non_max_supression", "edge_tracking", "canny",
+]
@@ -0,0 +1,113 @@
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Gradient, non-maximum suppression and hysteresis
+
+import math
+from functools import lru_cache
+
+import numpy as np
+
+from .filters import _to_uint8, gaussian_filter, sobel_filter
+
+@lru_cache(maxsize=None)
+def _mag_ang_luts():
+    """Magnitude and angle bin of every (x, y) pair of uint8 components"""
+    x, y = np.mgrid[0:256, 0:256]
+    mag = _to_uint8(np.sqrt((x*x + y*y).astype(np.float64)))
+
+    ang = np.empty((256, 256), dtype=np.uint8)
+    for i in range(256):
+        for j in range(256):
+            ang_d = math.atan2(j, i) * 180/math.pi
+            if (0 <= ang_d <= 22.5) or (157.5 < ang_d <= 180):
+                ang[i, j] = 0
+            elif 22.5 < ang_d <= 67.5:
+                ang[i, j] = 45
+            elif 67.5 < ang_d <= 112.5:
+                ang[i, j] = 90
+            else:
+                ang[i, j] = 135
+
+    return mag, ang
+
+def get_mag_ang(img_x, img_y):
+    """Returns the scaled magnitude and the angle bin (0, 45, 90, 135) of the gradient"""
+    mag, ang = _mag_ang_luts()
+    return scaling(mag[img_x, img_y]), ang[img_x, img_y]
+
+def scaling(img):
+    """Scales the image between 0 and its max to 0 and 255"""
+    top = int(img.max())
+    if top == 0:
+        return img.copy()
+    return (img.astype(np.int64) * 255 // top).astype(np.uint8)
+
+def get_updated_index(index, limit_min, limit_max):
+    """Clamps the index to the limits, which are uint8_t like in the C"""
+    limit_min &= 0xFF
+    limit_max &= 0xFF
+    return np.where(index < limit_min, limit_min, np.where(index > limit_max, limit_max, index)) & 0xFF
+
+def non_max_supression(mag, ang):
+    """Keeps the pixels that are not lower than their two neighbours along the gradient"""
+    height, width = mag.shape
+    x, y = np.mgrid[0:height, 0:width]
+
+    up = get_updated_index(x - 1, 0, height - 1)
+    down = get_updated_index(x + 1, 0, height - 1)
+    left = get_updated_index(y - 1, 0, width - 1)
+    right = get_updated_index(y + 1, 0, width - 1)
+
+    # Other angles compare the pixel with itself
+    conds = [ang == 0, ang == 45, ang == 90, ang == 135]
+    x_1 = np.select(conds, [x, up, up, up], x)
+    y_1 = np.select(conds, [left, right, y, left], y)
+    x_2 = np.select(conds, [x, down, down, down], x)
+    y_2 = np.select(conds, [right, left, y, right], y)
+
+    flat = mag.ravel()
+    keep = (mag >= flat[width*x_1 + y_1]) & (mag >= flat[width*x_2 + y_2])
+    return np.where(keep, mag, 0).astype(np.uint8)
+
+def edge_tracking(img, high, low):
+    """Hysteresis thresholding of the edges"""
+    height, width = img.shape
+    high &= 0xFF
+    low &= 0xFF
+
+    lut = np.arange(256, dtype=np.uint8)
+    lut[:low] = 0
+    lut[max(high, low):] = 255
+    out = lut[img].ravel()
+
+    weak = np.flatnonzero((img.ravel() >= low) & (img.ravel() < high))
+    # The C loop walks the (x, y) pairs with the pair index, so only the
+    # first half of the weak edges are tracked
+    tracked = weak[:(weak.size + 1)//2]
+    wx, wy = np.divmod(tracked, width)
+
+    img_x = np.stack([get_updated_index(wx + 1, 0, height - 1), get_updated_index(wx, 0, height - 1)], axis=1).repeat(2, axis=1)
+    img_y = np.tile(np.stack([get_updated_index(wy + 1, 0, width - 1), get_updated_index(wy, 0, width - 1)], axis=1), 2)
+    neighbours = width*img_x + img_y
+
+    own = width*wx + wy
+
+    if np.all(neighbours >= own[:, None]):
+        # No edge looks at a pixel promoted before it, the order does not matter
+        connected = (out[neighbours] == 255).any(axis=1)
+    else:
+        connected = np.zeros(tracked.size, dtype=bool)
+        for i in range(tracked.size):
+            connected[i] = (out[neighbours[i]] == 255).any()
+            if connected[i]:
+                out[own[i]] = 255
+
+    out[own] = np.where(connected, 255, 0)
+    return out.reshape(img.shape)
+
+def canny(img, high, low):
+    """Canny edge detection, like ridope_canny()"""
+    smooth = gaussian_filter(img, 5, 1.0)
+    mag, ang = get_mag_ang(*sobel_filter(smooth, 3))
+    return edge_tracking(non_max_supression(mag, ang), high, low)
@@ -0,0 +1,64 @@
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Kernels and convolution
+
+import math
+
+import numpy as np
+
+def gaussian_kernel(size, sigma):
+    """Normalized gaussian kernel, as a (size, size) array of doubles"""
+    den = float(np.float32(2) * np.float32(sigma) * np.float32(sigma))
+    offset = (size - 1) / 2.0
+
+    kernel = np.empty((size, size))
+    total = 0.0
+    for i in range(size):
+        for j in range(size):
+            x = i - offset
+            y = j - offset
+            kernel[i, j] = math.exp(-(x*x + y*y) / den)
+            total += kernel[i, j]
+
+    return kernel / total
+
+def sobel_kernel(size):
+    """Returns the (Gx, Gy) Sobel kernels"""
+    offset = ((size - 1) // 2) & 0xFF
+    x, y = np.mgrid[0:size, 0:size].astype(np.float64) - offset
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gx = np.where((x == 0) & (y == 0), 0.0, y / (2*(x*x + y*y)))
+        gy = np.where((x == 0) & (y == 0), 0.0, x / (2*(x*x + y*y)))
+
+    return gx, gy
+
+def _to_uint8(values):
+    # Conversion of a positive double to uint8_t
+    return (np.trunc(values).astype(np.int64) & 0xFF).astype(np.uint8)
+
+def conv(img, kernel):
+    """Absolute value of the convolution of the image with the kernel, the borders replicated"""
+    height, width = img.shape
+    size = kernel.shape[0]
+    offset = (size // 2) & 0xFF
+
+    rows = np.clip(np.arange(height)[:, None] + np.arange(size)[None, :] - offset, 0, height - 1)
+    cols = np.clip(np.arange(width)[:, None] + np.arange(size)[None, :] - offset, 0, width - 1)
+
+    # Summed in the order of the C loops, the doubles round the same
+    result = np.zeros((height, width))
+    for a in range(size):
+        for b in range(size):
+            result += img[rows[:, a, None], cols[None, :, b]] * kernel[a, b]
+
+    return _to_uint8(np.abs(result))
+
+def gaussian_filter(img, size=5, sigma=1.0):
+    return conv(img, gaussian_kernel(size, sigma))
+
+def sobel_filter(img, size=3):
+    """Returns the X and Y components of the Sobel filter"""
+    gx, gy = sobel_kernel(size)
+    return conv(img, gx), conv(img, gy)
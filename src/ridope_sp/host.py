@@ -0,0 +1,111 @@
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# ridope_sp.c built for the host and called through ctypes, the reference of the port
+
+import contextlib
+import ctypes
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ridope_sp.c")
+
+def build_library(directory, cc="cc"):
+    """Compiles ridope_sp.c unmodified as a shared library, None without a C compiler"""
+    library = os.path.join(directory, "ridope_sp_host.so")
+
+    command = [cc, "-O2", "-shared", "-fPIC", SOURCE, "-o", library, "-lm"]
+    try:
+        subprocess.run(command, capture_output=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return ctypes.CDLL(library)
+
+@contextlib.contextmanager
+def quiet():
+    """Sends the kernels the C prints on stdout to /dev/null"""
+    libc = ctypes.CDLL(None)
+    sys.stdout.flush()
+    saved = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    try:
+        os.dup2(devnull, 1)
+        yield
+    finally:
+        libc.fflush(None)
+        os.dup2(saved, 1)
+        os.close(saved)
+        os.close(devnull)
+
+class Host:
+    """ridope_sp.c functions with the signatures of the port, on buffers of the exact image size"""
+
+    def __init__(self, library):
+        self.lib = library
+
+    def buffer(self, img=None, shape=None):
+        if img is not None:
+            return np.ascontiguousarray(img, dtype=np.uint8).copy()
+        return np.zeros(shape, dtype=np.uint8)
+
+    def ptr(self, buf):
+        return buf.ctypes.data_as(ctypes.POINTER(ctypes.c_uint8))
+
+    def dims(self, shape):
+        return ctypes.c_size_t(shape[0]), ctypes.c_size_t(shape[1])
+
+    def histogram(self, img, hist_max=255):
+        src = self.buffer(img)
+        hist = np.zeros(hist_max + 1, dtype=np.float32)
+        self.lib.ridope_histogram(self.ptr(src), ctypes.c_size_t(img.size), hist.ctypes.data_as(ctypes.POINTER(ctypes.c_float)), ctypes.c_uint16(hist_max))
+        return hist
+
+    def otsu(self, img):
+        src, out = self.buffer(img), self.buffer(shape=img.shape)
+        threshold = ctypes.c_uint8()
+        self.lib.ridope_otsu(self.ptr(src), self.ptr(out), ctypes.byref(threshold), *self.dims(img.shape))
+        return out, threshold.value
+
+    def conv(self, img, kernel):
+        src, out = self.buffer(img), self.buffer(shape=img.shape)
+        kernel = np.ascontiguousarray(kernel, dtype=np.float64)
+        self.lib.ridope_conv(self.ptr(src), self.ptr(out), *self.dims(img.shape), kernel.ctypes.data_as(ctypes.POINTER(ctypes.c_double)), ctypes.c_size_t(kernel.shape[0]))
+        return out
+
+    def gaussian_filter(self, img, size=5, sigma=1.0):
+        src, out = self.buffer(img), self.buffer(shape=img.shape)
+        with quiet():
+            self.lib.ridope_gaussian_filter(self.ptr(src), self.ptr(out), *self.dims(img.shape), ctypes.c_size_t(size), ctypes.c_float(sigma))
+        return out
+
+    def sobel_filter(self, img, size=3):
+        src, gx, gy = self.buffer(img), self.buffer(shape=img.shape), self.buffer(shape=img.shape)
+        with quiet():
+            self.lib.ridope_sobel_filter(self.ptr(src), self.ptr(gx), self.ptr(gy), *self.dims(img.shape), ctypes.c_size_t(size))
+        return gx, gy
+
+    def get_mag_ang(self, img_x, img_y):
+        gx, gy = self.buffer(img_x), self.buffer(img_y)
+        mag, ang = self.buffer(shape=img_x.shape), self.buffer(shape=img_x.shape)
+        self.lib.ridope_get_mag_ang(self.ptr(gx), self.ptr(gy), self.ptr(mag), self.ptr(ang), *self.dims(img_x.shape))
+        return mag, ang
+
+    def non_max_supression(self, mag, ang):
+        mag_in, ang_in, out = self.buffer(mag), self.buffer(ang), self.buffer(shape=mag.shape)
+        self.lib.ridope_non_max_supression(self.ptr(mag_in), self.ptr(ang_in), self.ptr(out), *self.dims(mag.shape))
+        return out
+
+    def edge_tracking(self, img, high, low):
+        buf = self.buffer(img)
+        self.lib.ridope_edge_tracking(self.ptr(buf), ctypes.c_uint8(high), ctypes.c_uint8(low), *self.dims(img.shape))
+        return buf
+
+    def canny(self, img, high, low):
+        src, out = self.buffer(img), self.buffer(shape=img.shape)
+        with quiet():
+            self.lib.ridope_canny(self.ptr(src), self.ptr(out), ctypes.c_uint8(high), ctypes.c_uint8(low), *self.dims(img.shape))
+        return out
@@ -0,0 +1,36 @@
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Histogram and Otsu's method
+
+import numpy as np
+
+MAX_INTENSITY = 255
+
+def histogram(img, hist_max=MAX_INTENSITY):
+    """Histogram of the image, as floats like ridope_histogram()"""
+    return np.bincount(np.ravel(img), minlength=hist_max + 1).astype(np.float32)
+
+def otsu(img):
+    """Returns the image thresholded with Otsu's method and the threshold"""
+    hist = histogram(img)
+    terms = np.arange(MAX_INTENSITY + 1, dtype=np.float32) * hist
+
+    # Sequential sums, in the order of the C loops
+    total = np.cumsum(terms, dtype=np.float64)[-1]
+    q1 = np.cumsum(hist, dtype=np.float64)
+    q2 = img.size - q1
+    sum_b = np.cumsum(terms, dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        u1 = sum_b / q1
+        u2 = (total - sum_b) / q2
+        d = u1 - u2
+        var = q1*q2*(d*d)
+
+    # Empty classes and NaNs never beat var_max, which starts at 0
+    var = np.where((q1 != 0) & (var > 0), var, 0)
+    threshold = int(np.argmax(var)) if var.max() > 0 else 0
+
+    lut = np.where(np.arange(MAX_INTENSITY + 1) > threshold, 255, 0).astype(np.uint8)
+    return lut[img], threshold
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Tests of the packet framing and the frame encoding of the command channel
+
+import numpy as np
+import pytest
+
+from comm_ridope import (cmd, Message, DELIMITER, ENC_RLE, cobs_decode, cobs_encode,
+    pack_chunk, pack_cmd, pack_msg, rle_decode, rle_encode, unpack_packet, unpack_request)
+
+def payloads():
+    rng = np.random.default_rng(0)
+    yield b""
+    yield b"\x00"
+    yield b"\x00"*300
+    yield b"\x01"*253
+    yield b"\x01"*254
+    yield b"\x01"*255
+    yield b"\x01"*254 + b"\x00"
+    yield bytes(range(256))*2
+    for size in (1, 7, 248, 600):
+        yield rng.integers(0, 256, size, dtype=np.uint8).tobytes()
+        yield rng.choice(np.array([0, 1, 255], dtype=np.uint8), size).tobytes()
+
+@pytest.mark.parametrize("data", list(payloads()))
+def test_cobs_round_trip(data):
+    encoded = cobs_encode(data)
+
+    assert DELIMITER not in encoded
+    assert len(encoded) <= len(data) + 1 + len(data)//254
+    assert cobs_decode(encoded) == data
+
+def inner(packet):
+    assert packet[:1] == DELIMITER and packet[-1:] == DELIMITER
+    assert DELIMITER not in packet[1:-1]
+    return packet[1:-1]
+
+def test_packet_round_trip():
+    assert unpack_packet(inner(pack_msg(cmd.CAMERA_EXPO, 5000, 2.5))) == (cmd.CAMERA_EXPO.value, 5000, 2.5, None)
+
+    pixels = bytes(range(248))
+    item = unpack_packet(inner(pack_chunk(496, pixels)))
+    assert (item.cmd, item.real, item.imag, bytes(item.payload)) == (cmd.TRANS_FRAME.value, 496, 248, pixels)
+
+def test_corrupted_packets_are_rejected():
+    packets = [inner(pack_msg(cmd.CAMERA_AVG, 120)), inner(pack_chunk(0, bytes(range(1, 249))))]
+
+    for packet in packets:
+        for i in range(len(packet)):
+            for bit in range(8):
+                corrupted = bytearray(packet)
+                corrupted[i] ^= 1 << bit
+                if not corrupted[i]:
+                    # A delimiter splits the packet instead
+                    continue
+                with pytest.raises(ValueError):
+                    unpack_packet(corrupted)
+
+    with pytest.raises(ValueError):
+        unpack_packet(packets[0][:-1])
+    with pytest.raises(ValueError):
+        unpack_packet(cobs_encode(b"\x31\x00"))
+
+def test_unpack_request():
+    # The encoding of a TRANS_FRAME request is not a chunk offset
+    assert unpack_request(inner(pack_cmd(cmd.TRANS_FRAME, ENC_RLE))) == Message(cmd.TRANS_FRAME.value, ENC_RLE, 0)
+    assert unpack_request(inner(pack_cmd(cmd.RESEND, 248, 496))) == Message(cmd.RESEND.value, 248, 496)
+    assert unpack_request(inner(pack_cmd(cmd.CAMERA_EXPO, -1))).real == -1
+
+    with pytest.raises(ValueError):
+        unpack_request(inner(pack_chunk(0, b"\x01\x02")))
+    with pytest.raises(ValueError):
+        unpack_request(inner(pack_cmd(cmd.PING))[:-1])
+
+def images():
+    rng = np.random.default_rng(1)
+    y, x = np.mgrid[0:28, 0:28]
+    yield "gradient", (4*x + y).astype(np.uint8)
+    yield "bands", (16*((x + y) // 8)).astype(np.uint8)
+    yield "noise", rng.integers(0, 256, (28, 28), dtype=np.uint8)
+    yield "zeros", np.zeros((28, 28), dtype=np.uint8)
+    yield "full", np.full((28, 28), 255, dtype=np.uint8)
+    yield "wrap", np.tile(np.array([250, 5, 255, 0], dtype=np.uint8), (3, 7))
+    yield "long-runs", np.full((2, 700), 9, dtype=np.uint8)
+    yield "pixel", np.array([[77]], dtype=np.uint8)
+
+@pytest.mark.parametrize("name,image", list(images()))
+def test_rle_round_trip(name, image):
+    data = rle_encode(image)
+
+    assert len(data) % 2 == 0
+    assert all(data[0::2])
+    assert np.array_equal(rle_decode(data, *image.shape), image)
+
+    out = np.empty(image.shape, dtype=np.uint8)
+    assert rle_decode(data, *image.shape, out=out) is out
+    assert np.array_equal(out, image)
+
+def test_rle_format():
+    # Deltas restart on every row, runs longer than 255 are split
+    image = np.array([[10, 10, 12], [3, 3, 3]], dtype=np.uint8)
+    assert rle_encode(image) == bytes([1, 10, 1, 0, 1, 2, 1, 3, 2, 0])
+    assert rle_encode(np.full((1, 600), 9, dtype=np.uint8)) == bytes([1, 9, 255, 0, 255, 0, 89, 0])
+    assert rle_encode(np.zeros((0, 4), dtype=np.uint8)) == b""
+
+def test_rle_flat_frames_compress():
+    assert len(rle_encode(np.full((28, 28), 128, dtype=np.uint8))) == 2*28*2
+
+def test_rle_decode_errors():
+    data = rle_encode(np.arange(12, dtype=np.uint8).reshape(3, 4))
+
+    with pytest.raises(ValueError):
+        rle_decode(data[:-1], 3, 4)
+    with pytest.raises(ValueError):
+        rle_decode(data, 3, 5)
+    with pytest.raises(ValueError):
+        rle_decode(data[:-2], 3, 4)
+    with pytest.raises(ValueError):
+        rle_decode(b"\x00\x05" + data, 3, 4)
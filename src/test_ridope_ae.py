@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Tests of the auto-exposure controller against a simulated sensor
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from ridope_ae import AutoExposure, frame_level
+
+def run(auto_expo, gain, expo, frames=30, delay=1, seed=0):
+    """
+    Sensor whose grey level is linear in the exposure, the exposures sent
+    apply `delay` frames later like through the firmware and the link.
+    Returns the level of every frame.
+    """
+    rng = np.random.default_rng(seed)
+    pending = []
+    levels = []
+
+    for _ in range(frames):
+        if pending and pending[0][0] == 0:
+            expo = pending.pop(0)[1]
+        pending = [(t - 1, e) for t, e in pending]
+
+        level = min(gain*expo, 255.0)
+        image = np.clip(rng.normal(level, 2.0, (28, 28)), 0, 255).round().astype(np.uint8)
+        levels.append(frame_level(image))
+
+        new = auto_expo.update(SimpleNamespace(image=image, expo=expo))
+        if new is not None:
+            pending.append((delay, new))
+
+    return levels
+
+@pytest.mark.parametrize("gain,expo", [(0.01, 11264), (0.002, 11264), (0.05, 1000), (0.0005, 11264)])
+def test_converges_to_target(gain, expo):
+    auto_expo = AutoExposure(target=61)
+    levels = run(auto_expo, gain, expo)
+
+    settled = next(i for i, level in enumerate(levels) if abs(level - 61) <= 2)
+    assert settled <= 6
+    assert all(abs(level - 61) <= 3 for level in levels[settled:])
+
+@pytest.mark.parametrize("gain", [1.0, 0.0001])
+def test_leaves_saturation(gain):
+    # A saturated or black frame only shows the direction, it takes a few more steps
+    auto_expo = AutoExposure(target=61)
+    levels = run(auto_expo, gain, 11264, frames=40)
+
+    assert all(abs(level - 61) <= 3 for level in levels[-10:])
+
+def test_stays_at_target():
+    auto_expo = AutoExposure(target=61)
+    levels = run(auto_expo, 0.01, 6100)
+
+    assert auto_expo.updates == 0
+    assert all(abs(level - 61) <= 2 for level in levels)
+
+def test_kp_one_is_deadbeat():
+    auto_expo = AutoExposure(target=100, kp=1.0)
+    levels = run(auto_expo, 0.01, 2000, frames=4)
+
+    assert abs(levels[2] - 100) <= 2
+
+def test_percentile_target():
+    auto_expo = AutoExposure(target=80, percentile=50)
+    levels = run(auto_expo, 0.003, 11264)
+
+    assert abs(levels[-1] - 80) <= 2
+
+def test_clipped_to_exposure_range():
+    auto_expo = AutoExposure(target=200, expo_max=1000)
+    run(auto_expo, 0.0001, 500, frames=10)
+
+    assert auto_expo.pending in (None, 1000)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Tests of the asyncio client against the emulator
+
+import asyncio
+import time
+
+import pytest
+
+from comm_ridope import cmd
+from ridope_client import RidopeCamera
+from ridope_emu import DeviceEmulator
+
+class LossyEmulator(DeviceEmulator):
+    """Emulator losing the response of the first CAMERA_EXPO"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lost = 0
+
+    def handle(self, item):
+        if item.cmd == cmd.CAMERA_EXPO.value and not self.lost:
+            self.expo = int(item.real)
+            self.lost += 1
+            return
+        super().handle(item)
+
+class LateEmulator(DeviceEmulator):
+    """Emulator answering the first CAMERA_EXPO after `delay` seconds"""
+
+    def __init__(self, *args, delay=0.5, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delay = delay
+        self.late = 0
+
+    def handle(self, item):
+        if item.cmd == cmd.CAMERA_EXPO.value and not self.late:
+            self.late += 1
+            time.sleep(self.delay)
+        super().handle(item)
+
+@pytest.fixture
+def emu():
+    emu = LossyEmulator(baudrate=None, seed=0).start()
+    yield emu
+    emu.stop()
+
+@pytest.fixture
+def late_emu():
+    emu = LateEmulator(baudrate=None, seed=0).start()
+    yield emu
+    emu.stop()
+
+def test_lost_response_times_out(emu):
+    async def session():
+        async with RidopeCamera(emu.port, max_inflight=1, timeout=0.5) as cam:
+            with pytest.raises(asyncio.TimeoutError):
+                await cam.set_exposure(5000)
+
+            # The slot is freed once the response is deemed lost, the next responses go to their requests
+            assert await cam.set_exposure(6000) == 6000
+            frame = await cam.trigger()
+            assert frame.expo == 6000
+            assert len(cam.pending) == 0
+            return cam.timeouts
+
+    assert asyncio.run(session()) == 1
+
+def test_pipelined_requests(emu):
+    async def session():
+        async with RidopeCamera(emu.port, max_inflight=4, timeout=2.0) as cam:
+            emu.lost = 1
+            frames = await asyncio.gather(*[cam.trigger() for _ in range(6)])
+            return [frame.image.shape for frame in frames], cam.timeouts
+
+    shapes, timeouts = asyncio.run(session())
+    assert shapes == [(28, 28)]*6
+    assert timeouts == 0
+
+def test_late_response_is_dropped(late_emu):
+    async def session():
+        async with RidopeCamera(late_emu.port, max_inflight=4, timeout=0.25) as cam:
+            with pytest.raises(asyncio.TimeoutError):
+                await cam.set_exposure(5000)
+
+            # The answer to 5000 comes after the timeout, it must not complete these
+            expo, frame = await asyncio.gather(cam.set_exposure(6000), cam.trigger())
+            assert (expo, frame.expo) == (6000, 6000)
+            assert len(cam.pending) == 0 and not cam.stale
+            return cam.timeouts
+
+    assert asyncio.run(session()) == 1
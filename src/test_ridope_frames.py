@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Tests of the frame assembly into pooled buffers
+
+import threading
+
+import numpy as np
+import pytest
+import serial
+
+from comm_ridope import cmd, CHUNK_SIZE, DELIMITER, ENC_RAW, ENC_RLE, pack_chunk, pack_cmd, pack_msg, rle_encode
+from ridope_emu import DeviceEmulator
+from ridope_frames import FrameAssembler, FramePool
+from ridope_parser import StreamParser
+
+N, M = 28, 28
+
+def image(seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (N, M), dtype=np.uint8)
+
+def chunks(data, skip=()):
+    return [pack_chunk(offset, data[offset:offset+CHUNK_SIZE]) for offset in range(0, len(data), CHUNK_SIZE)
+        if offset // CHUNK_SIZE not in skip]
+
+def frame_stream(data, encoding=ENC_RAW, skip=()):
+    """Packets of comm_ridope_send_frame(), without the chunks in `skip`"""
+    return [pack_msg(cmd.PHOTO_SIZE, N, M), pack_msg(cmd.START_TRANS, encoding, len(data)),
+        *chunks(data, skip), pack_msg(cmd.STOP_TRANS, N, M)]
+
+def resend_stream(data, offset, length):
+    """Packets the firmware answers RESEND(offset, length) with"""
+    return [*chunks(data)[offset // CHUNK_SIZE:-(-(offset + length) // CHUNK_SIZE)], pack_msg(cmd.STOP_TRANS, N, M)]
+
+def feed(assembler, packets):
+    """Parses the packets and feeds them, returns the completed frames"""
+    frames = [assembler.feed(item) for item in StreamParser().feed(b"".join(packets))]
+    return [frame for frame in frames if frame is not None]
+
+def test_compression_ratio_ignores_resent_chunks():
+    img = image()
+    data = rle_encode(img)
+    assert len(data) > 2*CHUNK_SIZE
+
+    nacks = []
+    assembler = FrameAssembler(FramePool(count=2, size=N*M), nack=lambda offset, length: nacks.append((offset, length)))
+
+    assert feed(assembler, frame_stream(data, ENC_RLE, skip=(0, 2))) == []
+    assert nacks == [(0, CHUNK_SIZE), (2*CHUNK_SIZE, CHUNK_SIZE)]
+
+    frames = feed(assembler, [packet for nack in nacks for packet in resend_stream(data, *nack)])
+    assert len(frames) == 1
+    assert np.array_equal(frames[0].image, img)
+
+    assert assembler.payload == len(data)
+    assert assembler.resent_bytes == 2*CHUNK_SIZE
+    assert assembler.pixels == N*M
+
+def test_frames_go_through_the_pool():
+    pool = FramePool(count=2, size=N*M)
+    assembler = FrameAssembler(pool)
+    images = [image(seed) for seed in range(3)]
+    buffers = set()
+
+    for i, img in enumerate(images):
+        packets = [pack_msg(cmd.CAMERA_EXPO, 1000 + i), pack_msg(cmd.CAMERA_AVG, 50 + i), *frame_stream(img.tobytes())]
+        frames = feed(assembler, packets)
+        assert len(frames) == 1 and pool.get(timeout=0) is frames[0]
+
+        frame = frames[0]
+        assert np.array_equal(frame.image, img)
+        assert (frame.seq, frame.expo, frame.avg) == (i, 1000 + i, 50 + i)
+        buffers.add(id(frame.buffer))
+        frame.release()
+
+    # Released buffers are reused, not reallocated
+    assert len(buffers) <= 2
+    assert (assembler.completed, assembler.incomplete, assembler.pixels) == (3, 0, 3*N*M)
+
+def pixel_stream(img, lost=0):
+    """Packets of comm_ridope_send_img(), without the last `lost` pixels"""
+    return [pack_msg(cmd.PHOTO_SIZE, N, M), pack_msg(cmd.START_TRANS, ENC_RAW, N*M),
+        *[pack_msg(cmd.TRANS_PHOTO, int(pixel)) for pixel in img.flat[:img.size - lost]], pack_msg(cmd.STOP_TRANS, N, M)]
+
+def test_pixel_messages():
+    img = image(4)
+    frames = feed(FrameAssembler(), pixel_stream(img))
+    assert len(frames) == 1 and np.array_equal(frames[0].image, img)
+
+def test_pixel_frames_are_not_asked_again():
+    nacks = []
+    assembler = FrameAssembler(nack=lambda offset, length: nacks.append((offset, length)))
+
+    frames = feed(assembler, pixel_stream(image(4)))
+    assert len(frames) == 1 and np.array_equal(frames[0].image, image(4))
+
+    # A lost pixel shifts the next ones, there is nothing to ask again
+    assert feed(assembler, pixel_stream(image(5), lost=3)) == []
+    assert not assembler.repairing
+
+    assert nacks == []
+    assert (assembler.completed, assembler.incomplete, assembler.resent) == (1, 1, 0)
+
+def test_incomplete_frame_is_recycled():
+    pool = FramePool(count=1, size=N*M)
+    assembler = FrameAssembler(pool)
+
+    assert feed(assembler, frame_stream(image().tobytes(), skip=(1,))) == []
+    assert (assembler.completed, assembler.incomplete) == (0, 1)
+
+    # The only buffer is free again for the next frame
+    frames = feed(assembler, frame_stream(image(1).tobytes()))
+    assert len(frames) == 1 and np.array_equal(frames[0].image, image(1))
+
+def test_pool_block_policy():
+    pool = FramePool(count=2, size=N*M, policy="block")
+    frames = [pool.acquire(), pool.acquire()]
+    assert pool.acquire(timeout=0.05) is None
+
+    threading.Timer(0.05, frames[0].release).start()
+    assert pool.acquire(timeout=2.0) is frames[0]
+
+def test_pool_drop_policy():
+    pool = FramePool(count=2, size=N*M, policy="drop")
+    first, second = pool.acquire(), pool.acquire()
+    pool.put(first)
+    pool.put(second)
+
+    # The oldest frame no consumer got is taken back
+    assert pool.acquire(timeout=0) is first
+    assert pool.get(timeout=0) is second
+    assert pool.acquire(timeout=0) is None
+    assert pool.dropped == 1
+
+    with pytest.raises(ValueError):
+        FramePool(policy="newest")
+
+class DroppingEmulator(DeviceEmulator):
+    """Emulator losing the second chunk of every first delivery"""
+
+    def resend(self, offset, length):
+        if offset or length < len(self.sent_frame):
+            super().resend(offset, length)
+            return
+
+        pixels = self.sent_frame
+        self.write(b"".join(pack_chunk(pos, pixels[pos:pos+CHUNK_SIZE]) for pos in range(0, len(pixels), CHUNK_SIZE) if pos != CHUNK_SIZE))
+        self.write(pack_msg(cmd.STOP_TRANS, self.N, self.M))
+
+def test_missing_chunks_are_asked_again():
+    img = image(5)
+    data = img.tobytes()
+    nacks = []
+    assembler = FrameAssembler(nack=lambda offset, length: nacks.append((offset, length)))
+
+    # One request per run of missing chunks, the last chunk is shorter
+    assert feed(assembler, frame_stream(data, skip=(0, 2, 3))) == []
+    assert assembler.repairing
+    assert nacks == [(0, CHUNK_SIZE), (2*CHUNK_SIZE, len(data) - 2*CHUNK_SIZE)]
+
+    # The frame waits for the STOP_TRANS of every request
+    assert feed(assembler, resend_stream(data, *nacks[0])) == []
+    assert assembler.repairing
+
+    frames = feed(assembler, resend_stream(data, *nacks[1]))
+    assert len(frames) == 1 and np.array_equal(frames[0].image, img)
+    assert not assembler.repairing
+    assert (assembler.repaired, assembler.resent, len(nacks)) == (1, 3, 2)
+
+def test_repairs_give_up():
+    data = image(6).tobytes()
+    nacks = []
+    assembler = FrameAssembler(FramePool(count=1, size=N*M), nack=lambda offset, length: nacks.append((offset, length)), repairs=2)
+
+    feed(assembler, frame_stream(data, skip=(2,)))
+    # The resent chunk is lost again, twice
+    for _ in range(2):
+        feed(assembler, [pack_msg(cmd.STOP_TRANS, N, M)])
+
+    assert nacks == [(2*CHUNK_SIZE, CHUNK_SIZE)]*2
+    assert (assembler.completed, assembler.incomplete, assembler.repaired) == (0, 1, 0)
+    assert not assembler.repairing
+
+    # The next frame starts clean on the recycled buffer
+    frames = feed(assembler, frame_stream(data))
+    assert len(frames) == 1 and np.array_equal(frames[0].image, image(6))
+
+def test_no_nack_without_callable():
+    assembler = FrameAssembler()
+
+    assert feed(assembler, frame_stream(image().tobytes(), skip=(0,))) == []
+    assert (assembler.incomplete, assembler.resent) == (1, 0)
+
+def test_repair_against_the_emulator():
+    emu = DroppingEmulator(baudrate=None, seed=0).start()
+    try:
+        with serial.Serial(emu.port, 115200, timeout=0.1) as uart:
+            assembler = FrameAssembler(nack=lambda offset, length: uart.write(pack_cmd(cmd.RESEND, offset, length)))
+            parser = StreamParser()
+            frames = []
+
+            uart.write(DELIMITER)
+            for _ in range(3):
+                uart.write(pack_cmd(cmd.TRANS_FRAME))
+                for item in parser.read(uart):
+                    frame = assembler.feed(item)
+                    if frame is not None:
+                        frames.append(frame)
+                        break
+    finally:
+        emu.stop()
+
+    assert len(frames) == 3
+    assert (assembler.repaired, assembler.incomplete, parser.desyncs) == (3, 0, 0)
+
+def test_resend_after_mode_change():
+    emu = DeviceEmulator(baudrate=None, seed=0, noise=0.0).start()
+    try:
+        with serial.Serial(emu.port, 115200, timeout=0.1) as uart:
+            parser = StreamParser()
+            assembler = FrameAssembler(nack=lambda offset, length: uart.write(pack_cmd(cmd.RESEND, offset, length)))
+
+            def answer(request):
+                uart.write(request)
+                items = []
+                for item in parser.read(uart):
+                    items.append(item)
+                    if item.cmd == cmd.STOP_TRANS.value:
+                        return items
+
+            uart.write(DELIMITER)
+            rle = answer(pack_cmd(cmd.TRANS_FRAME, ENC_RLE))
+            pixels = answer(pack_cmd(cmd.CAMERA_TRIG))
+            resent = answer(pack_cmd(cmd.RESEND, 0, N*M))
+    finally:
+        emu.stop()
+
+    assert any(item.cmd == cmd.START_TRANS.value and item.real == ENC_RLE for item in rle)
+
+    # The pixel frame arrived complete, without any request
+    frames = [assembler.feed(item) for item in pixels]
+    assert frames[-1] is not None and assembler.resent == 0
+
+    # A resend sends the raw pixels of the pixel frame, not the RLE bytes of the frame before
+    chunks = b"".join(bytes(item.payload) for item in resent if item.cmd == cmd.TRANS_FRAME.value)
+    assert chunks == frames[-1].image.tobytes()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Tests of the baudrate negotiation against the emulator
+
+import os
+import re
+
+import pytest
+import serial
+
+from comm_ridope import cmd, pack_msg
+from ridope_emu import DeviceEmulator
+from ridope_link import PING_TIMEOUT, negotiate
+
+HEADER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "comm_ridope.h")
+
+class RefusingEmulator(DeviceEmulator):
+    """Firmware without the tuning word CSR, UART_BAUD answers the current baudrate"""
+
+    def handle(self, item):
+        if item.cmd == cmd.UART_BAUD.value:
+            self.write(pack_msg(cmd.UART_BAUD, 115200))
+            return
+        super().handle(item)
+
+class SilentEmulator(DeviceEmulator):
+    """Firmware switching but never getting the PING"""
+
+    def handle(self, item):
+        if item.cmd != cmd.PING.value:
+            super().handle(item)
+
+def test_ping_timeout_matches_firmware():
+    with open(HEADER) as f:
+        timeout_ms = int(re.search(r"#define\s+COMM_RIDOPE_PING_TIMEOUT\s+(\d+)", f.read()).group(1))
+
+    assert PING_TIMEOUT == timeout_ms/1000
+
+@pytest.mark.parametrize("emulator,expected", [(DeviceEmulator, 1000000), (RefusingEmulator, 115200), (SilentEmulator, 115200)])
+def test_negotiate(emulator, expected):
+    emu = emulator(baudrate=None, seed=0).start()
+    try:
+        with serial.Serial(emu.port, 115200, timeout=0.1) as uart:
+            assert negotiate(uart, 1000000) == expected
+            assert uart.baudrate == expected
+    finally:
+        emu.stop()
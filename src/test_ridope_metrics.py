@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Tests of the Prometheus exposition, its server and the JSON log lines
+
+import io
+import json
+import re
+import urllib.error
+import urllib.request
+
+import pytest
+
+from ridope_frames import FrameAssembler, FramePool
+from ridope_metrics import Metrics, MetricsLogger, MetricsServer, capture_metrics
+from ridope_parser import StreamParser, synthetic_stream
+from ridope_sched import TriggerScheduler
+from ridope_sink import FrameSink, NpyWriter
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{le="([^"]+)"\})? (\S+)$')
+
+def parse(text):
+    """Families of the text exposition format: {name: (type, doc, [(sample, le, value)])}"""
+    assert text.endswith("\n")
+    families = {}
+    name = None
+
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            name, doc = line[7:].split(" ", 1)
+            assert name not in families
+            families[name] = [None, doc, []]
+        elif line.startswith("# TYPE "):
+            type_name, kind = line[7:].split(" ")
+            assert type_name == name and kind in ("counter", "gauge", "histogram")
+            families[name][0] = kind
+        else:
+            match = SAMPLE.match(line)
+            assert match, line
+            sample, _, le, value = match.groups()
+            assert sample == name or sample in (name + "_bucket", name + "_sum", name + "_count")
+            families[name][2].append((sample, le, float(value)))
+
+    return {name: tuple(family) for name, family in families.items()}
+
+def test_exposition_format():
+    metrics = Metrics()
+    frames = metrics.counter("frames_total", "Frames")
+    level = metrics.gauge("level", "Level")
+    latency = metrics.histogram("latency_seconds", "Latency", buckets=(0.5, 0.1, 1.0))
+    metrics.counter("bytes_total", "Bytes", lambda: 1234)
+
+    frames.inc()
+    frames.inc(2)
+    level.set(-1.5)
+    for value in (0.05, 0.1, 0.3, 0.7, 5.0):
+        latency.observe(value)
+
+    families = parse(metrics.render())
+
+    assert families["frames_total"] == ("counter", "Frames", [("frames_total", None, 3)])
+    assert families["level"] == ("gauge", "Level", [("level", None, -1.5)])
+    assert families["bytes_total"][2] == [("bytes_total", None, 1234)]
+
+    kind, _, samples = families["latency_seconds"]
+    assert kind == "histogram"
+    # Cumulative buckets in increasing order, a value on a bound counts in its bucket
+    assert [(le, value) for sample, le, value in samples if le] == [("0.1", 2), ("0.5", 3), ("1", 4), ("+Inf", 5)]
+    assert ("latency_seconds_count", None, 5) in samples
+    assert [value for sample, _, value in samples if sample == "latency_seconds_sum"] == [pytest.approx(6.15)]
+
+    with pytest.raises(ValueError):
+        metrics.gauge("level", "Again")
+
+def test_capture_metrics(tmp_path):
+    parser = StreamParser()
+    pool = FramePool(count=8, size=28*28, policy="drop")
+    assembler = FrameAssembler(pool)
+    scheduler = TriggerScheduler(lambda: None)
+    sink = FrameSink(NpyWriter(str(tmp_path)), policy="block")
+
+    metrics = Metrics()
+    latency, op_time = capture_metrics(metrics, parser, assembler, pool, scheduler, [sink])
+
+    stream = synthetic_stream(frames=5, bulk=True)
+    for item in parser.feed(stream[:-40] + b"\x55"*10):
+        assembler.feed(item)
+    latency.observe(0.2)
+    op_time.observe(3.0)
+
+    values = {name: samples[0][2] for name, (kind, doc, samples) in parse(metrics.render()).items() if kind != "histogram"}
+    assert values == {
+        "ridope_bytes_received_total": len(stream) - 30,
+        "ridope_messages_total": parser.messages,
+        "ridope_desyncs_total": 0,
+        "ridope_frames_completed_total": 4,
+        "ridope_frames_incomplete_total": 0,
+        "ridope_frames_repaired_total": 0,
+        "ridope_frames_dropped_total": 0,
+        "ridope_triggers_total": 0,
+        "ridope_triggers_lost_total": 0,
+        "ridope_triggers_inflight": 0,
+        "ridope_sink0_queue_depth": 0,
+        "ridope_sink0_dropped_total": 0,
+    }
+
+    snapshot = metrics.snapshot()
+    assert snapshot["ridope_trigger_latency_seconds"] == {"count": 1, "sum": 0.2, "mean": 0.2}
+    assert snapshot["ridope_op_time"]["count"] == 1
+    sink.close()
+
+def test_server_scrape():
+    metrics = Metrics()
+    metrics.counter("scrapes_total", "Scrapes").inc(7)
+    server = MetricsServer(metrics, port=0).start()
+
+    try:
+        url = "http://127.0.0.1:%d" % server.port
+        with urllib.request.urlopen(url + "/metrics", timeout=5) as response:
+            assert response.status == 200
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            body = response.read().decode()
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(url + "/", timeout=5)
+        assert error.value.code == 404
+    finally:
+        server.stop()
+
+    assert body == metrics.render()
+    assert parse(body)["scrapes_total"][2] == [("scrapes_total", None, 7)]
+
+def test_logger_lines():
+    metrics = Metrics()
+    frames = metrics.counter("frames_total", "Frames")
+    stream = io.StringIO()
+
+    logger = MetricsLogger(metrics, period=3600, stream=stream).start()
+    frames.inc(4)
+    logger.stop()
+
+    # Stopping logs a last snapshot
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(lines) == 1
+    assert lines[0]["frames_total"] == 4 and "timestamp" in lines[0]
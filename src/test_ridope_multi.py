@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Tests of the multi-camera capture against two emulators
+
+import time
+
+import numpy as np
+import pytest
+
+from ridope_emu import DeviceEmulator
+from ridope_multi import MultiCamera
+
+class StallingEmulator(DeviceEmulator):
+    """Emulator stalling `delay` seconds in the middle of its first frame"""
+
+    def __init__(self, *args, delay=0.4, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delay = delay
+        self.stalled = 0
+
+    def resend(self, offset, length):
+        if not self.stalled:
+            self.stalled += 1
+            time.sleep(self.delay)
+        super().resend(offset, length)
+
+@pytest.fixture
+def cameras(request):
+    emus = [emulator(baudrate=None, seed=index).start() for index, emulator in enumerate(request.param)]
+    cameras = MultiCamera([emu.port for emu in emus], timeout=0.25)
+    yield cameras
+    cameras.close()
+    for emu in emus:
+        emu.stop()
+
+@pytest.mark.parametrize("cameras", [(DeviceEmulator, DeviceEmulator)], indirect=True)
+def test_aligned_sets(cameras):
+    sets = list(cameras.sets(4))
+
+    assert [frame_set.seq for frame_set in sets] == [0, 1, 2, 3]
+    for frame_set in sets:
+        assert frame_set.complete
+        assert all(frame.t_start >= frame_set.t_trigger for frame in frame_set.frames)
+        assert frame_set.skew < cameras.timeout
+
+    # The cameras answer each trigger with their own frame
+    assert [frame.seq for frame in sets[-1].frames] == [3, 3]
+    assert not np.array_equal(*[frame.image for frame in sets[-1].frames])
+
+    stats = cameras.stats()
+    assert stats["complete"] == 4
+    assert [(device["frames"], device["missed"]) for device in stats["devices"]] == [(4, 0), (4, 0)]
+
+@pytest.mark.parametrize("cameras", [(DeviceEmulator, StallingEmulator)], indirect=True)
+def test_late_frame_is_skipped(cameras):
+    first = cameras.capture()
+    # The stalled frame started before the timeout
+    assert first.frames[0] is not None and first.frames[1] is None
+    assert cameras.devices[1].assembler.frame is not None
+
+    # It completes during the next set, which waits for the answer to its own trigger
+    second = cameras.capture()
+    assert second.complete
+    assert second.frames[1].seq == 1
+    assert second.frames[1].t_start >= second.t_trigger
+
+    stats = cameras.stats()
+    assert (stats["sets"], stats["complete"]) == (2, 1)
+    assert [(device["frames"], device["missed"]) for device in stats["devices"]] == [(2, 0), (1, 1)]
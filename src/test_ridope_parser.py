@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Tests of the incremental stream parser resynchronisation
+
+import numpy as np
+import pytest
+
+from comm_ridope import cmd, ENC_RLE, pack_msg
+from ridope_parser import StreamParser, synthetic_stream
+
+STREAM = synthetic_stream(frames=3, bulk=True) + synthetic_stream(frames=2) + synthetic_stream(frames=2, bulk=True, encoding=ENC_RLE)
+
+def parse(stream, pieces=1, **kwargs):
+    parser = StreamParser(**kwargs)
+    bounds = np.linspace(0, len(stream), pieces + 1).astype(int)
+    items = [item for start, end in zip(bounds[:-1], bounds[1:]) for item in parser.feed(stream[start:end])]
+    return parser, [(item.cmd, item.real, item.imag, None if item.payload is None else bytes(item.payload)) for item in items]
+
+REFERENCE = parse(STREAM)[1]
+
+@pytest.mark.parametrize("pieces", [1, 7, 1000, len(STREAM)])
+def test_split_anywhere(pieces):
+    parser, items = parse(STREAM, pieces, size=64)
+
+    assert items == REFERENCE
+    assert (parser.messages, parser.desyncs, parser.bytes_in) == (len(REFERENCE), 0, len(STREAM))
+
+def test_corrupted_packet_costs_itself():
+    rng = np.random.default_rng(0)
+    delimiters = np.flatnonzero(np.frombuffer(STREAM, dtype=np.uint8) == 0)
+
+    for _ in range(20):
+        # A byte inside a packet, flipped to anything but a delimiter
+        packet = rng.integers(0, len(delimiters) - 1)
+        while delimiters[packet + 1] - delimiters[packet] < 2:
+            packet = rng.integers(0, len(delimiters) - 1)
+        pos = rng.integers(delimiters[packet] + 1, delimiters[packet + 1])
+
+        stream = bytearray(STREAM)
+        stream[pos] ^= int(rng.integers(1, 256))
+        if not stream[pos]:
+            stream[pos] = 0xAA
+
+        parser, items = parse(bytes(stream), 5)
+
+        assert parser.desyncs == 1
+        assert len(items) == len(REFERENCE) - 1
+        assert sum(item in REFERENCE for item in items) == len(items)
+
+def test_joining_mid_stream():
+    # Opening the port in the middle of the third packet, the first chunk
+    delimiters = np.flatnonzero(np.frombuffer(STREAM, dtype=np.uint8) == 0)
+    packets = delimiters[np.diff(delimiters, append=len(STREAM)) > 1]
+    parser, items = parse(STREAM[packets[2] + 100:])
+
+    assert items == REFERENCE[3:]
+    assert parser.desyncs == 1
+
+def test_console_text_is_not_a_desync():
+    text = []
+    stream = b"LiteX minimal demo app\n" + pack_msg(cmd.PING) + b"Got it!\n" + pack_msg(cmd.CAMERA_EXPO, 5000) + b"Done sending!\n\x00"
+    parser, items = parse(stream, 3, on_text=text.append)
+
+    assert [item[:2] for item in items] == [(cmd.PING.value, 0), (cmd.CAMERA_EXPO.value, 5000)]
+    assert text == [b"LiteX minimal demo app\n", b"Got it!\n", b"Done sending!\n"]
+    assert parser.desyncs == 0
+
+def test_garbage_without_delimiter_is_dropped():
+    garbage = np.random.default_rng(1).integers(1, 256, 10000, dtype=np.uint8).tobytes()
+    parser, items = parse(garbage + STREAM, 200, size=1024, max_packet=512)
+
+    assert items == REFERENCE
+    assert parser.desyncs >= 1
+    # The garbage never piles up in the buffer
+    assert len(parser.buffer) == 1024
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Tests of the processing pipeline ordering and error results
+
+import threading
+import time
+from itertools import islice
+
+import numpy as np
+import pytest
+
+from ridope_frames import Frame
+from ridope_pipeline import ProcessingPipeline
+
+N, M = 4, 4
+
+def slow_first(image):
+    """Earlier frames take longer, the workers finish them out of order"""
+    time.sleep(0.01*(8 - image[0, 0] % 8))
+    return image + 1, int(image[0, 0])
+
+def failing(image):
+    if image[0, 0] == 3:
+        raise RuntimeError("bad frame")
+    return int(image[0, 0])
+
+def frame(value):
+    frame = Frame(size=N*M)
+    frame.reset(N, M)
+    frame.image[...] = value
+    frame.expo = value
+    return frame
+
+@pytest.fixture
+def pipelines():
+    created = []
+
+    def make(*args, **kwargs):
+        created.append(ProcessingPipeline(*args, **kwargs))
+        return created[-1]
+
+    yield make
+    for pipeline in created:
+        pipeline.close()
+
+def test_results_in_submission_order(pipelines):
+    pipeline = pipelines(slow_first, workers=4, slots=8, size=N*M)
+
+    for value in range(24):
+        assert pipeline.submit(frame(value))
+
+    results = list(islice(pipeline.results(timeout=5.0), 24))
+    assert [result.seq for result in results] == list(range(24))
+    assert [result.expo for result in results] == list(range(24))
+
+    for value, result in enumerate(results):
+        image, seen = result.value
+        assert seen == value
+        assert np.array_equal(image, np.full((N, M), value + 1, dtype=np.uint8))
+
+    stats = pipeline.stats()
+    assert (stats["completed"], stats["errors"], stats["depth"]) == (24, 0, 0)
+    assert stats["max_depth"] <= 8
+
+def test_job_exceptions_are_results(pipelines):
+    pipeline = pipelines(failing, workers=2, slots=2, size=N*M)
+
+    for value in range(6):
+        assert pipeline.submit(frame(value))
+
+    values = [result.value for result in islice(pipeline.results(timeout=5.0), 6)]
+    assert isinstance(values[3], RuntimeError)
+    assert values[:3] + values[4:] == [0, 1, 2, 4, 5]
+    assert pipeline.stats()["errors"] == 1
+
+def test_unpicklable_job_frees_the_slot(pipelines):
+    lock = threading.Lock()
+    pipeline = pipelines(lambda image: lock, workers=1, slots=1, size=N*M)
+
+    # Every submit needs the only slot, which each error result gives back
+    for value in range(3):
+        assert pipeline.submit(frame(value), timeout=5.0)
+
+    results = list(islice(pipeline.results(timeout=5.0), 3))
+    assert [result.seq for result in results] == [0, 1, 2]
+    assert all(isinstance(result.value, Exception) for result in results)
+
+    stats = pipeline.stats()
+    assert (stats["completed"], stats["errors"], stats["dropped"], stats["depth"]) == (3, 3, 0, 0)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Tests of the record and replay of the UART byte stream
+
+import time
+
+import pytest
+import serial
+
+from comm_ridope import cmd, DELIMITER, pack_cmd
+from ridope_emu import DeviceEmulator
+from ridope_frames import FrameAssembler
+from ridope_parser import StreamParser
+from ridope_record import RecordingPort, ReplayPort, records, replay
+
+FRAMES = 6
+
+def live_session(path, corrupt):
+    """Captures FRAMES frames from the emulator through a RecordingPort, returns the live stats"""
+    emu = DeviceEmulator(baudrate=None, corrupt=corrupt, seed=3).start()
+    texts = []
+
+    try:
+        uart = RecordingPort(serial.Serial(emu.port, 115200, timeout=0.1), path)
+        parser = StreamParser(on_text=texts.append)
+        assembler = FrameAssembler(nack=lambda offset, length: uart.write(pack_cmd(cmd.RESEND, offset, length)))
+        done = 0
+        deadline = time.monotonic() + 20.0
+
+        uart.write(DELIMITER)
+        while done < FRAMES and time.monotonic() < deadline:
+            # One trigger at a time, sent again if its STOP_TRANS got corrupted
+            uart.write(pack_cmd(cmd.TRANS_FRAME))
+            idle = time.monotonic() + 1.0
+
+            while time.monotonic() < idle:
+                if not parser.fill(uart):
+                    continue
+                for item in parser.parse():
+                    assembler.feed(item)
+                    if item.cmd == cmd.STOP_TRANS.value and not assembler.repairing:
+                        done += 1
+                        idle = 0
+        uart.close()
+    finally:
+        emu.stop()
+
+    return {
+        "bytes": parser.bytes_in,
+        "messages": parser.messages,
+        "desyncs": parser.desyncs,
+        "text_lines": len(texts),
+        "frames": assembler.completed,
+        "incomplete": assembler.incomplete,
+    }
+
+@pytest.mark.parametrize("corrupt", [0.0, 0.002])
+def test_replay_reproduces_the_session(tmp_path, corrupt):
+    path = str(tmp_path / "session.rec")
+    live = live_session(path, corrupt)
+
+    assert live["frames"] + live["incomplete"] >= FRAMES
+    if corrupt:
+        assert live["desyncs"] > 0
+
+    stats = replay(path)
+    assert {key: stats[key] for key in live} == live
+
+def test_recorded_pace(tmp_path):
+    path = str(tmp_path / "session.rec")
+    live_session(path, 0.0)
+
+    span = [t for t, _ in records(path)]
+    start = time.monotonic()
+    stats = replay(path, pace="recorded", speed=4.0)
+
+    assert time.monotonic() - start >= 0.9*(span[-1] - span[0])/4.0
+    assert stats["frames"] == FRAMES
+
+def test_replay_port_discards_writes(tmp_path):
+    path = str(tmp_path / "session.rec")
+    live_session(path, 0.0)
+
+    port = ReplayPort(path, pace="fast")
+    data = b"".join(iter(lambda: port.read(4096), b""))
+    port.close()
+
+    assert port.write(b"\x00abc") == 4 and port.written == 4
+    assert len(data) == sum(len(chunk) for _, chunk in records(path))
+    assert port.eof.is_set()
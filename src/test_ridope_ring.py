@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Tests of the on-disk frame ring wraparound
+
+import numpy as np
+import pytest
+
+from ridope_frames import Frame
+from ridope_ring import FrameRing, RingWriter
+from ridope_sink import FrameSink, Record
+
+N, M = 6, 5
+CAPACITY = 5
+
+def image(seq):
+    return ((np.arange(N*M).reshape(N, M) + 7*seq) % 256).astype(np.uint8)
+
+def record(seq):
+    return Record(seq, image(seq), 1000 + seq, seq % 200, 0.5*seq)
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "frames.ring")
+
+def test_wraparound(path):
+    writer = RingWriter(path, CAPACITY, N, M)
+    for seq in range(13):
+        writer.write(record(seq))
+    writer.close()
+
+    ring = FrameRing(path)
+    assert (len(ring), ring.written) == (CAPACITY, 13)
+
+    # The oldest frames were overwritten, frame 0 is the oldest left
+    for i, seq in enumerate(range(8, 13)):
+        assert np.array_equal(ring[i], image(seq))
+        meta = ring.meta(i)
+        assert (meta["seq"], meta["expo"], meta["avg"], meta["timestamp"], meta["size"]) == (seq, 1000 + seq, seq, 0.5*seq, N*M)
+
+    assert np.array_equal(ring[-1], image(12))
+    assert ring.find(12) == 4
+    assert ring.find(7) is None
+
+    with pytest.raises(IndexError):
+        ring[CAPACITY]
+    with pytest.raises(IndexError):
+        ring[-CAPACITY - 1]
+
+def test_slices_across_the_end_of_the_file(path):
+    ring = FrameRing.create(path, CAPACITY, N, M)
+    for seq in range(7):
+        ring.append(image(seq), seq)
+
+    # Frames 2 to 6 sit in slots 2, 3, 4, 0, 1
+    assert list(ring.meta(slice(None))["seq"]) == [2, 3, 4, 5, 6]
+    assert list(ring.meta(slice(None, None, -1))["seq"]) == [6, 5, 4, 3, 2]
+    assert np.array_equal(ring[1:4], np.stack([image(seq) for seq in (3, 4, 5)]))
+    assert ring[3:3].shape == (0, 0, 0)
+    ring.close()
+
+def test_partial_ring_and_smaller_frames(path):
+    ring = FrameRing.create(path, CAPACITY, N, M)
+    ring.append(image(0)[:3, :2], 0)
+    ring.append(image(1), 1)
+
+    assert len(ring) == 2
+    assert np.array_equal(ring[0], image(0)[:3, :2])
+    assert np.array_equal(ring[1], image(1))
+    ring.close()
+
+def test_through_the_sink(path):
+    sink = FrameSink(RingWriter(path, CAPACITY, N, M), policy="block")
+    frame = Frame(size=N*M)
+
+    for seq in range(2*CAPACITY + 3):
+        frame.reset(N, M)
+        frame.image[...] = image(seq)
+        frame.seq = seq
+        sink.submit(frame)
+    sink.close()
+
+    ring = FrameRing(path)
+    assert list(ring.meta(slice(None))["seq"]) == list(range(CAPACITY + 3, 2*CAPACITY + 3))
+    assert all(np.array_equal(ring[i], image(CAPACITY + 3 + i)) for i in range(CAPACITY))
+
+def test_not_a_ring(path):
+    with open(path, "wb") as f:
+        f.write(b"\x00"*8192)
+
+    with pytest.raises(ValueError):
+        FrameRing(path)
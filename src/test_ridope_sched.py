@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Tests of the trigger scheduler resends
+
+import time
+
+import pytest
+
+from ridope_sched import TriggerScheduler
+
+TIMEOUT = 0.2
+FRAME = object()
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+@pytest.fixture
+def sched():
+    sends = []
+    scheduler = TriggerScheduler(lambda: sends.append(time.monotonic()), timeout=TIMEOUT, retries=2)
+    scheduler.sends = sends
+    scheduler.start()
+    yield scheduler
+    scheduler.stop()
+
+def test_late_answer_is_not_shifted(sched):
+    wait_until(lambda: len(sched.sends) == 2)
+
+    # The first send answers late, then the resend answers too
+    sched.on_frame(FRAME)
+    time.sleep(TIMEOUT/4)
+    assert len(sched.sends) == 2
+
+    sched.on_frame(FRAME)
+    assert sched.duplicates == 1
+
+    # The next trigger gets the next answer
+    wait_until(lambda: len(sched.sends) == 3)
+    sched.on_frame(FRAME)
+    wait_until(lambda: len(sched.sends) == 4)
+
+    stats = sched.stats()
+    assert (stats["frames"], stats["retries"], stats["duplicates"], stats["lost"]) == (2, 1, 1, 0)
+
+def test_lost_answer_waits_for_the_drain(sched):
+    wait_until(lambda: len(sched.sends) == 2)
+
+    # Only the resend answers, the next trigger waits for the drain
+    answered = time.monotonic()
+    sched.on_frame(FRAME)
+    wait_until(lambda: len(sched.sends) == 3)
+    assert sched.sends[2] - answered >= TIMEOUT*0.9
+
+    sched.on_frame(FRAME)
+    wait_until(lambda: len(sched.sends) == 4)
+
+    stats = sched.stats()
+    assert (stats["frames"], stats["duplicates"], stats["lost"]) == (2, 0, 0)
+
+def test_lost_after_retries(sched):
+    wait_until(lambda: sched.lost == 1, timeout=3*TIMEOUT + 1.0)
+
+    assert sched.retried == 2
+
+    # Any of the three sends may still answer before the next trigger
+    wait_until(lambda: len(sched.sends) == 4)
+    assert sched.sends[3] - sched.sends[2] >= 1.9*TIMEOUT
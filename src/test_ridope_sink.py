@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Tests of the frame sinks, their queue policies and writers
+
+import os
+import threading
+
+import numpy as np
+import pytest
+from scipy.io import loadmat
+
+from ridope_frames import Frame
+from ridope_sink import FrameSink, MatWriter, NpyWriter
+
+N, M = 28, 28
+
+def frame(seq):
+    frame = Frame(size=N*M)
+    frame.reset(N, M)
+    frame.image[:] = np.random.default_rng(seq).integers(0, 256, (N, M), dtype=np.uint8)
+    frame.count = N*M
+    frame.seq, frame.expo, frame.avg, frame.t_done = seq, 1000 + seq, 50 + seq, 100.0 + seq
+    return frame
+
+class GatedWriter:
+    """Writer holding every record until the gate opens"""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.busy = threading.Event()
+        self.records = []
+
+    def write(self, record):
+        self.busy.set()
+        self.gate.wait()
+        self.records.append(record)
+
+    def close(self):
+        pass
+
+def test_drop_policy():
+    writer = GatedWriter()
+    sink = FrameSink(writer, maxsize=2, policy="drop")
+
+    # The worker holds the first frame, the queue the next two
+    assert sink.submit(frame(0))
+    assert writer.busy.wait(timeout=5)
+    accepted = [sink.submit(frame(seq)) for seq in range(1, 6)]
+    assert accepted == [True, True, False, False, False]
+
+    writer.gate.set()
+    sink.close()
+
+    assert [record.seq for record in writer.records] == [0, 1, 2]
+    stats = sink.stats()
+    assert (stats["submitted"], stats["written"], stats["dropped"], stats["queue"]) == (6, 3, 3, 0)
+
+def test_block_policy():
+    writer = GatedWriter()
+    sink = FrameSink(writer, maxsize=1, policy="block")
+    submitter = threading.Thread(target=lambda: [sink.submit(frame(seq)) for seq in range(4)])
+    submitter.start()
+
+    # The submitter waits for room instead of dropping
+    submitter.join(timeout=0.2)
+    assert submitter.is_alive()
+
+    writer.gate.set()
+    submitter.join(timeout=5)
+    sink.close()
+
+    assert [record.seq for record in writer.records] == [0, 1, 2, 3]
+    assert (sink.written, sink.dropped) == (4, 0)
+
+    with pytest.raises(ValueError):
+        FrameSink(writer, policy="newest")
+
+def test_submit_copies_the_image(tmp_path):
+    sink = FrameSink(NpyWriter(str(tmp_path)), policy="block")
+    source = frame(7)
+    expected = source.image.copy()
+
+    sink.submit(source)
+    # The frame buffer goes back to its pool and gets overwritten
+    source.image[:] = 0
+    sink.close()
+
+    assert np.array_equal(np.load(tmp_path / "frame_000007.npy"), expected)
+
+    stats = sink.stats()
+    assert stats["writer"] == "NpyWriter"
+    assert stats["frames/s"] > 0 and stats["MB/s"] > 0 and stats["ms/frame"] > 0
+
+def test_mat_batches(tmp_path):
+    sink = FrameSink(MatWriter(str(tmp_path), batch=4), policy="block", workers=2)
+    for seq in range(10):
+        sink.submit(frame(seq))
+    sink.close()
+
+    # Two full batches, the last two frames are flushed on close
+    files = sorted(os.listdir(tmp_path))
+    assert len(files) == 3
+
+    batches = [loadmat(tmp_path / name) for name in files]
+    assert [batch["frames"].shape for batch in batches] == [(4, N, M), (4, N, M), (2, N, M)]
+
+    seqs = np.concatenate([batch["seq"].ravel() for batch in batches])
+    assert sorted(seqs) == list(range(10))
+    for batch in batches:
+        for image, seq, expo, avg, timestamp in zip(batch["frames"], batch["seq"].ravel(), batch["expo"].ravel(),
+                batch["avg"].ravel(), batch["timestamp"].ravel()):
+            assert np.array_equal(image, frame(seq).image)
+            assert (expo, avg, timestamp) == (1000 + seq, 50 + seq, 100.0 + seq)
+
+def test_mat_close_without_records(tmp_path):
+    MatWriter(str(tmp_path)).close()
+    assert os.listdir(tmp_path) == []
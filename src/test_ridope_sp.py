@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Golden tests of the NumPy port against ridope_sp.c built for the host
+
+import numpy as np
+import pytest
+
+import ridope_sp
+from ridope_sp.host import build_library, Host
+
+def scene(shape, seed):
+    """Gradient with edges and noise, like the camera frames"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:shape[0], 0:shape[1]]
+    image = 64 + 4*((x + 2*y) % 32) + 80*((x // 7 + y // 5) % 2) + rng.normal(0, 6.0, shape)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+def noise(shape, seed):
+    return np.random.default_rng(seed).integers(0, 256, shape, dtype=np.uint8)
+
+IMAGES = {
+    "scene": scene((28, 28), 0),
+    "scene-1": scene((28, 28), 1),
+    "noise": noise((28, 28), 2),
+    "zeros": np.zeros((28, 28), dtype=np.uint8),
+    "full": np.full((28, 28), 255, dtype=np.uint8),
+    "wide": scene((20, 36), 3),
+    "tall": scene((36, 20), 4),
+    "row": noise((1, 40), 5),
+    "column": noise((40, 1), 6),
+    "pixel": np.array([[77]], dtype=np.uint8),
+}
+
+THRESHOLDS = [(100, 50), (200, 20), (30, 10), (50, 100)]
+
+@pytest.fixture(scope="module")
+def host(tmp_path_factory):
+    library = build_library(str(tmp_path_factory.mktemp("ridope_sp")))
+    if library is None:
+        pytest.skip("no C compiler")
+    return Host(library)
+
+@pytest.fixture(params=list(IMAGES))
+def image(request):
+    return IMAGES[request.param]
+
+def assert_same(expected, actual):
+    assert expected.shape == actual.shape
+    mismatch = np.argwhere(expected != actual)
+    assert mismatch.size == 0, "%d pixels differ, first at %s: C %d, NumPy %d" % (
+        len(mismatch), tuple(mismatch[0]), expected[tuple(mismatch[0])], actual[tuple(mismatch[0])])
+
+def test_histogram(host, image):
+    assert_same(host.histogram(image), ridope_sp.histogram(image))
+
+def test_otsu(host, image):
+    out, threshold = host.otsu(image)
+    port_out, port_threshold = ridope_sp.otsu(image)
+
+    assert threshold == port_threshold
+    assert_same(out, port_out)
+
+@pytest.mark.parametrize("size", [3, 5, 7])
+def test_conv(host, image, size):
+    kernels = [ridope_sp.gaussian_kernel(size, 1.4), *ridope_sp.sobel_kernel(size)]
+    kernels.append(np.random.default_rng(size).normal(0, 1.0, (size, size)))
+
+    for kernel in kernels:
+        assert_same(host.conv(image, kernel), ridope_sp.conv(image, kernel))
+
+def test_gaussian_filter(host, image):
+    assert_same(host.gaussian_filter(image), ridope_sp.gaussian_filter(image))
+
+def test_sobel_filter(host, image):
+    smooth = host.gaussian_filter(image)
+    for expected, actual in zip(host.sobel_filter(smooth), ridope_sp.sobel_filter(smooth)):
+        assert_same(expected, actual)
+
+def test_get_mag_ang(host, image):
+    gx, gy = host.sobel_filter(host.gaussian_filter(image))
+    for expected, actual in zip(host.get_mag_ang(gx, gy), ridope_sp.get_mag_ang(gx, gy)):
+        assert_same(expected, actual)
+
+def test_get_mag_ang_every_pair(host):
+    gx, gy = np.mgrid[0:256, 0:256].astype(np.uint8)
+    for expected, actual in zip(host.get_mag_ang(gx, gy), ridope_sp.get_mag_ang(gx, gy)):
+        assert_same(expected, actual)
+
+def test_non_max_supression(host, image):
+    mag, ang = host.get_mag_ang(*host.sobel_filter(host.gaussian_filter(image)))
+    assert_same(host.non_max_supression(mag, ang), ridope_sp.non_max_supression(mag, ang))
+
+def test_non_max_supression_other_angles(host, image):
+    rng = np.random.default_rng(7)
+    mag = noise(image.shape, 8)
+    ang = rng.choice(np.array([0, 45, 90, 135, 1, 180], dtype=np.uint8), image.shape)
+    assert_same(host.non_max_supression(mag, ang), ridope_sp.non_max_supression(mag, ang))
+
+@pytest.mark.parametrize("high,low", THRESHOLDS)
+def test_edge_tracking(host, image, high, low):
+    mag, ang = host.get_mag_ang(*host.sobel_filter(host.gaussian_filter(image)))
+    nms = host.non_max_supression(mag, ang)
+
+    assert_same(host.edge_tracking(nms, high, low), ridope_sp.edge_tracking(nms, high, low))
+    assert_same(host.edge_tracking(image, high, low), ridope_sp.edge_tracking(image, high, low))
+
+@pytest.mark.parametrize("high,low", THRESHOLDS)
+def test_canny(host, image, high, low):
+    assert_same(host.canny(image, high, low), ridope_sp.canny(image, high, low))
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+from migen import *
+
+from litex.soc.interconnect.csr import *
+from litex.soc.interconnect.csr_eventmanager import *
+from litex.soc.interconnect import stream
+from litex.soc.interconnect import wishbone
+from litex.soc.cores.dma import WishboneDMAWriter
+
+from pixel_ingest import ingest_layout
+
+class FrameDMA(Module, AutoCSR):
+    """
+    Writes the frames received on `sink` in memory through the `bus` master.
+
+    A frame starts on the word at address 0 and is written from its buffer, one
+    line of `line` bytes every `stride` bytes, until `length` bytes. The words
+    after `length` are dropped until the next frame. The `done` event pulses
+    in the cycle the bus acks the last word of a frame, `frames` counts them:
+    the writer has no buffering and accepts the word on the FIFO head on its
+    ack, so the frame is in memory when the CPU sees the event. When disabled
+    the words are dropped, `sink` never back-pressures for long. A frame is
+    only written when enabled on its first word: enabling mid-frame waits for
+    the next frame and disabling drops the rest of the frame, so no torn frame
+    is published.
+
+    The frames rotate over `Buffers` buffers, buffer i starting at
+    base + i*spacing. Once a frame is written its buffer becomes the latest,
+    numbered by `frames`, and the next frame goes to the following buffer,
+    skipping the one the CPU holds. With 3 buffers the held buffer and the
+    latest are never written, with 2 the latest is written again while the
+    other one is held.
+    """
+
+    def __init__(self, data_width=32, fifo_depth=16, max_buffers=4):
+        self.sink = stream.Endpoint(ingest_layout(data_width))
+        self.bus = wishbone.Interface(data_width)
+
+        self.control = CSRStorage(fields=[
+            CSRField("Enable", size=1, description="Writes the frames in memory, drops them when 0", reset=0),
+            CSRField("Buffers", size=bits_for(max_buffers), description="Number of frame buffers", reset=min(3, max_buffers)),
+        ])
+        self.base = CSRStorage(32, description="Byte address of the first line, word aligned")
+        self.length = CSRStorage(32, description="Frame length in bytes, multiple of the word size")
+        self.line = CSRStorage(16, reset=28, description="Line length in bytes, multiple of the word size")
+        self.stride = CSRStorage(16, reset=28, description="Bytes from the start of a line to the next, `line` for a packed frame")
+        self.spacing = CSRStorage(32, description="Bytes from the start of a buffer to the next, word aligned")
+        self.hold = CSRStorage(fields=[
+            CSRField("Index", size=bits_for(max_buffers - 1), description="Buffer the CPU is reading"),
+            CSRField("Valid", size=1, description="Index is held, the writer skips it"),
+        ])
+        self.frames = CSRStatus(32, description="Frames written, sequence number of the latest buffer")
+        self.buffers = CSRStatus(fields=[
+            CSRField("Latest", size=bits_for(max_buffers - 1), description="Last complete buffer"),
+            CSRField("Writing", size=bits_for(max_buffers - 1), description="Buffer being written"),
+        ])
+
+        self.submodules.ev = EventManager()
+        self.ev.done = EventSourcePulse(description="A frame has been written")
+        self.ev.finalize()
+
+        # # #
+
+        words = data_width//8
+        shift = log2_int(words)
+
+        # FIFO.
+        self.submodules.fifo = fifo = stream.SyncFIFO(ingest_layout(data_width), fifo_depth)
+        # "big" keeps the first pixel, in the low byte of the word, at the lowest address
+        self.submodules.writer = writer = WishboneDMAWriter(self.bus, endianness="big")
+
+        self.comb += self.sink.connect(fifo.sink)
+
+        # Buffer rotation.
+        latest = self.buffers.fields.Latest
+        writing = self.buffers.fields.Writing
+        count_buffers = self.control.fields.Buffers
+        hold = self.hold.fields
+        bases = Array(self.base.storage + i*self.spacing.storage for i in range(max_buffers))
+
+        def following(i):
+            return Mux(i + 1 >= count_buffers, 0, i + 1)
+
+        following_1 = Signal.like(writing)
+        following_2 = Signal.like(writing)
+        next_writing = Signal.like(writing)
+        self.comb += [
+            following_1.eq(following(writing)),
+            following_2.eq(following(following_1)),
+            next_writing.eq(Mux(hold.Valid & (following_1 == hold.Index), following_2, following_1)),
+        ]
+
+        # Address generator.
+        # The state is the one of the word on the FIFO head, unless it is the
+        # first word of a frame, then it restarts from the buffer base.
+        line_adr = Signal(32)
+        col = Signal(16)
+        count = Signal(32)
+        cur_line = Signal(32)
+        cur_col = Signal(16)
+        cur_count = Signal(32)
+        first = Signal()
+        armed = Signal()                # The frame started while enabled
+        cur_armed = Signal()
+        in_frame = Signal()
+        write = Signal()
+        done = Signal()
+
+        self.comb += [
+            first.eq(fifo.source.adr == 0),
+            cur_line.eq(Mux(first, bases[writing], line_adr)),
+            cur_col.eq(Mux(first, 0, col)),
+            cur_count.eq(Mux(first, 0, count)),
+            cur_armed.eq(Mux(first, self.control.fields.Enable, armed)),
+            in_frame.eq(cur_count < self.length.storage),
+            write.eq(self.control.fields.Enable & cur_armed & in_frame),
+
+            writer.sink.valid.eq(fifo.source.valid & write),
+            writer.sink.address.eq((cur_line + cur_col)[shift:]),
+            writer.sink.data.eq(fifo.source.data),
+            fifo.source.ready.eq(writer.sink.ready | ~write),
+
+            # The writer is combinational, the bus ack is the one of the word on the FIFO head
+            done.eq(writer.sink.valid & self.bus.ack & (cur_count + words == self.length.storage)),
+            self.ev.done.trigger.eq(done),
+        ]
+
+        self.sync += [
+            If(fifo.source.valid & fifo.source.ready,
+                armed.eq(cur_armed),
+                count.eq(cur_count + words),
+                If(cur_col + words == self.line.storage,
+                    col.eq(0),
+                    line_adr.eq(cur_line + self.stride.storage),
+                ).Else(
+                    col.eq(cur_col + words),
+                    line_adr.eq(cur_line),
+                )
+            ),
+            If(~self.control.fields.Enable,
+                armed.eq(0),
+            ),
+            If(done,
+                self.frames.status.eq(self.frames.status + 1),
+                latest.eq(writing),
+                writing.eq(next_writing),
+            ),
+        ]
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+import re
+
+from migen import *
+from migen.genlib.fsm import FSM, NextState, NextValue
+
+from litex.soc.interconnect.csr import *
+from litex.soc.interconnect import stream
+from litex.soc.interconnect import wishbone
+from litex.soc.cores.dma import WishboneDMAReader
+
+COMM_RIDOPE_H = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "comm_ridope.h")
+
+def comm_ridope_constants(header=COMM_RIDOPE_H):
+    """The #defines and the CMD_TYPE_t values of comm_ridope.h, so the packets follow the firmware"""
+    with open(header) as f:
+        text = f.read()
+
+    constants = {name: int(value, 0) for name, value in re.findall(r"#define\s+(\w+)\s+(0x[0-9a-fA-F]+|\d+)\b", text)}
+
+    value = None
+    body = re.search(r"enum\s+CMD_TYPE\s*{(.*?)}", text, re.S).group(1)
+    for name, start in re.findall(r"(\w+)(?:\s*=\s*(\d+))?\s*,?", body):
+        value = int(start) if start else value + 1
+        constants[name] = value
+
+    return constants
+
+_constants = comm_ridope_constants()
+TRANS_FRAME = _constants["TRANS_FRAME"]
+DELIMITER = _constants["COMM_RIDOPE_DELIMITER"]
+CRC_INIT = _constants["COMM_RIDOPE_CRC_INIT"]
+CHUNK_SIZE = _constants["COMM_RIDOPE_CHUNK_SIZE"]
+
+def crc16_update(crc, byte):
+    """comm_ridope_crc16() of one more byte, as an expression"""
+    crc = crc ^ Cat(Constant(0, 8), byte)
+    for _ in range(8):
+        shifted = Cat(Constant(0, 1), crc[:15])
+        crc = Mux(crc[15], shifted ^ 0x1021, shifted)
+    return crc
+
+class COBSEncoder(Module):
+    """
+    COBS encodes the packets received on `sink`, one per `last`, like
+    comm_ridope_packet_begin/write/end(): a delimiter, the blocks of up to
+    254 bytes, a last block flushed even when empty and a delimiter, with
+    `last` on `source`. A block is stored before its code is sent, so the
+    bytes come out in bursts, put a FIFO after it to keep a slow link busy.
+    """
+
+    def __init__(self):
+        self.sink = sink = stream.Endpoint([("data", 8)])
+        self.source = source = stream.Endpoint([("data", 8)])
+
+        block = Memory(8, 254)
+        wr = block.get_port(write_capable=True)
+        rd = block.get_port()
+        self.specials += block, wr, rd
+
+        n = Signal(max=255)         # Bytes in the block
+        j = Signal(max=256)         # Bytes of the block sent, the code first
+        closing = Signal()          # Flushing after the last byte of the packet
+        again = Signal()            # One more flush, of an empty block
+
+        self.submodules.fsm = fsm = FSM(reset_state="OPEN")
+        fsm.act("OPEN",
+            source.valid.eq(sink.valid),
+            source.data.eq(DELIMITER),
+            If(source.valid & source.ready,
+                NextState("FILL")
+            )
+        )
+        fsm.act("FILL",
+            sink.ready.eq(1),
+            wr.adr.eq(n),
+            wr.dat_w.eq(sink.data),
+            If(sink.valid,
+                NextValue(closing, sink.last),
+                NextValue(j, 0),
+                If(sink.data == 0,
+                    NextValue(again, sink.last),
+                    NextState("FLUSH")
+                ).Else(
+                    wr.we.eq(1),
+                    NextValue(n, n + 1),
+                    If(n == 253,
+                        NextValue(again, sink.last),
+                        NextState("FLUSH")
+                    ).Elif(sink.last,
+                        NextValue(again, 0),
+                        NextState("FLUSH")
+                    )
+                )
+            )
+        )
+        # The read port is synchronous, it is given the byte after the one
+        # on `source` once it is taken
+        fsm.act("FLUSH",
+            source.valid.eq(1),
+            source.data.eq(Mux(j == 0, n + 1, rd.dat_r)),
+            rd.adr.eq(Mux(source.ready, j, j - 1)),
+            If(source.ready,
+                NextValue(j, j + 1),
+                If(j == n,
+                    NextValue(n, 0),
+                    NextValue(j, 0),
+                    If(again,
+                        NextValue(again, 0)
+                    ).Elif(closing,
+                        NextState("CLOSE")
+                    ).Else(
+                        NextState("FILL")
+                    )
+                )
+            )
+        )
+        fsm.act("CLOSE",
+            source.valid.eq(1),
+            source.data.eq(DELIMITER),
+            source.last.eq(1),
+            If(source.ready,
+                NextState("OPEN")
+            )
+        )
+
+class FrameStreamer(Module, AutoCSR):
+    """
+    Sends a frame from memory on the UART PHY as the TRANS_FRAME chunk
+    packets of comm_ridope_raw(), so the host receives it unchanged.
+
+    On `Start` the chunks of `chunk_size` bytes of the `size` bytes frame at
+    `base` that start in [offset, offset+length) are read through the `bus`
+    master and sent on `source`: header (command, offset), pixels and, with
+    `Crc`, the CRC-16, COBS encoded between delimiters. `source` and the UART
+    core share the PHY through a multiplexer selected by `streaming`, which is
+    set once the UART core has no byte waiting (`uart_pending` low) and
+    cleared when the last byte is taken, the UART core waits meanwhile.
+    """
+
+    def __init__(self, data_width=32, chunk_size=CHUNK_SIZE, fifo_depth=16):
+        self.bus = wishbone.Interface(data_width)
+        self.source = stream.Endpoint([("data", 8)])
+        self.uart_pending = Signal()
+        self.streaming = Signal()
+
+        self.control = CSRStorage(fields=[
+            CSRField("Start", size=1, description="Starts sending the chunks", pulse=True),
+            CSRField("Crc", size=1, description="Ends the packets with their CRC-16, the RIDOPE host drops them without", reset=1),
+        ])
+        self.base = CSRStorage(32, description="Byte address of the frame, word aligned")
+        self.size = CSRStorage(32, description="Frame size in bytes")
+        self.offset = CSRStorage(32, description="Offset of the first chunk to send")
+        self.length = CSRStorage(32, description="Only the chunks starting in [offset, offset+length) are sent")
+        self.status = CSRStatus(fields=[
+            CSRField("Busy", size=1, description="Chunks are being sent, the UART core waits"),
+        ])
+        self.packets = CSRStatus(32, description="Packets sent")
+
+        # # #
+
+        words = data_width//8
+        shift = log2_int(words)
+        assert chunk_size % words == 0
+
+        # "big" leaves the bytes where the CPU wrote them, byte i of a word in data[8*i:8*(i + 1)]
+        self.submodules.reader = reader = WishboneDMAReader(self.bus, endianness="big")
+        self.submodules.cobs = cobs = COBSEncoder()
+        self.submodules.fifo = fifo = stream.SyncFIFO([("data", 8)], fifo_depth)
+
+        self.comb += cobs.source.connect(fifo.sink)
+
+        # Packets.
+        payload = cobs.sink
+        chunk = Signal(32)                              # Offset of the chunk
+        chunk_len = Signal(max=chunk_size + 1)
+        chunk_words = Signal(max=chunk_size//words + 1)
+        remaining = Signal(32)
+        end = Signal(32)
+        header = Signal(64)
+        index = Signal(max=chunk_size)                  # Byte of the header, pixels or CRC
+        issued = Signal(max=chunk_size//words + 1)      # Words asked to the reader
+        crc = Signal(16)
+        last_pixel = Signal()
+
+        self.comb += [
+            remaining.eq(self.size.storage - chunk),
+            end.eq(self.offset.storage + self.length.storage),
+            header.eq(Cat(Constant(TRANS_FRAME, 32), chunk)),
+            chunk_words.eq((chunk_len + words - 1) >> shift),
+            last_pixel.eq(index == chunk_len - 1),
+        ]
+
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm.act("IDLE",
+            If(self.control.fields.Start,
+                NextValue(chunk, 0),
+                NextState("WAIT")
+            )
+        )
+        fsm.act("WAIT",
+            If(~self.uart_pending,
+                NextState("NEXT")
+            )
+        )
+        fsm.act("NEXT",
+            If((chunk >= self.size.storage) | (chunk >= end),
+                NextState("DRAIN")
+            ).Elif(chunk < self.offset.storage,
+                NextValue(chunk, chunk + chunk_size)
+            ).Else(
+                NextValue(chunk_len, Mux(remaining > chunk_size, chunk_size, remaining)),
+                NextValue(index, 0),
+                NextValue(issued, 0),
+                NextValue(crc, CRC_INIT),
+                NextState("HEADER")
+            )
+        )
+        fsm.act("HEADER",
+            payload.valid.eq(1),
+            payload.data.eq(Array(header[8*i:8*(i + 1)] for i in range(8))[index]),
+            If(payload.ready,
+                NextValue(crc, crc16_update(crc, payload.data)),
+                NextValue(index, index + 1),
+                If(index == 7,
+                    NextValue(index, 0),
+                    NextState("PIXELS")
+                )
+            )
+        )
+        # The chunks start on a word, pixel i of the chunk is byte i%words of its word
+        fsm.act("PIXELS",
+            reader.sink.valid.eq(issued < chunk_words),
+            reader.sink.address.eq(((self.base.storage + chunk) >> shift) + issued),
+            If(reader.sink.valid & reader.sink.ready,
+                NextValue(issued, issued + 1)
+            ),
+
+            payload.valid.eq(reader.source.valid),
+            payload.data.eq(Array(reader.source.data[8*i:8*(i + 1)] for i in range(words))[index[:shift]]),
+            payload.last.eq(last_pixel & ~self.control.fields.Crc),
+            reader.source.ready.eq(payload.ready & ((index[:shift] == words - 1) | last_pixel)),
+            If(payload.valid & payload.ready,
+                NextValue(crc, crc16_update(crc, payload.data)),
+                NextValue(index, index + 1),
+                If(last_pixel,
+                    NextValue(index, 0),
+                    If(self.control.fields.Crc,
+                        NextState("CRC")
+                    ).Else(
+                        NextValue(self.packets.status, self.packets.status + 1),
+                        NextValue(chunk, chunk + chunk_size),
+                        NextState("NEXT")
+                    )
+                )
+            )
+        )
+        fsm.act("CRC",
+            payload.valid.eq(1),
+            payload.data.eq(Mux(index[0], crc[8:], crc[:8])),
+            payload.last.eq(index[0]),
+            If(payload.ready,
+                NextValue(index, index + 1),
+                If(index[0],
+                    NextValue(index, 0),
+                    NextValue(self.packets.status, self.packets.status + 1),
+                    NextValue(chunk, chunk + chunk_size),
+                    NextState("NEXT")
+                )
+            )
+        )
+        fsm.act("DRAIN",
+            If(cobs.fsm.ongoing("OPEN") & ~fifo.source.valid,
+                NextState("IDLE")
+            )
+        )
+
+        # PHY.
+        self.comb += [
+            fifo.source.connect(self.source),
+            self.streaming.eq(~fsm.ongoing("IDLE") & ~fsm.ongoing("WAIT")),
+            self.status.fields.Busy.eq(~fsm.ongoing("IDLE")),
+        ]
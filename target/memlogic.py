@@ -9,60 +9,107 @@ from migen import *
 from litex.soc.cores import uart
 from litex.soc.interconnect import wishbone
 from litex.soc.interconnect import stream
+from litex.soc.interconnect.wishbone import CTI_BURST_NONE, CTI_BURST_INCREMENTING, CTI_BURST_END
 
 class MemLogic(Module):
+    """
+    Writes the words received on `sink` in the scratch-pad memory.
 
-    def __init__(self, amp_soc, data_width, depth, bursting):
+    Words go through a FIFO to a Wishbone writer that keeps the bus for up
+    to `max_burst` words. When the bus supports bursting, consecutive
+    addresses are written as an incrementing burst (CTI/BTE), so a slave
+    acking every cycle takes one word per cycle. Otherwise they are written
+    as back-to-back classic cycles. `sink` is only ready when the FIFO has
+    room, words are never dropped here.
+    """
+
+    def __init__(self, amp_soc, data_width, depth, bursting, fifo_depth=16, max_burst=16):
 
         length = depth * data_width//8
 
         addr_base = 784
-        
-        self.logic_write_data = Signal(data_width)
-        self.local_adr = Signal(30)
 
-        logic_write_enable_signal = Signal()
+        self.sink = stream.Endpoint([("adr", 30), ("data", data_width)])
+
+        mem_if = wishbone.Interface()
 
-        pre_write_data = Signal(data_width)
-        pre_local_adr = Signal(30) 
-       
-        mem_if = wishbone.Interface()      
-        
         self.submodules.arb = wishbone.Arbiter([mem_if, amp_soc.mmap_sp1], amp_soc.scratch1.bus)
 
-        # FSM.
-        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
-        
-        fsm.act("IDLE",
-            NextValue(mem_if.cyc, 0),
-            NextValue(mem_if.stb, 0),
-            NextValue(mem_if.we, 0),
-            NextValue(mem_if.adr, addr_base + self.local_adr),
-            NextValue(mem_if.dat_w, self.logic_write_data),
-            NextValue(mem_if.sel, 15),
-
-            If(logic_write_enable_signal == 1,
-                NextState("BUS-REQUEST")
-            )
-        )
-
-        fsm.act("BUS-REQUEST",
-            NextValue(mem_if.cyc, 1),
-            NextValue(mem_if.stb, 1),
-            NextValue(mem_if.we, 1),
-            If(mem_if.ack == 1,
-                NextState("IDLE")
-            )
-        )
+        # FIFO.
+        self.submodules.fifo = fifo = stream.SyncFIFO([("adr", 30), ("data", data_width)], fifo_depth)
 
-        # Write Logic
-        self.sync += [
-            If((pre_write_data != self.logic_write_data) | (pre_local_adr != self.local_adr),
-                pre_write_data.eq(self.logic_write_data),
-                pre_local_adr.eq(self.local_adr),
-                logic_write_enable_signal.eq(1),
+        self.comb += self.sink.connect(fifo.sink)
+
+        # Writer.
+        # The word on the bus is loaded from the FIFO as the previous one is
+        # acked, the FIFO head is then the next word and tells whether the
+        # burst goes on. The CTI decided on the first cycle of a word is held
+        # until its ack.
+        cur_valid = Signal()
+        cur_adr = Signal(30)
+        cur_data = Signal(data_width)
+        waiting = Signal()
+        cti_held = Signal(3)
+        cti = Signal(3)
+        beats = Signal(max=max_burst)
+        release = Signal()
+        ack = Signal()
+        load = Signal()
+        last = Signal()
+
+        if bursting:
+            self.comb += If(waiting,
+                cti.eq(cti_held)
+            ).Elif(fifo.source.valid & (fifo.source.adr == cur_adr + 1) & (beats != max_burst - 1),
+                cti.eq(CTI_BURST_INCREMENTING)
             ).Else(
-                logic_write_enable_signal.eq(0)
+                cti.eq(CTI_BURST_END)
             )
+        else:
+            self.comb += cti.eq(CTI_BURST_NONE)
+
+        self.comb += [
+            mem_if.cyc.eq(cur_valid & ~release),
+            mem_if.stb.eq(cur_valid & ~release),
+            mem_if.we.eq(1),
+            mem_if.adr.eq(addr_base + cur_adr),
+            mem_if.dat_w.eq(cur_data),
+            mem_if.sel.eq(2**len(mem_if.sel) - 1),
+            mem_if.cti.eq(cti),
+            mem_if.bte.eq(0b00),    # Linear
+
+            ack.eq(mem_if.stb & mem_if.ack),
+            last.eq(beats == max_burst - 1),
+            load.eq(fifo.source.valid & (~cur_valid | ack) & ~release),
+            fifo.source.ready.eq(load),
         ]
 
+        self.sync += [
+            If(load,
+                cur_valid.eq(1),
+                cur_adr.eq(fifo.source.adr),
+                cur_data.eq(fifo.source.data),
+            ).Elif(ack,
+                cur_valid.eq(0),
+            ),
+
+            If(ack,
+                waiting.eq(0),
+            ).Elif(mem_if.stb,
+                waiting.eq(1),
+                cti_held.eq(cti),
+            ),
+
+            # Give the bus back to the CPU after max_burst words
+            release.eq(0),
+            If(ack,
+                If(last,
+                    beats.eq(0),
+                    release.eq(1),
+                ).Else(
+                    beats.eq(beats + 1),
+                )
+            ).Elif(~cur_valid,
+                beats.eq(0),
+            ),
+        ]
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+# This file is part of Ridope project.
+# SPDX-License-Identifier: BSD-2-Clause
+
+from migen import *
+from migen.genlib.cdc import PulseSynchronizer
+
+from litex.soc.interconnect.csr import *
+from litex.soc.interconnect import stream
+
+def ingest_layout(data_width):
+    return [("adr", 30), ("data", data_width)]
+
+class PixelPacker(Module):
+    """
+    Packs 8-bit pixels into data_width words, first pixel in the low byte,
+    with their word address. `start` restarts the addresses for a new frame.
+    The camera cannot wait, a word completed while the previous one is still
+    waiting on `source` is lost and pulses `overflow`.
+    """
+
+    def __init__(self, data_width=32):
+        self.sink = stream.Endpoint([("data", 8)])
+        self.source = stream.Endpoint(ingest_layout(data_width))
+        self.start = Signal()
+        self.overflow = Signal()
+
+        ratio = data_width//8
+        word = Signal(data_width)
+        count = Signal(max=ratio)
+        adr = Signal(30)
+
+        self.comb += self.sink.ready.eq(1)
+
+        self.sync += [
+            self.overflow.eq(0),
+            If(self.source.ready,
+                self.source.valid.eq(0)
+            ),
+
+            If(self.start,
+                count.eq(0),
+                adr.eq(0),
+            ).Elif(self.sink.valid,
+                word.eq(Cat(word[8:], self.sink.data)),
+                count.eq(count + 1),
+                If(count == ratio - 1,
+                    count.eq(0),
+                    adr.eq(adr + 1),
+                    If(self.source.valid & ~self.source.ready,
+                        self.overflow.eq(1)
+                    ).Else(
+                        self.source.valid.eq(1),
+                        self.source.adr.eq(adr),
+                        self.source.data.eq(Cat(word[8:], self.sink.data)),
+                    )
+                )
+            )
+        ]
+
+class PixelIngest(Module, AutoCSR):
+    """
+    Pixel path from the camera (vga domain) to the memory writer (sys domain).
+
+    The pixels are packed in the vga domain and cross to sys through an
+    AsyncFIFO. `source` carries valid/ready back-pressure from the writer,
+    the FIFO absorbs it and the words the camera loses when it is full are
+    counted in the overflow CSR.
+    """
+
+    def __init__(self, pixel, pixel_valid, frame_start, data_width=32, depth=16):
+        self.source = stream.Endpoint(ingest_layout(data_width))
+
+        self.overflow = CSRStatus(32, description="Words lost because the ingest FIFO was full")
+
+        # # #
+
+        self.submodules.packer = packer = ClockDomainsRenamer("vga")(PixelPacker(data_width))
+        self.submodules.fifo = fifo = ClockDomainsRenamer({"write": "vga", "read": "sys"})(
+            stream.AsyncFIFO(ingest_layout(data_width), depth))
+
+        self.comb += [
+            packer.sink.valid.eq(pixel_valid),
+            packer.sink.data.eq(pixel),
+            packer.start.eq(frame_start),
+            packer.source.connect(fifo.sink),
+            fifo.source.connect(self.source),
+        ]
+
+        # Overflow counter
+        self.submodules.overflow_ps = overflow_ps = PulseSynchronizer("vga", "sys")
+        self.comb += overflow_ps.i.eq(packer.overflow)
+        self.sync += If(overflow_ps.o, self.overflow.status.eq(self.overflow.status + 1))
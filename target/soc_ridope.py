@@ -30,17 +30,44 @@ from litex.build.generic_platform import *
 
 from litex.soc.interconnect.csr import *
 from litex.soc.interconnect import wishbone
+from litex.soc.interconnect import stream
+from litex.soc.cores.uart import RS232PHY, UART
 
 from migen.genlib.cdc import BlindTransfer
 
 from camera_d8m import Camera_D8M
 from memlogic import MemLogic
+from pixel_ingest import PixelIngest
+from frame_dma import FrameDMA
+from frame_streamer import FrameStreamer
 
 # caution: path[0] is reserved for script path (or '' in REPL)
 sys.path.insert(1, '../ext_lib/Asymetric-Multi-Processing/Dual_Core')
 
 from amp import BaseSoC
 
+class RidopeSoC(BaseSoC):
+    """
+    BaseSoC with its UART PHY built with the tuning word CSR
+    (uart_phy_tuning_word) that comm_ridope_set_baudrate() reprograms.
+
+    The UART core is not connected to the PHY sink, the bytes it sends are
+    left on uart_tx for main() to multiplex with the frame streamer.
+    """
+
+    def add_uart(self, name, baudrate=115200, fifo_depth=16):
+        self.submodules.uart_phy = RS232PHY(self.platform.request(name), self.sys_clk_freq, baudrate, with_dynamic_baudrate=True)
+        self.submodules.uart = UART(tx_fifo_depth=fifo_depth, rx_fifo_depth=fifo_depth)
+        self.comb += self.uart_phy.source.connect(self.uart.sink)
+        self.uart_tx = self.uart.source
+
+        self.add_csr("uart_phy")
+        self.add_csr("uart")
+        if self.irq.enabled:
+            self.irq.add("uart", use_loc_if_exists=True)
+        else:
+            self.add_constant("UART_POLLING")
+
 def main(): # Instanciating the SoC and options
     parser = argparse.ArgumentParser(description="LiteX SoC on DE10-Lite")
     parser.add_argument("--build",               action="store_true", help="Build bitstream")
@@ -89,7 +116,7 @@ def main(): # Instanciating the SoC and options
 
     sys_clk_freq = int(float(args.sys_clk_freq))
 
-    soc = BaseSoC(
+    soc = RidopeSoC(
         platform_name  = 'De10Lite',
         platform       = platform,
         sys_clk_freq   = sys_clk_freq,
@@ -129,31 +156,39 @@ def main(): # Instanciating the SoC and options
     soc.submodules.logicmem = MemLogic(soc,soc.bus1.data_width,int("0x1000",0),soc.bus1.bursting)
 
     # Writing in the scratch-pad mem
-    addr = Signal(32)
-    write_data = Signal(data_width)
-    logic_counter = Signal(max=3)
-
-    soc.sync.vga += [
-        If(soc.camera.read_request==1,
-            write_data.eq(Cat(write_data[8:32],soc.camera.r_auto)),
-            If(logic_counter == 3,
-                soc.logicmem.logic_write_data.eq(write_data),
-                soc.logicmem.local_adr.eq(addr),
-                addr.eq(addr+1),
-                logic_counter.eq(0),
-            ).Else(
-                logic_counter.eq(logic_counter+1),
-            )     
-            
-        ),
-
-        If(soc.camera.framedone_vga==1,
-            addr.eq(0),
-            logic_counter.eq(0)
-        )
+    soc.submodules.ingest = PixelIngest(soc.camera.r_auto, soc.camera.read_request, soc.camera.framedone_vga, data_width)
+    soc.add_csr("ingest")
+
+    # Writing the frames in RAM, where the firmware sets them up
+    soc.submodules.framedma = FrameDMA(soc.bus1.data_width)
+    soc.add_csr("framedma")
+    soc.bus1.add_master(name="framedma", master=soc.framedma.bus)
+    if soc.irq.enabled:
+        soc.irq.add("framedma", use_loc_if_exists=True)
+
+    # Both writers take every word, a word leaves the ingest once both have room
+    soc.comb += [
+        soc.ingest.source.connect(soc.logicmem.sink, omit={"valid", "ready"}),
+        soc.ingest.source.connect(soc.framedma.sink, omit={"valid", "ready"}),
+        soc.logicmem.sink.valid.eq(soc.ingest.source.valid & soc.framedma.sink.ready),
+        soc.framedma.sink.valid.eq(soc.ingest.source.valid & soc.logicmem.sink.ready),
+        soc.ingest.source.ready.eq(soc.logicmem.sink.ready & soc.framedma.sink.ready),
+    ]
+
+    # Sending the frames on the UART without the CPU, takes over the PHY from the UART core
+    soc.submodules.streamer = FrameStreamer(soc.bus1.data_width)
+    soc.add_csr("streamer")
+    soc.bus1.add_master(name="streamer", master=soc.streamer.bus)
+
+    soc.submodules.uart_mux = uart_mux = stream.Multiplexer([("data", 8)], 2)
+    soc.comb += [
+        soc.uart_tx.connect(uart_mux.sink0),
+        soc.streamer.source.connect(uart_mux.sink1),
+        uart_mux.source.connect(soc.uart_phy.sink),
+        uart_mux.sel.eq(soc.streamer.streaming),
+        soc.streamer.uart_pending.eq(soc.uart_tx.valid),
     ]
 
-       
     builder = Builder(soc, **builder_argdict(args))
     builder.build(run=args.build)
     soc.do_exit(builder)